@@ -30,6 +30,7 @@ from app.models.arbi_event import ArbiEvent  # noqa
 from app.models.bundle import Bundle  # noqa
 from app.models.coin import Coin  # noqa
 from app.models.exchange import Exchange  # noqa
+from app.models.order_pair import OrderPair  # noqa
 
 from app.db.base import Base
 
@@ -0,0 +1,25 @@
+"""Add open arbi event index
+
+Revision ID: 9e3b6f0c2d71
+Revises: 5c1d7e2a9f40
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e3b6f0c2d71'
+down_revision = '5c1d7e2a9f40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_arbi_event_open', 'arbi_event', ['user_id', 'bundle_id'], unique=False,
+                    postgresql_where=sa.text('"end" IS NULL'))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_arbi_event_open', table_name='arbi_event')
@@ -4,7 +4,7 @@
 from fastapi import APIRouter
 
 from app.api.endpoints import (
-    ping, user, bundle,
+    ping, metrics, user, bundle,
     coin, exchange, arbi_event
 )
 
@@ -12,6 +12,7 @@ from app.api.endpoints import (
 api_router = APIRouter(prefix='/api')
 
 api_router.include_router(ping.router, prefix="/ping", tags=["ping"])
+api_router.include_router(metrics.router, prefix="/metrics", tags=["metrics"])
 api_router.include_router(user.router, prefix="/users", tags=["user"])
 api_router.include_router(coin.router, prefix="/coins", tags=["coin"])
 api_router.include_router(exchange.router, prefix="/exchanges", tags=["exchange"])
@@ -0,0 +1,29 @@
+"""
+Модуль API метрик Prometheus.
+"""
+import os
+
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest
+from prometheus_client.multiprocess import MultiProcessCollector
+
+import app.core.metrics  # noqa
+
+
+router = APIRouter()
+
+
+@router.get("")
+async def metrics():
+    """
+    Метрики в формате Prometheus.
+
+    При заданной переменной окружения PROMETHEUS_MULTIPROC_DIR метрики
+    собираются со всех процессов сервера и стратегии на этом хосте.
+    """
+    registry = REGISTRY
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry)
+
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,130 @@
+"""
+Модуль открытых арбитражных ситуаций (update_arbi_situations).
+
+Открытые ситуации (end IS NULL) загружаются одним запросом при первом тике
+в индекс по (user_id, bundle_id) и дальше ведутся в памяти процесса.
+Изменения тика пишутся в БД пачкой: закрытие и расширение диапазона
+прибыли - по одному UPDATE с набором параметров (executemany), новые
+ситуации - одним INSERT. Число запросов к БД за тик не зависит от числа
+пользователей и связок. При ошибке записи индекс загружается заново.
+"""
+import typing
+
+import numpy as np
+import sqlalchemy as sa
+
+from app import models, db
+
+
+Key = typing.Tuple[int, int]
+
+
+class OpenEvent(typing.NamedTuple):
+    # знак price1 - price2 при открытии
+    sign: int
+    min_profit: float
+    max_profit: float
+
+
+class OpenEvents:
+    """Индекс открытых арбитражных ситуаций: (user_id, bundle_id) -> OpenEvent."""
+
+    def __init__(self):
+        self._events: typing.Dict[Key, OpenEvent] = {}
+        self.loaded = False
+
+    def __len__(self):
+        return len(self._events)
+
+    def get(self, user_id: int, bundle_id: int) -> typing.Optional[OpenEvent]:
+        return self._events.get((user_id, bundle_id))
+
+    async def load(self, session: db.AsyncSession) -> None:
+        """Функция загружает открытые ситуации одним запросом."""
+        table = models.ArbiEvent.__table__
+        rows = (await session.execute(sa.select(
+            table.c.user_id, table.c.bundle_id,
+            table.c.current_price1, table.c.current_price2,
+            table.c.min_profit, table.c.max_profit
+        ).where(table.c.end == None))).all()
+
+        self._events = {
+            (row.user_id, row.bundle_id): OpenEvent(
+                int(np.sign(row.current_price1 - row.current_price2)), row.min_profit, row.max_profit
+            )
+            for row in rows
+        }
+        self.loaded = True
+
+    def invalidate(self) -> None:
+        self.loaded = False
+
+    def matrices(self, user_ids: typing.Sequence[int], bundle_ids: typing.Sequence[int]):
+        """Открытые ситуации в виде матриц пользователей × связок для scanner.scan.
+
+        :return: (знак, минимальная прибыль, максимальная прибыль)
+        """
+        user_index = {user_id: i for i, user_id in enumerate(user_ids)}
+        bundle_index = {bundle_id: j for j, bundle_id in enumerate(bundle_ids)}
+
+        shape = (len(user_ids), len(bundle_ids))
+        sign = np.zeros(shape, dtype=np.int8)
+        min_profit = np.full(shape, np.nan)
+        max_profit = np.full(shape, np.nan)
+        for (user_id, bundle_id), event in self._events.items():
+            i, j = user_index.get(user_id), bundle_index.get(bundle_id)
+            if i is None or j is None:
+                continue
+            sign[i, j] = event.sign
+            min_profit[i, j] = event.min_profit
+            max_profit[i, j] = event.max_profit
+        return sign, min_profit, max_profit
+
+    async def save(self, session: db.AsyncSession, closed: typing.List[Key],
+                   widened: typing.List[typing.Tuple[Key, float, float]],
+                   opened: typing.List[dict]) -> None:
+        """Функция записывает изменения тика и фиксирует транзакцию.
+
+        Индекс меняется только после успешной фиксации.
+
+        :param closed: Закрытые ситуации (в т.ч. при развороте спреда).
+        :param widened: Ситуации с новым диапазоном прибыли: (ключ, минимальная, максимальная).
+        :param opened: Строки новых ситуаций arbi_event.
+        """
+        table = models.ArbiEvent.__table__
+        is_open = sa.and_(
+            table.c.user_id == sa.bindparam('_user_id'),
+            table.c.bundle_id == sa.bindparam('_bundle_id'),
+            table.c.end == None
+        )
+
+        # закрытие раньше вставки: при развороте спреда ключ закрытой и новой ситуации совпадает
+        if closed:
+            await session.execute(
+                sa.update(table).where(is_open).values(end=sa.func.now()),
+                [{'_user_id': user_id, '_bundle_id': bundle_id} for user_id, bundle_id in closed]
+            )
+        if widened:
+            await session.execute(
+                sa.update(table).where(is_open).values(
+                    min_profit=sa.bindparam('_min_profit'),
+                    max_profit=sa.bindparam('_max_profit')
+                ),
+                [{'_user_id': user_id, '_bundle_id': bundle_id, '_min_profit': min_profit, '_max_profit': max_profit}
+                 for (user_id, bundle_id), min_profit, max_profit in widened]
+            )
+        if opened:
+            await session.execute(sa.insert(table), opened)
+        await session.commit()
+
+        for key in closed:
+            self._events.pop(key, None)
+        for key, min_profit, max_profit in widened:
+            self._events[key] = self._events[key]._replace(min_profit=min_profit, max_profit=max_profit)
+        for row in opened:
+            self._events[row['user_id'], row['bundle_id']] = OpenEvent(
+                int(np.sign(row['current_price1'] - row['current_price2'])), row['min_profit'], row['max_profit']
+            )
+
+
+open_events = OpenEvents()
@@ -0,0 +1,248 @@
+"""
+Модуль бэктеста автоматической торговли на исторических ценах.
+
+Цены Bybit и Binance прогоняются через конечный автомат AutoState (machine)
+с моделируемым исполнением лимитных ордеров. Поиск следующего события
+(равенство цен, арбитражная ситуация, исполнение ордера, таймаут) выполняется
+векторно по блокам массива, поэтому цикл Python проходит только по событиям,
+а не по каждому тику.
+"""
+import typing
+
+import numpy as np
+
+from app.models import AutoState, AutoStatus
+from .machine import Action, arbitrage_action, is_arbitrage, now_equal_price, orders_transition
+
+
+BYBIT, BINANCE = 0, 1
+
+
+class BacktestParams(typing.NamedTuple):
+    """Параметры пользователя и модели исполнения."""
+    volume: float = 50
+    init_volume: float = 1000
+    threshold: float = 4
+    epsilon: float = 0.1
+    wait_order_minutes: float = 60
+    # начальный баланс BASE_SYMBOL на каждой бирже
+    balance: float = 100000
+    # комиссия биржи (доля от суммы сделки)
+    fee: float = 0.001
+    # ордер исполняется при касании цены (иначе - только при пересечении)
+    fill_on_touch: bool = False
+
+
+class BacktestResult(typing.NamedTuple):
+    pnl: float
+    trades: int
+    timeouts: int
+    # время (в секундах) в каждом состоянии
+    state_time: typing.Dict[str, float]
+    start_equity: typing.Optional[float]
+    end_equity: float
+    # остановка из-за нехватки средств на стартовую закупку
+    stopped: bool
+
+
+class _Order(typing.NamedTuple):
+    exchange: int
+    buy: bool
+    price: float
+    quantity: float
+
+
+def _scan(predicate: typing.Callable[[int, int], np.ndarray], start: int, stop: int,
+          chunk: int = 64) -> typing.Optional[int]:
+    """Индекс первого элемента [start, stop), для которого predicate истинен.
+
+    Блоки удваиваются, поэтому стоимость поиска пропорциональна расстоянию до события.
+    """
+    while start < stop:
+        end = min(stop, start + chunk)
+        hits = np.flatnonzero(predicate(start, end))
+        if hits.size:
+            return start + int(hits[0])
+        start = end
+        chunk *= 2
+    return None
+
+
+class Backtest:
+    """Бэктест одного пользователя."""
+
+    def __init__(self, timestamps: np.ndarray, bybit: np.ndarray, binance: np.ndarray,
+                 params: BacktestParams = BacktestParams()):
+        """
+        :param timestamps: Время тиков (в секундах, по возрастанию).
+        :param bybit: Цены Bybit.
+        :param binance: Цены Binance.
+        :param params: Параметры.
+        """
+        self.t = np.asarray(timestamps, dtype=np.float64)
+        self.prices = (np.asarray(bybit, dtype=np.float64), np.asarray(binance, dtype=np.float64))
+        if not (len(self.t) == len(self.prices[BYBIT]) == len(self.prices[BINANCE])):
+            raise ValueError('timestamps and prices must have the same length')
+        self.params = params
+
+        self.usdt = [params.balance, params.balance]
+        self.coin = [0.0, 0.0]
+
+    def equity(self, i: int) -> float:
+        return sum(self.usdt[e] + self.coin[e] * self.prices[e][i] for e in (BYBIT, BINANCE))
+
+    def _fill(self, order: _Order) -> None:
+        amount = order.quantity * order.price
+        if order.buy:
+            self.usdt[order.exchange] -= amount * (1 + self.params.fee)
+            self.coin[order.exchange] += order.quantity
+        else:
+            self.usdt[order.exchange] += amount * (1 - self.params.fee)
+            self.coin[order.exchange] -= order.quantity
+
+    def _fill_index(self, order: _Order, placed: int, stop: int) -> typing.Optional[int]:
+        prices = self.prices[order.exchange]
+        start = placed if self.params.fill_on_touch else placed + 1
+
+        if order.buy:
+            if self.params.fill_on_touch:
+                return _scan(lambda s, e: prices[s:e] <= order.price, start, stop)
+            return _scan(lambda s, e: prices[s:e] < order.price, start, stop)
+        if self.params.fill_on_touch:
+            return _scan(lambda s, e: prices[s:e] >= order.price, start, stop)
+        return _scan(lambda s, e: prices[s:e] > order.price, start, stop)
+
+    def _feasible(self, start: int, end: int) -> np.ndarray:
+        """Арбитражная ситуация, для которой хватает средств на обе ноги."""
+        p = self.params
+        bybit, binance = self.prices[BYBIT][start:end], self.prices[BINANCE][start:end]
+
+        sell_bybit = (self.coin[BYBIT] >= p.volume) & (p.volume * binance <= self.usdt[BINANCE])
+        sell_binance = (self.coin[BINANCE] >= p.volume) & (p.volume * bybit <= self.usdt[BYBIT])
+
+        return is_arbitrage(p.volume, bybit, binance, p.threshold) & np.where(
+            bybit >= binance, sell_bybit, sell_binance
+        )
+
+    def run(self) -> BacktestResult:
+        p = self.params
+        t, (bybit, binance) = self.t, self.prices
+        n = len(t)
+
+        state, status = AutoState.INITIAL, AutoStatus.STARTED
+        state_time = {s.name: 0.0 for s in AutoState}
+        entered = 0
+        trades = timeouts = 0
+        start_equity = None
+        stopped = False
+
+        def move(new_state: AutoState, i: int):
+            nonlocal state, entered
+            state_time[state.name] += t[i] - t[entered]
+            state, entered = new_state, i
+
+        i = 0
+        orders: typing.List[_Order] = []
+        while i < n:
+            if state == AutoState.INITIAL:
+                j = _scan(lambda s, e: now_equal_price(bybit[s:e], binance[s:e], p.epsilon), i, n)
+                if j is None:
+                    break
+
+                orders = [_Order(BYBIT, True, bybit[j], p.init_volume),
+                          _Order(BINANCE, True, binance[j], p.init_volume)]
+                if any(order.quantity * order.price > self.usdt[order.exchange] for order in orders):
+                    # биржа отклоняет ордер, автоторговля останавливается
+                    move(AutoState.STOP, j)
+                    stopped = True
+                    break
+                move(AutoState.WAIT_FILLED, j)
+                i = j
+
+            elif state == AutoState.WAIT_FILLED:
+                placed = i
+                # order_timed_out: полные минуты ожидания > wait_order_minutes
+                deadline = int(np.searchsorted(t, t[placed] + (p.wait_order_minutes + 1) * 60, side='left'))
+
+                # стартовая закупка не отменяется по таймауту - ждем исполнения до конца данных
+                _, cancellable = orders_transition(status, filled=False, timed_out=True)
+                fills = [self._fill_index(order, placed, deadline if cancellable else n) for order in orders]
+                filled_at = None if None in fills else max(fills)
+
+                timed_out = deadline < n and (filled_at is None or deadline < filled_at)
+
+                if timed_out:
+                    next_state, cancel = orders_transition(status, filled=False, timed_out=True)
+                    if cancel:
+                        for order, fill in zip(orders, fills):
+                            if fill is not None:
+                                self._fill(order)
+                        timeouts += 1
+                        orders = []
+                        move(next_state, deadline)
+                        i = deadline
+                        continue
+
+                if filled_at is None:
+                    break
+
+                next_state, _ = orders_transition(status, filled=True, timed_out=False)
+                for order in orders:
+                    self._fill(order)
+                if status == AutoStatus.STARTED:
+                    start_equity = self.equity(filled_at)
+                else:
+                    trades += 1
+                orders = []
+                move(next_state, filled_at)
+                i = filled_at
+
+            elif state == AutoState.IN_PROGRESS:
+                # следующий тик после перехода
+                j = _scan(lambda s, e: is_arbitrage(p.volume, bybit[s:e], binance[s:e], p.threshold), i + 1, n)
+                if j is None:
+                    break
+                status = AutoStatus.PLAY
+
+                # пропускаются ситуации, для которых не хватает средств (check_sell / check_buy)
+                j = _scan(lambda s, e: self._feasible(s, e), j, n)
+                if j is None:
+                    break
+
+                if arbitrage_action(bybit[j], binance[j]) == Action.SELL_BYBIT:
+                    sell, buy = BYBIT, BINANCE
+                else:
+                    sell, buy = BINANCE, BYBIT
+
+                orders = [_Order(sell, False, self.prices[sell][j], p.volume),
+                          _Order(buy, True, self.prices[buy][j], p.volume)]
+                move(AutoState.WAIT_FILLED, j)
+                i = j
+            else:
+                break
+
+        move(state, n - 1)
+        end_equity = self.equity(n - 1)
+
+        return BacktestResult(
+            pnl=end_equity - start_equity if start_equity is not None else 0.0,
+            trades=trades,
+            timeouts=timeouts,
+            state_time=state_time,
+            start_equity=start_equity,
+            end_equity=end_equity,
+            stopped=stopped
+        )
+
+
+def backtest(timestamps, bybit, binance, params: BacktestParams = BacktestParams()) -> BacktestResult:
+    """Функция прогоняет исторические цены через автомат AutoState.
+
+    :param timestamps: Время тиков (в секундах).
+    :param bybit: Цены Bybit.
+    :param binance: Цены Binance.
+    :param params: Параметры пользователя и модели исполнения.
+
+    :return: BacktestResult
+    """
+    return Backtest(timestamps, bybit, binance, params).run()
@@ -0,0 +1,208 @@
+"""
+Модуль защиты от недоступности бирж: автоматические выключатели и повторы.
+
+Выключатель считается на биржу. После failure_threshold сбоев подряд
+(сеть, таймаут, 5xx) он размыкается, и запросы к бирже сразу завершаются
+ExchangeUnavailable без обращения к сети. Через recovery_timeout один
+пробный запрос (half-open) проверяет биржу: успех замыкает выключатель,
+сбой снова размыкает. Читающие запросы (цены, статусы, балансы) при сбое
+повторяются ограниченное число раз с экспоненциальной задержкой и jitter.
+"""
+import time
+import random
+import typing
+import asyncio
+import logging
+import functools
+from enum import IntEnum
+
+import aiohttp
+import ccxt
+from binance.exceptions import BinanceAPIException, BinanceRequestException
+
+from app.core.config import base_config
+from .metrics import CIRCUIT_STATE
+
+
+logger = logging.getLogger(__name__)
+
+# запросы без побочных эффектов - можно повторять
+IDEMPOTENT = ('connect', 'check_order', 'price', 'balance', 'balances')
+
+
+class ExchangeUnavailable(Exception):
+    """Биржа недоступна: выключатель разомкнут или сбой чтения после всех повторов."""
+    pass
+
+
+class CircuitOpenError(ExchangeUnavailable):
+    pass
+
+
+class CircuitState(IntEnum):
+    CLOSED = 0
+    HALF_OPEN = 1
+    OPEN = 2
+
+
+def is_outage(error: BaseException) -> bool:
+    """Сбой биржи или сети (а не ошибка запроса: баланс, символ, лимит частоты).
+
+    Адаптеры оборачивают исходную ошибку, поэтому проверяется вся цепочка.
+    """
+    while error is not None:
+        if isinstance(error, ccxt.RateLimitExceeded):
+            return False
+        if isinstance(error, (asyncio.TimeoutError, ConnectionError, aiohttp.ClientError,
+                              ccxt.NetworkError, BinanceRequestException)):
+            return True
+        if isinstance(error, BinanceAPIException) and error.status_code >= 500:
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+class CircuitBreaker:
+    """Выключатель одной биржи."""
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 30):
+        """
+        :param name: Биржа.
+        :param failure_threshold: Сбоев подряд до размыкания.
+        :param recovery_timeout: Время до пробного запроса (в секундах).
+        """
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.recovery_timeout = recovery_timeout
+
+        self.state = CircuitState.CLOSED
+        self.failures = 0
+        self.opened = 0.0
+        self._probe = False
+
+    def _set(self, state: CircuitState) -> None:
+        if state != self.state:
+            logger.warning(f"{self.name} circuit {self.state.name} -> {state.name}")
+        self.state = state
+        CIRCUIT_STATE.labels(self.name).set(int(state))
+
+    def check(self) -> None:
+        """Функция проверяет, можно ли обращаться к бирже (без запроса)."""
+        if self.state == CircuitState.CLOSED:
+            return
+        if self.state == CircuitState.OPEN and time.monotonic() - self.opened >= self.recovery_timeout:
+            return
+        raise CircuitOpenError(f"{self.name} is unavailable")
+
+    def before(self) -> None:
+        """Функция пропускает запрос или завершает его сразу.
+
+        Разомкнутый выключатель по истечении recovery_timeout пропускает один пробный запрос.
+        """
+        if self.state == CircuitState.CLOSED:
+            return
+        if (self.state == CircuitState.OPEN and not self._probe and
+                time.monotonic() - self.opened >= self.recovery_timeout):
+            self._probe = True
+            self._set(CircuitState.HALF_OPEN)
+            return
+        raise CircuitOpenError(f"{self.name} is unavailable")
+
+    def success(self) -> None:
+        self.failures = 0
+        self._probe = False
+        if self.state != CircuitState.CLOSED:
+            self._set(CircuitState.CLOSED)
+
+    def cancelled(self) -> None:
+        """Пробный запрос отменен - следующий запрос станет новым пробным."""
+        if self.state == CircuitState.HALF_OPEN:
+            self._probe = False
+            self._set(CircuitState.OPEN)
+
+    def failure(self, error: BaseException) -> None:
+        if not is_outage(error):
+            # биржа ответила - она доступна
+            self.success()
+            return
+
+        self.failures += 1
+        if self.state == CircuitState.HALF_OPEN or self.failures >= self.failure_threshold:
+            self._probe = False
+            self.opened = time.monotonic()
+            self._set(CircuitState.OPEN)
+
+
+class Breakers:
+    """Выключатели бирж процесса."""
+
+    def __init__(self, failure_threshold: int, recovery_timeout: float,
+                 retries: int, retry_delay: float, retry_max_delay: float = 2):
+        """
+        :param failure_threshold: Сбоев подряд до размыкания.
+        :param recovery_timeout: Время до пробного запроса (в секундах).
+        :param retries: Повторов читающего запроса.
+        :param retry_delay: Базовая задержка повтора (в секундах).
+        :param retry_max_delay: Максимальная задержка повтора (в секундах).
+        """
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.retry_max_delay = retry_max_delay
+        self._breakers: typing.Dict[str, CircuitBreaker] = {}
+
+    def __getitem__(self, exchange) -> CircuitBreaker:
+        name = getattr(exchange, 'value', exchange)
+        breaker = self._breakers.get(name)
+        if breaker is None:
+            breaker = self._breakers[name] = CircuitBreaker(name, self.failure_threshold, self.recovery_timeout)
+        return breaker
+
+    def check(self, *exchanges) -> None:
+        """Функция проверяет доступность всех бирж, например до отправки обеих ног сделки."""
+        for exchange in exchanges:
+            self[exchange].check()
+
+    def delay(self, attempt: int) -> float:
+        # full jitter
+        return random.uniform(0, min(self.retry_max_delay, self.retry_delay * 2 ** attempt))
+
+
+breakers = Breakers(
+    failure_threshold=base_config.BREAKER_FAILURE_THRESHOLD,
+    recovery_timeout=base_config.BREAKER_RECOVERY_TIMEOUT,
+    retries=base_config.EXCHANGE_READ_RETRIES,
+    retry_delay=base_config.EXCHANGE_RETRY_DELAY
+)
+
+
+def guarded(operation: str):
+    """Декоратор метода асинхронного адаптера биржи: выключатель биржи
+    и повторы читающих запросов при сбое."""
+    def decorator(method):
+        @functools.wraps(method)
+        async def wrapper(self, *args, **kwargs):
+            breaker = breakers[self.name]
+            attempts = 1 + (breakers.retries if operation in IDEMPOTENT else 0)
+
+            for attempt in range(attempts):
+                breaker.before()
+                try:
+                    result = await method(self, *args, **kwargs)
+                except asyncio.CancelledError:
+                    breaker.cancelled()
+                    raise
+                except Exception as e:
+                    breaker.failure(e)
+                    # ордер мог дойти до биржи - ошибка размещения или отмены не скрывается
+                    if not is_outage(e) or operation not in IDEMPOTENT:
+                        raise
+                    if attempt + 1 >= attempts or breaker.state == CircuitState.OPEN:
+                        raise ExchangeUnavailable(f"{breaker.name} {operation} failed: {e}") from e
+                    await asyncio.sleep(breakers.delay(attempt))
+                else:
+                    breaker.success()
+                    return result
+        return wrapper
+    return decorator
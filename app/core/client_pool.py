@@ -0,0 +1,172 @@
+"""
+Модуль пула подключений к биржам.
+"""
+import time
+import typing
+import asyncio
+from collections import OrderedDict
+
+from app.core.config import base_config
+from .exchange import AsyncExchange, AsyncBinanceExchange, AsyncBybitExchange, ExchangeName
+
+
+class _Entry:
+    __slots__ = ('client', 'api_secret', 'last_used')
+
+    def __init__(self, client: AsyncExchange, api_secret: str):
+        self.client = client
+        self.api_secret = api_secret
+        self.last_used = time.monotonic()
+
+
+class ExchangeClientPool:
+    """Пул долгоживущих подключенных клиентов бирж.
+
+    Клиенты хранятся по ключу (биржа, api_key) и переиспользуются между тиками,
+    вместе с HTTP-сессией и загруженным справочником рынков.
+    Вытеснение - по времени простоя (TTL) и по размеру пула (LRU).
+
+    Клиент, выданный get или взятый lease, не закрывается, пока его держат:
+    вытесненный или удаленный из пула клиент закрывается после последнего release.
+    """
+
+    exchanges: typing.Dict[ExchangeName, typing.Type[AsyncExchange]] = {
+        ExchangeName.BINANCE: AsyncBinanceExchange,
+        ExchangeName.BYBIT: AsyncBybitExchange,
+    }
+
+    def __init__(self, max_size: int, ttl: float):
+        """
+        :param max_size: Максимальное число клиентов в пуле.
+        :param ttl: Время простоя клиента до закрытия (в секундах).
+        """
+        self.max_size = max_size
+        self.min_size = max_size
+        self.ttl = ttl
+
+        self._clients: "OrderedDict[tuple, _Entry]" = OrderedDict()
+        self._locks: typing.Dict[tuple, asyncio.Lock] = {}
+        # id(клиент) -> число держателей
+        self._leases: typing.Dict[int, int] = {}
+        # клиенты вне пула, которые еще держат: id(клиент) -> клиент
+        self._closing: typing.Dict[int, AsyncExchange] = {}
+        # клиенты вне пула, которые больше никто не держит
+        self._released: typing.List[AsyncExchange] = []
+
+    def __len__(self):
+        return len(self._clients)
+
+    async def get(self, name: typing.Union[ExchangeName, str], api_key: str, api_secret: str,
+                  test: bool = False) -> AsyncExchange:
+        """Функция возвращает подключенный клиент биржи из пула
+        или создает новый. Клиент выдается в аренду: после использования - release.
+
+        :param name: Биржа.
+        :param api_key: API-ключ пользователя.
+        :param api_secret: API-секрет пользователя.
+        :param test: Тестовый режим биржи.
+
+        :return: Клиент биржи.
+        """
+        key = (ExchangeName(name), api_key)
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            entry = self._clients.get(key)
+
+            # секрет поменялся в другом процессе - старый клиент больше не валиден
+            if entry and entry.api_secret != api_secret:
+                await self._drop(key)
+                entry = None
+
+            if entry is None:
+                client = self.exchanges[key[0]](api_key=api_key, api_secret=api_secret, test=test)
+                await client.connect()
+                entry = _Entry(client, api_secret)
+                self._clients[key] = entry
+
+            entry.last_used = time.monotonic()
+            self._clients.move_to_end(key)
+            self.lease(entry.client)
+
+        await self._evict()
+
+        return entry.client
+
+    def lease(self, client: AsyncExchange) -> None:
+        """Функция отмечает, что клиент используется (например, потоком ордеров)."""
+        self._leases[id(client)] = self._leases.get(id(client), 0) + 1
+
+    def release(self, client: AsyncExchange) -> None:
+        """Функция отмечает, что клиент больше не используется держателем."""
+        count = self._leases.get(id(client), 0) - 1
+        if count > 0:
+            self._leases[id(client)] = count
+            return
+
+        self._leases.pop(id(client), None)
+        closing = self._closing.pop(id(client), None)
+        if closing is not None:
+            # закрывается при следующем обращении к пулу
+            self._released.append(closing)
+
+    def fit(self, clients: int) -> None:
+        """Функция увеличивает пул до числа клиентов пользователей процесса,
+        чтобы клиенты тика не вытесняли друг друга.
+
+        :param clients: Число клиентов (пользователи × биржи).
+        """
+        self.max_size = max(self.min_size, clients)
+
+    async def invalidate(self, name: typing.Union[ExchangeName, str], api_key: str) -> None:
+        """Функция закрывает и удаляет клиент из пула.
+
+        :param name: Биржа.
+        :param api_key: API-ключ пользователя.
+        """
+        await self._drop((ExchangeName(name), api_key))
+
+    async def close(self) -> None:
+        """Функция закрывает все клиенты пула, в том числе занятые."""
+        for key in list(self._clients):
+            await self._drop(key)
+
+        clients = list(self._closing.values()) + self._released
+        self._closing, self._released, self._leases = {}, [], {}
+        for client in clients:
+            await client.close()
+
+    async def _drop(self, key: tuple) -> None:
+        entry = self._clients.pop(key, None)
+        lock = self._locks.get(key)
+        if lock and not lock.locked():
+            del self._locks[key]
+        if entry:
+            if self._leases.get(id(entry.client)):
+                self._closing[id(entry.client)] = entry.client
+            else:
+                await entry.client.close()
+
+    async def _evict(self) -> None:
+        expired = time.monotonic() - self.ttl
+        excess = len(self._clients) - self.max_size
+
+        # от давно не использованных к недавним
+        for key, entry in list(self._clients.items()):
+            if excess <= 0 and entry.last_used > expired:
+                break
+            # занятый клиент вытесняется после освобождения
+            if self._leases.get(id(entry.client)):
+                continue
+            await self._drop(key)
+            excess -= 1
+
+        released, self._released = self._released, []
+        for client in released:
+            await client.close()
+
+
+client_pool = ExchangeClientPool(
+    max_size=base_config.CLIENT_POOL_SIZE,
+    ttl=base_config.CLIENT_POOL_TTL
+)
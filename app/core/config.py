@@ -64,6 +64,43 @@ class Settings(BaseSettings):
     REDIS_PASSWORD: str
 
     TEST_API: bool = Field(default=False)
+    EXCHANGE_SIMULATOR: bool = Field(default=False)
+    SYMBOL_RULES_REFRESH_INTERVAL: int = Field(default=3600)
+
+    BREAKER_FAILURE_THRESHOLD: int = Field(default=5)
+    BREAKER_RECOVERY_TIMEOUT: float = Field(default=30)
+    EXCHANGE_READ_RETRIES: int = Field(default=2)
+    EXCHANGE_RETRY_DELAY: float = Field(default=0.2)
+
+    AUTO_MODE_INTERVAL: int = Field(default=30)
+    AUTO_MODE_CONCURRENCY: int = Field(default=10)
+    ARBI_SITUATIONS_INTERVAL: int = Field(default=0)
+
+    CLIENT_POOL_SIZE: int = Field(default=1000)
+    CLIENT_POOL_TTL: int = Field(default=600)
+
+    MARKET_STREAMS: bool = Field(default=True)
+    MARKET_PRICE_MAX_AGE: float = Field(default=5)
+    TICKS_PATH: str = Field(default='')
+
+    PIPELINE_QUEUE_SIZE: int = Field(default=1000)
+
+    SHARD_COUNT: int = Field(default=64)
+    SHARD_REBALANCE_INTERVAL: int = Field(default=10)
+    SHARD_HEARTBEAT_INTERVAL: float = Field(default=1)
+
+    RUNNER_METRICS_PORT: int = Field(default=0)
+
+    NOTIFY_FLUSH_INTERVAL: float = Field(default=1)
+    NOTIFY_BATCH_SIZE: int = Field(default=500)
+    NOTIFY_RETRY_LIMIT: int = Field(default=5000)
+    NOTIFY_DEBUG_INTERVAL: float = Field(default=30)
+    NOTIFY_DEBUG_MAX_LINES: int = Field(default=20)
+
+    PUBLIC_API_POOL_SIZE: int = Field(default=20)
+    PUBLIC_API_CONNECT_TIMEOUT: float = Field(default=3)
+    PUBLIC_API_READ_TIMEOUT: float = Field(default=5)
+    PUBLIC_API_KEEPALIVE_TIMEOUT: float = Field(default=60)
 
     class Config:
         env_file = '.env'
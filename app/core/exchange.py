@@ -1,9 +1,17 @@
 import logging
 from abc import ABC, abstractmethod
 from enum import Enum
+from binance import AsyncClient
 from binance.client import Client
 from binance.enums import *
 import ccxt
+import ccxt.async_support as ccxt_async
+from binance.exceptions import BinanceAPIException
+
+from .metrics import exchange_request
+from .symbol_rules import symbol_rules, SymbolRulesError
+from .rate_limit import rate_limited
+from .breaker import guarded
 
 
 class ExchangeName(Enum):
@@ -85,6 +93,10 @@ class Exchange(ABC):
     def get_balance(self, symbol) -> tuple[float, float]:
         pass
 
+    def get_balances(self, symbols) -> dict[str, tuple[float, float]]:
+        """Free and locked balance of several assets"""
+        return {symbol: self.get_balance(symbol) for symbol in symbols}
+
 
 class BinanceExchange(Exchange):
     order_type_map = {
@@ -123,6 +135,8 @@ class BinanceExchange(Exchange):
                 logging.error(f"{self.name} Error placing order: Price and quantity must be positive numbers.")
                 return None
 
+            quantity, price = symbol_rules.prepare(self.name.value, symbol, quantity, price)
+
             order = self.session.create_order(
                 symbol=symbol,
                 side=self.order_side_map.get(side),
@@ -179,6 +193,19 @@ class BinanceExchange(Exchange):
             logging.error(f"{self.name} Error getting balance: {e}")
             raise BinanceError(f"{self.name} Error getting balance: {e}")
 
+    def get_balances(self, symbols):
+        try:
+            account = self.session.get_account()
+            balances = {balance['asset']: balance for balance in account['balances']}
+            return {
+                symbol: (float(balances[symbol]['free']), float(balances[symbol]['locked']))
+                if symbol in balances else (0.0, 0.0)
+                for symbol in symbols
+            }
+        except Exception as e:
+            logging.error(f"{self.name} Error getting balances: {e}")
+            raise BinanceError(f"{self.name} Error getting balances: {e}")
+
     def close(self):
         if self.session:
             self.session.close_connection()
@@ -223,6 +250,8 @@ class BybitExchange(Exchange):
         })
         if self.test:
             self.session.set_sandbox_mode(True)
+        if self.test == symbol_rules.test:
+            symbol_rules.share_markets(self.session)
 
     def place_order(self, symbol, side, order_type, quantity, price, **kwargs):
         try:
@@ -230,6 +259,8 @@ class BybitExchange(Exchange):
                 logging.error(f"{self.name} Error placing order: Price and quantity must be positive numbers.")
                 return None
 
+            quantity, price = symbol_rules.prepare(self.name.value, symbol, quantity, price)
+
             order_response = self.session.create_order(
                 symbol,
                 self.order_type_map.get(order_type),
@@ -243,7 +274,7 @@ class BybitExchange(Exchange):
             status = order_response['info']['status']
 
             return order_id, self.order_status_map.get(status)
-        except ccxt.BaseError as e:
+        except (ccxt.BaseError, SymbolRulesError) as e:
             logging.error(f"{self.name} Error placing order: {e}")
             raise BybitError(f"{self.name} Error placing order: {e}")
 
@@ -301,8 +332,372 @@ class BybitExchange(Exchange):
             raise BybitError(f"{self.name} Error getting balance: {e}")
         return None
 
+    def get_balances(self, symbols):
+        try:
+            balance = self.session.fetch_balance({'type': 'spot'})
+
+            if 'free' in balance and 'used' in balance:
+                return {
+                    symbol: (float(balance['free'].get(symbol) or 0.0), float(balance['used'].get(symbol) or 0.0))
+                    for symbol in symbols
+                }
+            else:
+                logging.error(f"{self.name} Balance data does not contain 'free' or 'used' fields.")
+        except ccxt.BaseError as e:
+            logging.error(f"{self.name} Error getting balances: {e}")
+            raise BybitError(f"{self.name} Error getting balances: {e}")
+        raise BybitError(f"{self.name} Error getting balances: bad response")
+
     def close(self):
         del self.session
 
     def __del__(self):
         self.close()
+
+
+class AsyncExchange(Exchange):
+    """Asynchronous variant of Exchange: network calls do not block the event loop"""
+
+    @abstractmethod
+    async def connect(self):
+        pass
+
+    @abstractmethod
+    async def place_order(self, symbol: str, side: OrderSide, order_type: OrderType,
+                          quantity: float, price: float, client_order_id: str = None) -> (tuple[str, str] | None):
+        pass
+
+    @abstractmethod
+    async def find_order(self, symbol: str, client_order_id: str) -> (str | None):
+        """Id of the order placed with client_order_id, None if the exchange has no such order"""
+        pass
+
+    @abstractmethod
+    async def cancel_order(self, symbol: str, order_id: int) -> bool:
+        pass
+
+    @abstractmethod
+    async def check_order(self, symbol: str, order_id: int) -> OrderStatus:
+        pass
+
+    @abstractmethod
+    async def get_price(self, symbol: str) -> float:
+        pass
+
+    @abstractmethod
+    async def get_balance(self, symbol) -> tuple[float, float]:
+        pass
+
+    async def get_balances(self, symbols) -> dict[str, tuple[float, float]]:
+        """Free and locked balance of several assets"""
+        return {symbol: await self.get_balance(symbol) for symbol in symbols}
+
+    @abstractmethod
+    async def close(self):
+        pass
+
+    def response_headers(self) -> (dict | None):
+        """Headers of the last response of the session (possibly of a concurrent request),
+        for rate limit accounting"""
+        return None
+
+
+class AsyncBinanceExchange(AsyncExchange):
+    order_type_map = BinanceExchange.order_type_map
+    order_side_map = BinanceExchange.order_side_map
+    order_status_map = BinanceExchange.order_status_map
+
+    make_symbol = staticmethod(BinanceExchange.make_symbol)
+
+    def __init__(self, api_key, api_secret, test=False):
+        super().__init__(ExchangeName.BINANCE, api_key, api_secret, test)
+
+    @guarded('connect')
+    @exchange_request('connect')
+    async def connect(self):
+        self.session = await AsyncClient.create(api_key=self.api_key, api_secret=self.api_secret, testnet=self.test)
+
+    @guarded('place_order')
+    @rate_limited('place_order')
+    @exchange_request('place_order')
+    async def place_order(self, symbol, side, order_type, quantity, price, client_order_id=None,
+                          time_in_force=Client.TIME_IN_FORCE_GTC):
+        try:
+            if price <= 0 or quantity <= 0:
+                logging.error(f"{self.name} Error placing order: Price and quantity must be positive numbers.")
+                return None
+
+            quantity, price = symbol_rules.prepare(self.name.value, symbol, quantity, price)
+
+            params = {'newClientOrderId': client_order_id} if client_order_id is not None else {}
+            order = await self.session.create_order(
+                symbol=symbol,
+                side=self.order_side_map.get(side),
+                type=self.order_type_map.get(order_type),
+                quantity=quantity,
+                price=price,
+                timeInForce=time_in_force,
+                **params
+            )
+
+            status = order.get("status")
+            if status is None:
+                logging.error(f"{self.name} Error placing order: Order status not received.")
+                return None
+
+            return str(order['orderId']), self.order_status_map.get(status)
+        except Exception as e:
+            logging.error(f"{self.name} Error placing order: {e}")
+            raise BinanceError(f"{self.name} Error placing order: {e}")
+
+    @guarded('cancel_order')
+    @rate_limited('cancel_order')
+    @exchange_request('cancel_order')
+    async def cancel_order(self, symbol, order_id):
+        try:
+            res = await self.session.cancel_order(symbol=symbol, orderId=order_id)
+            if res['status'] == 'CANCELED':
+                return True
+        except Exception as e:
+            logging.error(f"{self.name} Error cancelling order: {e}")
+            raise BinanceError(f"{self.name} Error cancelling order: {e}")
+        return False
+
+    @guarded('check_order')
+    @rate_limited('check_order')
+    @exchange_request('check_order')
+    async def check_order(self, symbol, order_id):
+        try:
+            order_info = await self.session.get_order(symbol=symbol, orderId=order_id)
+            return self.order_status_map.get(order_info["status"])
+        except Exception as e:
+            logging.error(f"{self.name} Error checking order status: {e}")
+            raise BinanceError(f"{self.name} Error checking order status: {e}")
+
+    @guarded('check_order')
+    @rate_limited('check_order')
+    @exchange_request('check_order')
+    async def find_order(self, symbol, client_order_id):
+        try:
+            order_info = await self.session.get_order(symbol=symbol, origClientOrderId=client_order_id)
+            return str(order_info['orderId'])
+        except BinanceAPIException as e:
+            # -2013: Order does not exist
+            if e.code == -2013:
+                return None
+            logging.error(f"{self.name} Error finding order: {e}")
+            raise BinanceError(f"{self.name} Error finding order: {e}")
+        except Exception as e:
+            logging.error(f"{self.name} Error finding order: {e}")
+            raise BinanceError(f"{self.name} Error finding order: {e}")
+
+    @guarded('price')
+    @rate_limited('price')
+    @exchange_request('price')
+    async def get_price(self, symbol):
+        try:
+            ticker = await self.session.get_symbol_ticker(symbol=symbol)
+            price = float(ticker['price'])
+            return price
+        except Exception as e:
+            logging.error(f"{self.name} Error getting price: {e}")
+            raise BinanceError(f"{self.name} Error getting price: {e}")
+
+    @guarded('balance')
+    @rate_limited('balance')
+    @exchange_request('balance')
+    async def get_balance(self, symbol):
+        try:
+            balance = await self.session.get_asset_balance(asset=symbol)
+            free_balance = float(balance['free'])
+            locked_balance = float(balance['locked'])
+            return free_balance, locked_balance
+        except Exception as e:
+            logging.error(f"{self.name} Error getting balance: {e}")
+            raise BinanceError(f"{self.name} Error getting balance: {e}")
+
+    @guarded('balances')
+    @rate_limited('balances')
+    @exchange_request('balances')
+    async def get_balances(self, symbols):
+        try:
+            account = await self.session.get_account()
+            balances = {balance['asset']: balance for balance in account['balances']}
+            return {
+                symbol: (float(balances[symbol]['free']), float(balances[symbol]['locked']))
+                if symbol in balances else (0.0, 0.0)
+                for symbol in symbols
+            }
+        except Exception as e:
+            logging.error(f"{self.name} Error getting balances: {e}")
+            raise BinanceError(f"{self.name} Error getting balances: {e}")
+
+    async def close(self):
+        if self.session:
+            await self.session.close_connection()
+            self.session = None
+
+    def response_headers(self):
+        response = getattr(self.session, 'response', None)
+        return response.headers if response is not None else None
+
+
+class AsyncBybitExchange(AsyncExchange):
+    order_type_map = BybitExchange.order_type_map
+    order_side_map = BybitExchange.order_side_map
+    order_status_map = BybitExchange.order_status_map
+
+    make_symbol = staticmethod(BybitExchange.make_symbol)
+
+    def __init__(self, api_key, api_secret, test=False):
+        super().__init__(ExchangeName.BYBIT, api_key, api_secret, test)
+
+    @guarded('connect')
+    @exchange_request('connect')
+    async def connect(self):
+        self.session = ccxt_async.bybit({
+            'apiKey': self.api_key,
+            'secret': self.api_secret,
+            'test': self.test
+        })
+        if self.test:
+            self.session.set_sandbox_mode(True)
+        if self.test == symbol_rules.test:
+            symbol_rules.share_markets(self.session)
+
+    @guarded('place_order')
+    @rate_limited('place_order')
+    @exchange_request('place_order')
+    async def place_order(self, symbol, side, order_type, quantity, price, client_order_id=None, **kwargs):
+        try:
+            if price <= 0 or quantity <= 0:
+                logging.error(f"{self.name} Error placing order: Price and quantity must be positive numbers.")
+                return None
+
+            quantity, price = symbol_rules.prepare(self.name.value, symbol, quantity, price)
+
+            if client_order_id is not None:
+                # ccxt sends it as orderLinkId
+                kwargs['params'] = dict(kwargs.get('params') or {}, clientOrderId=client_order_id)
+            order_response = await self.session.create_order(
+                symbol,
+                self.order_type_map.get(order_type),
+                self.order_side_map.get(side),
+                quantity,
+                price,
+                **kwargs
+            )
+
+            order_id = order_response['info']['orderId']
+            status = order_response['info']['status']
+
+            return order_id, self.order_status_map.get(status)
+        except (ccxt.BaseError, SymbolRulesError) as e:
+            logging.error(f"{self.name} Error placing order: {e}")
+            raise BybitError(f"{self.name} Error placing order: {e}")
+
+    @guarded('cancel_order')
+    @rate_limited('cancel_order')
+    @exchange_request('cancel_order')
+    async def cancel_order(self, symbol, order_id):
+        try:
+            order_response = await self.session.cancel_order(order_id, symbol)
+            order_id = order_response['info']['orderId']
+
+            status = await self.check_order(symbol, order_id)
+
+            if status == None:
+                return True
+        except ccxt.BaseError as e:
+            logging.error(f"{self.name} Error cancelling order: {e}")
+            raise BybitError(f"{self.name} Error cancelling order: {e}")
+        return False
+
+    @guarded('check_order')
+    @rate_limited('check_order')
+    @exchange_request('check_order')
+    async def check_order(self, symbol, order_id):
+        try:
+            order_response = await self.session.fetch_order(order_id, symbol)
+            order_status = order_response['info']['status']
+
+            return self.order_status_map.get(order_status)
+        except ccxt.BaseError as e:
+            logging.error(f"{self.name} Error checking order status: {e}")
+            raise BybitError(f"{self.name} Error checking order status: {e}")
+
+    @guarded('check_order')
+    @rate_limited('check_order')
+    @exchange_request('check_order')
+    async def find_order(self, symbol, client_order_id):
+        try:
+            # an order that is already filled is only in the history
+            for fetch in (self.session.fetch_open_orders, self.session.fetch_closed_orders):
+                for order in await fetch(symbol, params={'orderLinkId': client_order_id}):
+                    if order.get('clientOrderId') == client_order_id:
+                        return str(order['id'])
+            return None
+        except ccxt.BaseError as e:
+            logging.error(f"{self.name} Error finding order: {e}")
+            raise BybitError(f"{self.name} Error finding order: {e}")
+
+    @guarded('price')
+    @rate_limited('price')
+    @exchange_request('price')
+    async def get_price(self, symbol):
+        try:
+            ticker = await self.session.fetch_ticker(symbol)
+            price = ticker.get('last')
+
+            return price
+        except ccxt.BaseError as e:
+            logging.error(f"{self.name} Error getting price: {e}")
+            raise BybitError(f"{self.name} Error getting price: {e}")
+
+    @guarded('balance')
+    @rate_limited('balance')
+    @exchange_request('balance')
+    async def get_balance(self, symbol):
+        try:
+            balance = await self.session.fetch_balance({'type': 'spot'})
+
+            logging.debug(f"{self.name} Fetch balance response: {balance}")
+
+            if 'free' in balance and 'used' in balance:
+                free_balance = balance['free'].get(symbol, 0.0)
+                locked_balance = balance['used'].get(symbol, 0.0)
+
+                return float(free_balance), float(locked_balance)
+            else:
+                logging.error(f"{self.name} Balance data does not contain 'free' or 'used' fields.")
+        except ccxt.BaseError as e:
+            logging.error(f"{self.name} Error getting balance: {e}")
+            raise BybitError(f"{self.name} Error getting balance: {e}")
+        return None
+
+    @guarded('balances')
+    @rate_limited('balances')
+    @exchange_request('balances')
+    async def get_balances(self, symbols):
+        try:
+            balance = await self.session.fetch_balance({'type': 'spot'})
+
+            if 'free' in balance and 'used' in balance:
+                return {
+                    symbol: (float(balance['free'].get(symbol) or 0.0), float(balance['used'].get(symbol) or 0.0))
+                    for symbol in symbols
+                }
+            else:
+                logging.error(f"{self.name} Balance data does not contain 'free' or 'used' fields.")
+        except ccxt.BaseError as e:
+            logging.error(f"{self.name} Error getting balances: {e}")
+            raise BybitError(f"{self.name} Error getting balances: {e}")
+        raise BybitError(f"{self.name} Error getting balances: bad response")
+
+    async def close(self):
+        if self.session:
+            await self.session.close()
+            self.session = None
+
+    def response_headers(self):
+        return getattr(self.session, 'last_response_headers', None)
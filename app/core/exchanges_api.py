@@ -1,61 +1,202 @@
-import pybit.exceptions
-import requests
+import time
+import typing
+import asyncio
 import logging
+from collections import deque
 
-from pybit.unified_trading import HTTP
-from pybit.exceptions import FailedRequestError, InvalidRequestError
+import aiohttp
+
+from app.core.config import base_config
+from app.core.metrics import PUBLIC_API_CONNECTIONS, PUBLIC_API_IN_FLIGHT, PUBLIC_API_POOL
 
 # logging.basicConfig(level=logging.ERROR, format='%(asctime)s %(name)s %(levelname)s:%(message)s')
 logger = logging.getLogger(__name__)
 
 
-def get_price_binance(coin_ticker: str, base_coin: str) -> float:
-
-    coin_ticker = coin_ticker.upper()
-    base_coin = base_coin.upper()
-
-    query = "https://api.binance.com/api/v3/ticker/price?symbol="+coin_ticker+base_coin
-    r = ""
+BASE_URLS = {
+    "Binance": "https://api.binance.com",
+    "Bybit": "https://api.bybit.com",
+}
+
+
+class PublicApi:
+    """Public REST API of the exchanges: one keep-alive aiohttp session per exchange.
+
+    Connections are pooled and reused between requests and ticks,
+    every request is bounded by connect and read timeouts.
+    Pool gauges are counted from the trace hooks of the requests, so they are approximate:
+    a connection counts as acquired from its creation or reuse until the request ends,
+    and as idle until it is reused or its keep-alive timeout passes.
+    """
+
+    def __init__(self, base_urls: typing.Dict[str, str], pool_size: int = 20,
+                 connect_timeout: float = 3, read_timeout: float = 5, keepalive_timeout: float = 60):
+        """
+        :param base_urls: exchange name -> API url
+        :param pool_size: connections per exchange
+        :param connect_timeout: connection timeout, seconds
+        :param read_timeout: response read timeout, seconds
+        :param keepalive_timeout: idle connection lifetime, seconds
+        """
+        self.base_urls = base_urls
+        self.pool_size = pool_size
+        self.timeout = aiohttp.ClientTimeout(
+            total=connect_timeout + read_timeout,
+            connect=connect_timeout,
+            sock_connect=connect_timeout,
+            sock_read=read_timeout
+        )
+        self.keepalive_timeout = keepalive_timeout
+
+        self._sessions: typing.Dict[str, aiohttp.ClientSession] = {}
+        # exchange -> connections in use
+        self._acquired: typing.Dict[str, int] = {}
+        # exchange -> release times of idle keep-alive connections, oldest first
+        self._idle: typing.Dict[str, deque] = {}
+
+    def idle(self, exchange: str) -> int:
+        """Keep-alive connections released within keepalive_timeout and not reused since"""
+        released = self._idle.setdefault(exchange, deque())
+        expired = time.monotonic() - self.keepalive_timeout
+        while released and released[0] < expired:
+            released.popleft()
+        return len(released)
+
+    def acquired(self, exchange: str) -> int:
+        return self._acquired.get(exchange, 0)
+
+    def _pool(self, exchange: str) -> None:
+        """Pool gauges: connection limit, idle keep-alive connections and connections in use"""
+        PUBLIC_API_POOL.labels(exchange, 'limit').set(self.pool_size)
+        PUBLIC_API_POOL.labels(exchange, 'idle').set(self.idle(exchange))
+        PUBLIC_API_POOL.labels(exchange, 'acquired').set(self.acquired(exchange))
+
+    def _acquire(self, exchange: str, context, reused: bool) -> None:
+        context.connection = True
+        self._acquired[exchange] = self.acquired(exchange) + 1
+        if reused and self.idle(exchange):
+            # the connector reuses the most recently released connection
+            self._idle[exchange].pop()
+        self._pool(exchange)
+
+    def _release(self, exchange: str, context, kept: bool) -> None:
+        if not getattr(context, 'connection', False):
+            return
+        context.connection = False
+        self._acquired[exchange] = max(self.acquired(exchange) - 1, 0)
+        if kept:
+            self._idle.setdefault(exchange, deque()).append(time.monotonic())
+        self._pool(exchange)
+
+    def _trace(self, exchange: str) -> aiohttp.TraceConfig:
+        async def on_request_start(session, context, params):
+            PUBLIC_API_IN_FLIGHT.labels(exchange).inc()
+
+        async def on_request_end(session, context, params):
+            PUBLIC_API_IN_FLIGHT.labels(exchange).dec()
+            self._release(exchange, context, kept=True)
+
+        async def on_request_exception(session, context, params):
+            # an error status response keeps its connection, other failures close it
+            PUBLIC_API_IN_FLIGHT.labels(exchange).dec()
+            self._release(exchange, context, kept=isinstance(params.exception, aiohttp.ClientResponseError))
+
+        async def on_connection_create_end(session, context, params):
+            PUBLIC_API_CONNECTIONS.labels(exchange, 'created').inc()
+            self._acquire(exchange, context, reused=False)
+
+        async def on_connection_reuseconn(session, context, params):
+            PUBLIC_API_CONNECTIONS.labels(exchange, 'reused').inc()
+            self._acquire(exchange, context, reused=True)
+
+        trace = aiohttp.TraceConfig()
+        trace.on_request_start.append(on_request_start)
+        trace.on_request_end.append(on_request_end)
+        trace.on_request_exception.append(on_request_exception)
+        trace.on_connection_create_end.append(on_connection_create_end)
+        trace.on_connection_reuseconn.append(on_connection_reuseconn)
+        return trace
+
+    def session(self, exchange: str) -> aiohttp.ClientSession:
+        session = self._sessions.get(exchange)
+        if session is None or session.closed:
+            session = self._sessions[exchange] = aiohttp.ClientSession(
+                base_url=self.base_urls[exchange],
+                connector=aiohttp.TCPConnector(
+                    limit=self.pool_size,
+                    keepalive_timeout=self.keepalive_timeout,
+                    ttl_dns_cache=300
+                ),
+                timeout=self.timeout,
+                trace_configs=[self._trace(exchange)],
+                raise_for_status=True
+            )
+        return session
+
+    async def get(self, exchange: str, path: str, params: typing.Optional[dict] = None):
+        """GET request to the public API, returns decoded JSON"""
+        async with self.session(exchange).get(path, params=params) as response:
+            return await response.json()
+
+    async def close(self) -> None:
+        for session in self._sessions.values():
+            await session.close()
+        self._sessions.clear()
+        self._acquired.clear()
+        self._idle.clear()
+
+
+public_api = PublicApi(
+    BASE_URLS,
+    pool_size=base_config.PUBLIC_API_POOL_SIZE,
+    connect_timeout=base_config.PUBLIC_API_CONNECT_TIMEOUT,
+    read_timeout=base_config.PUBLIC_API_READ_TIMEOUT,
+    keepalive_timeout=base_config.PUBLIC_API_KEEPALIVE_TIMEOUT
+)
+
+
+async def get_prices_binance() -> typing.Dict[str, float]:
+    """All Binance spot prices in one request: symbol (BTCUSDT) -> price"""
 
     try:
-        r = requests.get(query)
-        return float(r.json()["price"])
-    except requests.exceptions.HTTPError as err:
-        logger.error("HTTPError Binance API: ", err)
-    except requests.exceptions.ConnectionError as err:
-        logger.error("ConnectionError Binance API: ", err)
-    except KeyError as err:
-        logger.error(f"Bad response Binance API: {r.text}. error: {err}")
-
+        r = await public_api.get("Binance", "/api/v3/ticker/price")
+        return {ticker["symbol"]: float(ticker["price"]) for ticker in r}
+    except aiohttp.ClientResponseError as err:
+        logger.error(f"HTTPError Binance API: {err}")
+    except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+        logger.error(f"ConnectionError Binance API: {err!r}")
+    except (KeyError, TypeError, ValueError) as err:
+        logger.error(f"Bad response Binance API: error: {err}")
+    return {}
 
-def get_price_bybit(coin_ticker: str, base_coin: str) -> float:
 
-    coin_ticker = coin_ticker.upper()
-    base_coin = base_coin.upper()
+async def get_prices_bybit() -> typing.Dict[str, float]:
+    """All Bybit spot prices in one request: symbol (BTCUSDT) -> price"""
 
     try:
-        session = HTTP(testnet=False)
-        return float(session.get_tickers(
-            category="spot",
-            symbol=coin_ticker+base_coin,
-        )["result"]['list'][0]["lastPrice"])
-    except FailedRequestError as err:
-        logger.error("FailedRequestError Bybit API: ", err)
-    except InvalidRequestError as err:
-        logger.error("InvalidRequestError Bybit API: ", err)
-    except KeyError as err:
+        r = await public_api.get("Bybit", "/v5/market/tickers", {"category": "spot"})
+        return {
+            ticker["symbol"]: float(ticker["lastPrice"])
+            for ticker in r["result"]["list"]
+            if ticker.get("lastPrice")
+        }
+    except aiohttp.ClientResponseError as err:
+        logger.error(f"HTTPError Bybit API: {err}")
+    except (aiohttp.ClientError, asyncio.TimeoutError) as err:
+        logger.error(f"ConnectionError Bybit API: {err!r}")
+    except (KeyError, TypeError, ValueError) as err:
         logger.error(f"Bad response Bybit API: error: {err}")
+    return {}
 
 
-
-
-def get_price(coin_ticker: str, exchange_name: str, base_coin: str) -> float:
+async def get_prices(exchange_name: str) -> typing.Dict[str, float]:
+    """Whole market snapshot of the exchange, lookups of any symbol cost nothing after it"""
 
     if exchange_name == "Binance":
-        price = get_price_binance(coin_ticker=coin_ticker, base_coin=base_coin)
-        return price
+        return await get_prices_binance()
     elif exchange_name == "Bybit":
-        price = get_price_bybit(coin_ticker=coin_ticker, base_coin=base_coin)
-        return price
+        return await get_prices_bybit()
     else:
-        print("Not supported exchange")
\ No newline at end of file
+        logger.error(f"Not supported exchange {exchange_name}")
+        return {}
+
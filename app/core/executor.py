@@ -0,0 +1,102 @@
+"""
+Модуль конкурентного исполнения тиков стратегии.
+"""
+import time
+import typing
+import asyncio
+
+
+T = typing.TypeVar('T')
+
+
+class TickExecutor:
+    """Исполнитель тика: обрабатывает элементы конкурентно с ограничением
+    числа одновременных задач.
+
+    Порядок запуска сдвигается от тика к тику (round-robin), чтобы одни и те же
+    пользователи не оказывались всегда в конце очереди.
+    """
+
+    def __init__(self, concurrency: int):
+        """
+        :param concurrency: Максимальное число одновременно обрабатываемых элементов.
+        """
+        self.concurrency = max(1, concurrency)
+        self._offset = 0
+
+    def order(self, items: typing.Sequence[T]) -> typing.List[T]:
+        """Функция возвращает элементы в порядке обработки текущего тика
+        и сдвигает начало очереди для следующего.
+
+        :param items: Элементы тика.
+
+        :return: Список элементов.
+        """
+        if not items:
+            return []
+
+        start = self._offset % len(items)
+        self._offset = start + self.concurrency
+
+        return list(items[start:]) + list(items[:start])
+
+    async def run(
+            self,
+            items: typing.Sequence[T],
+            handler: typing.Callable[[T], typing.Awaitable[typing.Any]]
+    ) -> typing.List[typing.Any]:
+        """Функция обрабатывает элементы тика.
+
+        Исключение одного элемента не прерывает обработку остальных,
+        а возвращается в списке результатов на его месте.
+
+        :param items: Элементы тика.
+        :param handler: Корутина обработки одного элемента.
+
+        :return: Результаты в порядке элементов items.
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def guarded(item: T):
+            async with semaphore:
+                return await handler(item)
+
+        indexes = self.order(range(len(items)))
+        outcomes = await asyncio.gather(
+            *(guarded(items[i]) for i in indexes),
+            return_exceptions=True
+        )
+
+        results: typing.List[typing.Any] = [None] * len(items)
+        for i, outcome in zip(indexes, outcomes):
+            results[i] = outcome
+        return results
+
+
+class UserLocks:
+    """Блокировки пользователей.
+
+    Гарантируют, что пользователь обрабатывается не более чем одним
+    обработчиком одновременно (периодический тик и конвейер событий),
+    и хранят время последней обработки.
+    """
+
+    def __init__(self):
+        self._locks: typing.Dict[int, asyncio.Lock] = {}
+        self._processed: typing.Dict[int, float] = {}
+
+    def __getitem__(self, user_id: int) -> asyncio.Lock:
+        lock = self._locks.get(user_id)
+        if lock is None:
+            lock = self._locks[user_id] = asyncio.Lock()
+        return lock
+
+    def touch(self, user_id: int) -> None:
+        """Функция отмечает обработку пользователя."""
+        self._processed[user_id] = time.monotonic()
+
+    def processed_since(self, user_id: int, moment: float) -> bool:
+        """Функция проверяет, обрабатывался ли пользователь после момента moment
+        (time.monotonic).
+        """
+        return self._processed.get(user_id, -1) > moment
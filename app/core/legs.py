@@ -0,0 +1,187 @@
+"""
+Модуль одновременного размещения ног арбитражной сделки.
+"""
+import time
+import uuid
+import typing
+import asyncio
+import logging
+from datetime import datetime
+
+from app import models
+from .exchange import AsyncExchange, ExchangeName, OrderStatus
+from .breaker import CircuitOpenError, is_outage
+
+
+logger = logging.getLogger(__name__)
+
+
+class LegError(Exception):
+    """Нога сделки не размещена. Размещенные ноги отменены, их id сохранены у пользователя."""
+    pass
+
+
+class LegTiming(typing.NamedTuple):
+    """Результат отправки одной ноги."""
+    exchange: ExchangeName
+    submitted: datetime
+    acked: datetime
+    rtt: float
+    result: typing.Any
+    error: typing.Optional[BaseException]
+
+
+class LatencyMeter:
+    """Скользящая (EWMA) оценка времени ответа бирж на размещение ордера."""
+
+    def __init__(self, alpha: float = 0.2):
+        """
+        :param alpha: Вес нового измерения.
+        """
+        self.alpha = alpha
+        self._rtt: typing.Dict[ExchangeName, float] = {}
+
+    def record(self, exchange: ExchangeName, rtt: float) -> None:
+        previous = self._rtt.get(exchange)
+        self._rtt[exchange] = rtt if previous is None else previous + self.alpha * (rtt - previous)
+
+    def get(self, exchange: ExchangeName) -> float:
+        """:return: Оценка RTT (в секундах), 0 - если измерений еще не было."""
+        return self._rtt.get(exchange, 0)
+
+
+class OrderJournal:
+    """Буфер записей о парах ордеров.
+
+    Записи сохраняются в той же транзакции, что и состояние пользователей.
+    """
+
+    def __init__(self):
+        self._pairs: typing.List[models.OrderPair] = []
+
+    def add(self, user_id: int, legs: typing.Sequence[LegTiming]) -> models.OrderPair:
+        """Функция добавляет запись о паре ордеров Bybit/Binance.
+
+        :param user_id: Идентификатор пользователя.
+        :param legs: Ноги в порядке отправки.
+        """
+        by_exchange = {leg.exchange: leg for leg in legs}
+        bybit, binance = by_exchange[ExchangeName.BYBIT], by_exchange[ExchangeName.BINANCE]
+
+        pair = models.OrderPair(
+            user_id=user_id,
+            first_exchange=models.ExchangeName(legs[0].exchange.value),
+            order_id_bybit=order_id(bybit),
+            order_id_binance=order_id(binance),
+            submitted_bybit=bybit.submitted,
+            submitted_binance=binance.submitted,
+            acked_bybit=bybit.acked,
+            acked_binance=binance.acked,
+            skew=skew(bybit, binance) * 1000
+        )
+        self._pairs.append(pair)
+        logger.debug(f"user {user_id} order pair: first {pair.first_exchange}, skew {pair.skew:.1f} ms")
+        return pair
+
+    def drain(self) -> typing.List[models.OrderPair]:
+        pairs, self._pairs = self._pairs, []
+        return pairs
+
+
+def order_id(leg: LegTiming) -> typing.Optional[str]:
+    """Функция возвращает идентификатор ордера ноги.
+
+    Результат ноги - ответ place_order (id ордера, статус) или id ордера.
+    Пустой ответ и отклоненный биржей ордер (REJECTED) - ордера нет.
+    """
+    if leg.error is not None or leg.result is None:
+        return None
+    if isinstance(leg.result, tuple):
+        result, status = leg.result
+        if status == OrderStatus.REJECTED:
+            return None
+    else:
+        result = leg.result
+    return str(result) if result is not None else None
+
+
+def new_client_order_id() -> str:
+    """Идентификатор ордера клиента (newClientOrderId Binance, orderLinkId Bybit)."""
+    return uuid.uuid4().hex
+
+
+def outcome_unknown(leg: LegTiming) -> bool:
+    """Запрос мог дойти до биржи: сбой сети или таймаут (а не отказ биржи или выключателя)."""
+    return leg.error is not None and not isinstance(leg.error, CircuitOpenError) and is_outage(leg.error)
+
+
+async def reconcile(exchange: AsyncExchange, symbol: str, client_order_id: str, leg: LegTiming) -> LegTiming:
+    """Функция ищет на бирже ордер ноги с неизвестным исходом по идентификатору клиента.
+
+    :return: Нога с id найденного ордера или исходная нога.
+    """
+    if not outcome_unknown(leg):
+        return leg
+    try:
+        found = await exchange.find_order(symbol, client_order_id)
+    except Exception as e:
+        logger.error(f"{leg.exchange.value} order {client_order_id} may be placed, lookup failed: {e}")
+        return leg
+
+    if found is None:
+        return leg
+    logger.warning(f"{leg.exchange.value} order {found} is placed despite error: {leg.error}")
+    return leg._replace(result=found, error=None)
+
+
+def skew(first: LegTiming, second: LegTiming) -> float:
+    """Функция оценивает расхождение ног: разница времени прихода ордеров на биржи
+    (время отправки + половина RTT).
+
+    :return: Расхождение (в секундах).
+    """
+    arrival_first = first.submitted.timestamp() + first.rtt / 2
+    arrival_second = second.submitted.timestamp() + second.rtt / 2
+    return abs(arrival_first - arrival_second)
+
+
+async def _send(meter: LatencyMeter, exchange: AsyncExchange,
+                submit: typing.Callable[[], typing.Awaitable[typing.Any]]) -> LegTiming:
+    submitted = datetime.now()
+    started = time.monotonic()
+    result, error = None, None
+    try:
+        result = await submit()
+    except Exception as e:
+        error = e
+    rtt = time.monotonic() - started
+
+    meter.record(exchange.name, rtt)
+    return LegTiming(exchange.name, submitted, datetime.now(), rtt, result, error)
+
+
+async def submit_legs(
+        legs: typing.Sequence[typing.Tuple[AsyncExchange, typing.Callable[[], typing.Awaitable[typing.Any]]]],
+        meter: LatencyMeter = None
+) -> typing.List[LegTiming]:
+    """Функция отправляет ноги одновременно.
+
+    Первой отправляется нога на биржу с большим измеренным RTT,
+    чтобы ордера приходили на биржи как можно ближе по времени.
+    Ошибка одной ноги не отменяет отправку остальных.
+
+    :param legs: Пары (клиент биржи, корутина размещения ордера).
+    :param meter: Оценка RTT бирж.
+
+    :return: Результаты ног в порядке отправки.
+    """
+    meter = meter or latency_meter
+    ordered = sorted(legs, key=lambda leg: meter.get(leg[0].name), reverse=True)
+
+    # задачи стартуют в порядке создания: запрос первой ноги уходит раньше
+    tasks = [asyncio.create_task(_send(meter, exchange, submit)) for exchange, submit in ordered]
+    return list(await asyncio.gather(*tasks))
+
+
+latency_meter = LatencyMeter()
+order_journal = OrderJournal()
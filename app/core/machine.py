@@ -0,0 +1,75 @@
+"""
+Модуль логики автоматической торговли без ввода-вывода.
+
+Решения конечного автомата AutoState зависят только от состояния пользователя
+и цен, поэтому одинаково используются в живой торговле (strategy)
+и в бэктесте. Функции цен работают как с числами, так и с массивами NumPy.
+"""
+from enum import IntEnum
+
+from app.models import AutoState, AutoStatus
+
+
+class Action(IntEnum):
+    """Действие тика для пользователя"""
+    NONE = 0
+    STOP = 1
+    INIT_PURCHASE = 2
+    CHECK_ORDERS = 3
+    SELL_BYBIT = 4
+    SELL_BINANCE = 5
+
+
+def now_equal_price(bybit_price, binance_price, epsilon):
+    """Check equal price"""
+    return abs(bybit_price - binance_price) < epsilon
+
+
+def spread_profit(volume, bybit_price, binance_price):
+    """Potential profit of arbitrage for volume"""
+    return abs(volume * bybit_price - volume * binance_price)
+
+
+def is_arbitrage(volume, bybit_price, binance_price, threshold):
+    return spread_profit(volume, bybit_price, binance_price) >= threshold
+
+
+def arbitrage_action(bybit_price: float, binance_price: float) -> Action:
+    """Sell where the price is higher, buy where it is lower"""
+    return Action.SELL_BYBIT if bybit_price >= binance_price else Action.SELL_BINANCE
+
+
+def decide(state: AutoState, bybit_price: float, binance_price: float,
+           volume: float, threshold: float, epsilon: float) -> Action:
+    """Action of the state machine for current prices"""
+    if state == AutoState.ON_STOP:
+        return Action.STOP
+    if state == AutoState.INITIAL:
+        return Action.INIT_PURCHASE if now_equal_price(bybit_price, binance_price, epsilon) else Action.NONE
+    if state == AutoState.WAIT_FILLED:
+        # does not depend on prices
+        return Action.CHECK_ORDERS
+    if state == AutoState.IN_PROGRESS and is_arbitrage(volume, bybit_price, binance_price, threshold):
+        return arbitrage_action(bybit_price, binance_price)
+    return Action.NONE
+
+
+def order_timed_out(waited_seconds: float, wait_order_minutes: float) -> bool:
+    """Order waits for fill longer than wait_order_minutes (full minutes)"""
+    return waited_seconds // 60 > wait_order_minutes
+
+
+def orders_transition(status: AutoStatus, filled: bool, timed_out: bool) -> tuple[AutoState, bool]:
+    """Next state in WAIT_FILLED.
+
+    :param filled: both orders are filled
+    :param timed_out: one of orders waits too long
+
+    :return: next state and whether open orders must be cancelled
+    """
+    if filled:
+        return AutoState.IN_PROGRESS, False
+    # initial purchase is never cancelled by timeout
+    if timed_out and status == AutoStatus.PLAY:
+        return AutoState.IN_PROGRESS, True
+    return AutoState.WAIT_FILLED, False
@@ -0,0 +1,155 @@
+"""
+Модуль рыночных данных.
+"""
+import time
+import typing
+import asyncio
+import logging
+from types import MappingProxyType
+
+from app.core.config import base_config
+from .exchange import AsyncExchange, AsyncBinanceExchange, AsyncBybitExchange, ExchangeName
+from .streams import MarketStreams, PriceStore, PriceKey
+from .ticks import TickRecorder
+
+
+logger = logging.getLogger(__name__)
+
+
+class MarketSnapshot:
+    """Снимок цен на момент тика (только для чтения).
+
+    Ключ цены - (биржа, символ в формате биржи).
+    """
+    __slots__ = ('_prices', 'created')
+
+    def __init__(self, prices: typing.Dict[PriceKey, float], created: float = None):
+        self._prices = MappingProxyType(dict(prices))
+        self.created = created if created is not None else time.time()
+
+    @property
+    def prices(self) -> typing.Mapping[PriceKey, float]:
+        return self._prices
+
+    def price(self, exchange: typing.Union[ExchangeName, str], symbol: str) -> float:
+        """Функция возвращает цену символа на бирже.
+
+        :param exchange: Биржа.
+        :param symbol: Символ в формате биржи.
+
+        :return: Цена. KeyError, если цена не была получена.
+        """
+        return self._prices[(ExchangeName(exchange), symbol)]
+
+    def __contains__(self, key: PriceKey) -> bool:
+        return (ExchangeName(key[0]), key[1]) in self._prices
+
+    def __len__(self):
+        return len(self._prices)
+
+
+class MarketData:
+    """Источник цен для стратегии.
+
+    Цены берутся из WebSocket потоков бирж, если они запущены и цена свежая.
+    Остальные уникальные пары (биржа, символ) запрашиваются один раз за тик
+    через публичные REST клиенты бирж, независимо от числа пользователей.
+    """
+
+    exchanges: typing.Dict[ExchangeName, typing.Type[AsyncExchange]] = {
+        ExchangeName.BINANCE: AsyncBinanceExchange,
+        ExchangeName.BYBIT: AsyncBybitExchange,
+    }
+
+    def __init__(self, test: bool = False, streams: MarketStreams = None, max_age: float = None,
+                 recorder: TickRecorder = None):
+        """
+        :param test: Тестовый режим бирж.
+        :param streams: Потоки цен.
+        :param max_age: Максимальный возраст цены из потока (в секундах).
+        :param recorder: Запись цен, полученных через REST (цены потоков пишет PriceStore).
+        """
+        self.test = test
+        self.streams = streams
+        self.max_age = max_age
+        self.recorder = recorder
+        self._clients: typing.Dict[ExchangeName, AsyncExchange] = {}
+        self._lock = asyncio.Lock()
+
+    async def _client(self, exchange: ExchangeName) -> AsyncExchange:
+        async with self._lock:
+            client = self._clients.get(exchange)
+            if client is None:
+                client = self.exchanges[exchange](api_key=None, api_secret=None, test=self.test)
+                await client.connect()
+                self._clients[exchange] = client
+        return client
+
+    async def _fetch(self, key: PriceKey) -> typing.Optional[float]:
+        exchange, symbol = key
+        try:
+            client = await self._client(exchange)
+            price = await client.get_price(symbol)
+        except Exception as e:
+            logger.error(f"{exchange} Error getting price {symbol}: {e}")
+            return None
+
+        if self.recorder is not None:
+            self.recorder.record(exchange, symbol, price)
+        return price
+
+    async def snapshot(self, keys: typing.Iterable[PriceKey]) -> MarketSnapshot:
+        """Функция запрашивает цены и возвращает снимок.
+
+        Цены, которые не удалось получить, в снимок не попадают.
+
+        :param keys: Пары (биржа, символ).
+
+        :return: MarketSnapshot
+        """
+        keys = list({(ExchangeName(exchange), symbol) for exchange, symbol in keys})
+
+        prices = {}
+        if self.streams is not None and self.streams.running:
+            await self.streams.subscribe(keys)
+            for key in keys:
+                price = self.streams.store.get(key, max_age=self.max_age)
+                if price is not None:
+                    prices[key] = price
+
+        missing = [key for key in keys if key not in prices]
+        for key, price in zip(missing, await asyncio.gather(*(self._fetch(key) for key in missing))):
+            if price is not None:
+                prices[key] = price
+
+        return MarketSnapshot(prices)
+
+    def start(self) -> None:
+        """Функция запускает потоки цен и запись тиков."""
+        if self.recorder is not None:
+            self.recorder.start()
+        if self.streams is not None:
+            self.streams.start()
+
+    async def close(self) -> None:
+        """Функция останавливает потоки и закрывает публичные клиенты бирж."""
+        if self.streams is not None:
+            await self.streams.stop()
+        for client in self._clients.values():
+            await client.close()
+        self._clients.clear()
+        if self.recorder is not None:
+            await self.recorder.stop()
+
+
+tick_recorder = TickRecorder(base_config.TICKS_PATH) if base_config.TICKS_PATH else None
+
+market_data = MarketData(
+    test=base_config.TEST_API,
+    streams=MarketStreams(
+        store=PriceStore(recorder=tick_recorder),
+        test=base_config.TEST_API
+    ) if base_config.MARKET_STREAMS else None,
+    max_age=base_config.MARKET_PRICE_MAX_AGE,
+    recorder=tick_recorder
+)
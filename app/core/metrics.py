@@ -0,0 +1,144 @@
+"""
+Модуль метрик Prometheus.
+"""
+import time
+import typing
+import functools
+
+from celery.signals import before_task_publish, after_task_publish
+from prometheus_client import Counter, Gauge, Histogram
+
+
+TICK_DURATION = Histogram(
+    'arbi_tick_duration_seconds',
+    'Duration of a strategy tick',
+    ['task'],
+    buckets=(.05, .1, .25, .5, 1, 2.5, 5, 10, 15, 30, 60, 120)
+)
+
+PHASE_DURATION = Histogram(
+    'arbi_phase_duration_seconds',
+    'Duration of a tick phase',
+    ['task', 'phase'],
+    buckets=(.001, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30)
+)
+
+EXCHANGE_LATENCY = Histogram(
+    'arbi_exchange_request_seconds',
+    'Latency of exchange requests',
+    ['exchange', 'operation'],
+    buckets=(.01, .025, .05, .1, .2, .3, .5, .75, 1, 2.5, 5, 10)
+)
+
+EXCHANGE_ERRORS = Counter(
+    'arbi_exchange_errors_total',
+    'Failed exchange requests',
+    ['exchange', 'operation']
+)
+
+RATE_LIMIT_WAIT = Histogram(
+    'arbi_rate_limit_wait_seconds',
+    'Time requests wait for exchange rate limits',
+    ['exchange', 'operation'],
+    buckets=(.001, .01, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60)
+)
+
+CIRCUIT_STATE = Gauge(
+    'arbi_exchange_circuit_state',
+    'Exchange circuit breaker state (0 closed, 1 half-open, 2 open)',
+    ['exchange']
+)
+
+TICK_ERRORS = Counter(
+    'arbi_tick_errors_total',
+    'Unhandled errors of processing a user in a tick',
+    ['task']
+)
+
+STATE_TRANSITIONS = Counter(
+    'arbi_state_transitions_total',
+    'Auto trading state transitions of users',
+    ['from_state', 'to_state']
+)
+
+NOTIFICATIONS = Counter(
+    'arbi_notifications_total',
+    'Notifications sent to the bot',
+    ['task']
+)
+
+NOTIFICATION_QUEUE = Gauge(
+    'arbi_notification_queue',
+    'Notifications waiting in the outbox'
+)
+
+PUBLIC_API_CONNECTIONS = Counter(
+    'arbi_public_api_connections_total',
+    'Connections of public exchange API pools (created or reused)',
+    ['exchange', 'event']
+)
+
+PUBLIC_API_IN_FLIGHT = Gauge(
+    'arbi_public_api_in_flight',
+    'Requests to public exchange APIs in flight',
+    ['exchange']
+)
+
+PUBLIC_API_POOL = Gauge(
+    'arbi_public_api_pool',
+    'Connection pools of public exchange APIs (limit, idle and acquired connections)',
+    ['exchange', 'state']
+)
+
+
+def phase(task: str, name: str):
+    """Контекстный менеджер замера фазы тика.
+
+    :param task: Задача (auto_mode, pipeline, update_arbi_situations).
+    :param name: Фаза.
+    """
+    return PHASE_DURATION.labels(task, name).time()
+
+
+def exchange_request(operation: str):
+    """Декоратор метода клиента биржи: время ответа и ошибки по бирже."""
+    def decorator(method):
+        @functools.wraps(method)
+        async def wrapper(self, *args, **kwargs):
+            exchange = getattr(self.name, 'value', self.name)
+            started = time.perf_counter()
+            try:
+                return await method(self, *args, **kwargs)
+            except Exception:
+                EXCHANGE_ERRORS.labels(exchange, operation).inc()
+                raise
+            finally:
+                EXCHANGE_LATENCY.labels(exchange, operation).observe(time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+def state_transition(before: typing.Any, after: typing.Any) -> None:
+    if before != after:
+        STATE_TRANSITIONS.labels(
+            getattr(before, 'name', str(before)),
+            getattr(after, 'name', str(after))
+        ).inc()
+
+
+# время отправки уведомлений в брокер бота: id задачи -> начало отправки
+_publishing: typing.Dict[str, float] = {}
+
+
+@before_task_publish.connect
+def _before_publish(sender=None, headers=None, **kwargs):
+    if headers and 'id' in headers:
+        _publishing[headers['id']] = time.perf_counter()
+
+
+@after_task_publish.connect
+def _after_publish(sender=None, headers=None, **kwargs):
+    started = _publishing.pop((headers or {}).get('id'), None)
+    NOTIFICATIONS.labels(sender).inc()
+    if started is not None:
+        PHASE_DURATION.labels('bot', 'notification').observe(time.perf_counter() - started)
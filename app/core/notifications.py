@@ -0,0 +1,216 @@
+"""
+Модуль очереди уведомлений бота (outbox).
+
+db.bot_sender.send_task - синхронная публикация задачи в брокер Celery (Redis):
+вызов из цикла событий блокирует его на время обращения к брокеру.
+Outbox принимает уведомления без ожидания, а публикует их пачками в фоновом
+потоке через одно соединение с брокером - по окончании тика auto_mode
+и раз в flush_interval.
+
+Сообщения 'debug' одного пользователя объединяются в одно: не больше одной
+задачи 'debug' на пользователя за пачку и не чаще debug_interval, остальное
+копится в сводку (ошибки отправляются сразу). Повторяющиеся состояния
+(DEDUPLICATED: need_transfer каждый тик) отправляются один раз за пачку,
+события (прибыль, новые ситуации) - все.
+Задачи пачки, которые не удалось опубликовать, возвращаются в начало очереди
+(не больше retry_limit задач) и отправляются при следующей публикации;
+уже опубликованные задачи пачки повторно не отправляются.
+"""
+import time
+import typing
+import asyncio
+import logging
+
+from app import db
+from app.core.config import base_config
+from .metrics import NOTIFICATION_QUEUE
+
+
+logger = logging.getLogger(__name__)
+
+LEVELS = {'INFO': 0, 'WARNING': 1, 'ERROR': 2}
+# уведомления о состоянии, повтор которых ничего не добавляет
+DEDUPLICATED = ('need_transfer',)
+
+
+class _Digest:
+    """Накопленные сообщения 'debug' пользователя."""
+
+    def __init__(self):
+        self.level = 'INFO'
+        self.lines: typing.List[str] = []
+        self.skipped = 0
+
+    def add(self, level: str, text: str, max_lines: int) -> None:
+        if LEVELS.get(level, 0) > LEVELS.get(self.level, 0):
+            self.level = level
+        self.lines.append(text.strip('\n'))
+        if len(self.lines) > max_lines:
+            # старые сообщения теряют актуальность первыми
+            self.lines.pop(0)
+            self.skipped += 1
+
+    def args(self, telegram_id: str) -> tuple:
+        text = '\n\n'.join(self.lines)
+        if self.skipped:
+            text = f"(пропущено сообщений: {self.skipped})\n\n{text}"
+        return telegram_id, self.level, f"\n{text}"
+
+
+class Outbox:
+    """Очередь уведомлений процесса стратегии.
+
+    Пока очередь не запущена (API, скрипты), уведомления отправляются сразу.
+    """
+
+    def __init__(self, sender, flush_interval: float = 1, batch_size: int = 500, retry_limit: int = 5000,
+                 debug_interval: float = 30, debug_max_lines: int = 20):
+        """
+        :param sender: Приложение Celery бота.
+        :param flush_interval: Период отправки (в секундах).
+        :param batch_size: Задач в одной публикации.
+        :param retry_limit: Неопубликованных задач, которые хранятся до следующей публикации.
+        :param debug_interval: Минимальный интервал сообщений 'debug' пользователю (в секундах).
+        :param debug_max_lines: Сообщений в сводке 'debug'.
+        """
+        self.sender = sender
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.retry_limit = retry_limit
+        self.debug_interval = debug_interval
+        self.debug_max_lines = debug_max_lines
+
+        self._tasks: typing.List[typing.Tuple[str, tuple]] = []
+        self._keys: typing.Set[tuple] = set()
+        self._digests: typing.Dict[str, _Digest] = {}
+        # telegram_id -> время последней отправки 'debug'
+        self._sent: typing.Dict[str, float] = {}
+
+        self._wakeup = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task: typing.Optional[asyncio.Task] = None
+
+    def __len__(self):
+        return len(self._tasks) + len(self._digests)
+
+    def send_task(self, name: str, args: tuple) -> None:
+        """Функция ставит уведомление в очередь (аргументы как у Celery.send_task)."""
+        if self._task is None:
+            self.sender.send_task(name, args)
+            return
+
+        if name == 'debug':
+            telegram_id, level, text = args
+            digest = self._digests.get(telegram_id)
+            if digest is None:
+                digest = self._digests[telegram_id] = _Digest()
+            digest.add(level, text, self.debug_max_lines)
+        else:
+            if name in DEDUPLICATED:
+                key = (name, repr(args))
+                if key in self._keys:
+                    return
+                self._keys.add(key)
+            self._tasks.append((name, args))
+        NOTIFICATION_QUEUE.set(len(self))
+
+    def wake(self) -> None:
+        """Функция отправляет накопленное, не дожидаясь flush_interval (конец тика)."""
+        self._wakeup.set()
+
+    def _collect(self, force: bool) -> typing.List[typing.Tuple[str, tuple]]:
+        now = time.monotonic()
+        batch = []
+        for telegram_id, digest in list(self._digests.items()):
+            if (force or digest.level == 'ERROR' or
+                    now - self._sent.get(telegram_id, -self.debug_interval) >= self.debug_interval):
+                batch.append(('debug', digest.args(telegram_id)))
+                self._sent[telegram_id] = now
+                del self._digests[telegram_id]
+
+        batch.extend(self._tasks)
+        self._tasks, self._keys = [], set()
+
+        self._sent = {telegram_id: sent for telegram_id, sent in self._sent.items()
+                      if now - sent < self.debug_interval}
+        return batch
+
+    def _requeue(self, failed: typing.List[typing.Tuple[str, tuple]]) -> None:
+        # новые задачи остаются за неотправленными, старые теряют актуальность первыми
+        tasks = failed + self._tasks
+        dropped = len(tasks) - self.retry_limit
+        if dropped > 0:
+            logger.error(f"notifications are dropped ({dropped}): retry queue is full")
+            tasks = tasks[dropped:]
+        self._tasks = tasks
+        self._keys = {(name, repr(args)) for name, args in tasks if name in DEDUPLICATED}
+
+    def _publish(self, batch: typing.List[typing.Tuple[str, tuple]]) -> typing.List[typing.Tuple[str, tuple]]:
+        """Функция публикует пачку через одно соединение с брокером.
+
+        :return: Неопубликованный остаток пачки.
+        """
+        sent = 0
+        try:
+            with self.sender.producer_or_acquire() as producer:
+                for name, args in batch:
+                    self.sender.send_task(name, args, producer=producer)
+                    sent += 1
+        except Exception as e:
+            logger.error(f"notifications are not sent ({len(batch) - sent}), will retry: {e!r}")
+        return batch[sent:]
+
+    async def flush(self, force: bool = False) -> int:
+        """Функция публикует накопленные уведомления.
+
+        :param force: Отправить и сводки 'debug', интервал которых не истек.
+
+        :return: Число опубликованных задач.
+        """
+        async with self._lock:
+            batch = self._collect(force)
+            NOTIFICATION_QUEUE.set(len(self))
+
+            sent = 0
+            failed = []
+            for i in range(0, len(batch), self.batch_size):
+                chunk = batch[i:i + self.batch_size]
+                unsent = await asyncio.to_thread(self._publish, chunk)
+                sent += len(chunk) - len(unsent)
+                failed.extend(unsent)
+
+            if failed:
+                self._requeue(failed)
+                NOTIFICATION_QUEUE.set(len(self))
+            return sent
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Функция останавливает очередь и отправляет все накопленное."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush(force=True)
+
+
+outbox = Outbox(
+    db.bot_sender,
+    flush_interval=base_config.NOTIFY_FLUSH_INTERVAL,
+    batch_size=base_config.NOTIFY_BATCH_SIZE,
+    retry_limit=base_config.NOTIFY_RETRY_LIMIT,
+    debug_interval=base_config.NOTIFY_DEBUG_INTERVAL,
+    debug_max_lines=base_config.NOTIFY_DEBUG_MAX_LINES
+)
@@ -0,0 +1,289 @@
+"""
+Модуль отслеживания исполнения ордеров через приватные потоки бирж.
+"""
+import hmac
+import json
+import time
+import typing
+import asyncio
+import hashlib
+import logging
+from abc import ABC, abstractmethod
+
+import websockets
+
+from .exchange import (
+    AsyncExchange, ExchangeName, OrderStatus,
+    BinanceExchange, BybitExchange
+)
+from .client_pool import client_pool
+
+
+logger = logging.getLogger(__name__)
+
+FINAL_STATUSES = (OrderStatus.FILLED, OrderStatus.CANCELED, OrderStatus.REJECTED, OrderStatus.EXPIRED)
+
+
+class UserDataStream(ABC):
+    """Приватный поток ордеров одного аккаунта биржи.
+
+    После каждого (пере)подключения статусы отслеживаемых ордеров
+    сверяются через REST, чтобы не потерять события за время разрыва.
+    """
+    url: str
+    test_url: str
+
+    def __init__(self, tracker: "OrderTracker", client: AsyncExchange,
+                 reconnect_delay: float = 1, max_reconnect_delay: float = 30):
+        self.tracker = tracker
+        self.client = client
+        self.base_url = self.test_url if client.test else self.url
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+
+        self.connected = False
+        self._task: typing.Optional[asyncio.Task] = None
+
+    @property
+    def key(self) -> tuple:
+        return self.client.name, self.client.api_key
+
+    @abstractmethod
+    async def endpoint(self) -> str:
+        pass
+
+    @abstractmethod
+    async def on_connect(self, ws) -> None:
+        """Аутентификация и подписка."""
+        pass
+
+    @abstractmethod
+    def parse(self, message: dict) -> typing.Iterable[typing.Tuple[str, OrderStatus]]:
+        """Сообщение потока -> (id ордера, статус)"""
+        pass
+
+    async def heartbeat(self, ws) -> None:
+        pass
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self.connected = False
+
+    async def run(self) -> None:
+        delay = self.reconnect_delay
+        while True:
+            heartbeat = None
+            try:
+                async with websockets.connect(await self.endpoint()) as ws:
+                    await self.on_connect(ws)
+                    heartbeat = asyncio.create_task(self.heartbeat(ws))
+
+                    self.connected = True
+                    delay = self.reconnect_delay
+                    await self.tracker.reconcile(self)
+
+                    async for raw in ws:
+                        try:
+                            message = json.loads(raw)
+                        except ValueError:
+                            continue
+                        for order_id, status in self.parse(message):
+                            self.tracker.update(self.client.name, order_id, status)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"{self.client.name} user stream error: {e!r}. Reconnect in {delay}s")
+            finally:
+                self.connected = False
+                if heartbeat:
+                    heartbeat.cancel()
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+
+class BinanceUserStream(UserDataStream):
+    url = 'wss://stream.binance.com:9443/ws/'
+    test_url = 'wss://testnet.binance.vision/ws/'
+
+    # listenKey живет 60 минут без продления
+    keepalive_interval = 30 * 60
+
+    listen_key: str = None
+
+    async def endpoint(self):
+        self.listen_key = await self.client.session.stream_get_listen_key()
+        return self.base_url + self.listen_key
+
+    async def on_connect(self, ws):
+        pass
+
+    async def heartbeat(self, ws):
+        while True:
+            await asyncio.sleep(self.keepalive_interval)
+            await self.client.session.stream_keepalive(self.listen_key)
+
+    def parse(self, message):
+        if message.get('e') == 'executionReport':
+            status = BinanceExchange.order_status_map.get(message['X'])
+            if status is not None:
+                yield str(message['i']), status
+
+
+class BybitUserStream(UserDataStream):
+    url = 'wss://stream.bybit.com/v5/private'
+    test_url = 'wss://stream-testnet.bybit.com/v5/private'
+
+    ping_interval = 20
+
+    async def endpoint(self):
+        return self.base_url
+
+    async def on_connect(self, ws):
+        expires = int((time.time() + 10) * 1000)
+        signature = hmac.new(
+            self.client.api_secret.encode(),
+            f'GET/realtime{expires}'.encode(),
+            hashlib.sha256
+        ).hexdigest()
+
+        await ws.send(json.dumps({'op': 'auth', 'args': [self.client.api_key, expires, signature]}))
+        response = json.loads(await ws.recv())
+        if not response.get('success'):
+            raise ConnectionError(f"auth failed: {response.get('ret_msg')}")
+
+        await ws.send(json.dumps({'op': 'subscribe', 'args': ['order']}))
+
+    async def heartbeat(self, ws):
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            await ws.send(json.dumps({'op': 'ping'}))
+
+    def parse(self, message):
+        if message.get('topic') == 'order':
+            for order in message.get('data', []):
+                status = BybitExchange.order_status_map.get(str(order.get('orderStatus', '')).upper())
+                if status is not None:
+                    yield str(order['orderId']), status
+
+
+class OrderTracker:
+    """Статусы ордеров в памяти по событиям приватных потоков бирж.
+
+    Поток аккаунта запускается, пока у аккаунта есть отслеживаемые ордера.
+    При исполнении или отмене ордера вызывается listener(user_id),
+    чтобы пересчитать состояние пользователя без ожидания тика.
+
+    Хранятся только статусы отслеживаемых ордеров. Клиенты бирж ордеров
+    и потоков взяты из пула в аренду и возвращаются при прекращении отслеживания.
+    """
+
+    streams: typing.Dict[ExchangeName, typing.Type[UserDataStream]] = {
+        ExchangeName.BINANCE: BinanceUserStream,
+        ExchangeName.BYBIT: BybitUserStream,
+    }
+
+    def __init__(self):
+        self.listener: typing.Optional[typing.Callable[[int], None]] = None
+
+        # (биржа, id ордера) -> статус отслеживаемого ордера
+        self._statuses: typing.Dict[tuple, OrderStatus] = {}
+        # (биржа, id ордера) -> (id пользователя, клиент, символ)
+        self._orders: typing.Dict[tuple, typing.Tuple[int, AsyncExchange, str]] = {}
+        # (биржа, api_key) -> поток
+        self._streams: typing.Dict[tuple, UserDataStream] = {}
+
+    def track(self, user_id: int, client: AsyncExchange, symbol: str, order_id: typing.Optional[str]) -> None:
+        """Функция начинает отслеживать ордер пользователя.
+
+        :param user_id: Идентификатор пользователя.
+        :param client: Клиент биржи аккаунта пользователя.
+        :param symbol: Символ ордера.
+        :param order_id: Идентификатор ордера.
+        """
+        if not order_id:
+            return
+
+        key = (client.name, str(order_id))
+        if key in self._orders:
+            return
+        self._orders[key] = (user_id, client, symbol)
+        client_pool.lease(client)
+
+        account = (client.name, client.api_key)
+        # без потока биржи (симулятор) статусы проверяются через REST
+        if account not in self._streams and client.name in self.streams:
+            stream = self.streams[client.name](self, client)
+            self._streams[account] = stream
+            client_pool.lease(client)
+            stream.start()
+
+    def untrack(self, user_id: int) -> None:
+        """Функция прекращает отслеживание ордеров пользователя
+        и останавливает ненужные потоки аккаунтов."""
+        for key, (owner, client, _) in list(self._orders.items()):
+            if owner == user_id:
+                del self._orders[key]
+                self._statuses.pop(key, None)
+                client_pool.release(client)
+
+        accounts = {(client.name, client.api_key) for _, client, _ in self._orders.values()}
+        for account in list(self._streams):
+            if account not in accounts:
+                self._stop(self._streams.pop(account))
+
+    @staticmethod
+    def _stop(stream: UserDataStream) -> None:
+        stream.stop()
+        client_pool.release(stream.client)
+
+    def status(self, client: AsyncExchange, order_id: typing.Optional[str]) -> typing.Optional[OrderStatus]:
+        """Функция возвращает статус ордера из потока.
+
+        :return: Статус или None, если ордер не отслеживается
+                 или поток аккаунта сейчас не подключен.
+        """
+        if not order_id:
+            return None
+
+        stream = self._streams.get((client.name, client.api_key))
+        if stream is None or not stream.connected:
+            return None
+
+        return self._statuses.get((client.name, str(order_id)))
+
+    def update(self, exchange: ExchangeName, order_id: str, status: OrderStatus) -> None:
+        key = (exchange, order_id)
+        owner = self._orders.get(key)
+        # событие, пришедшее раньше ответа на размещение, не хранится: до него статус проверяется через REST
+        if owner is None:
+            return
+
+        previous = self._statuses.get(key)
+        self._statuses[key] = status
+        if status != previous and status in FINAL_STATUSES and self.listener is not None:
+            self.listener(owner[0])
+
+    async def reconcile(self, stream: UserDataStream) -> None:
+        """Функция сверяет статусы ордеров аккаунта через REST."""
+        for (exchange, order_id), (_, client, symbol) in list(self._orders.items()):
+            if (exchange, client.api_key) != stream.key:
+                continue
+            try:
+                self.update(exchange, order_id, await client.check_order(symbol=symbol, order_id=order_id))
+            except Exception as e:
+                logger.warning(f"{exchange} reconcile error for order {order_id}: {e}")
+
+    def close(self) -> None:
+        for stream in self._streams.values():
+            self._stop(stream)
+        self._streams.clear()
+
+
+order_tracker = OrderTracker()
@@ -0,0 +1,257 @@
+"""
+Модуль событийного конвейера стратегии.
+
+Стадии связаны ограниченными очередями asyncio:
+цены из потоков бирж -> поиск спредов -> решение по пользователю ->
+исполнение ордеров -> сохранение состояния.
+"""
+import typing
+import asyncio
+import logging
+
+import sqlalchemy as sa
+import sqlalchemy.exc
+from sqlalchemy.orm import joinedload
+
+from app import models, db
+from app.core.config import base_config
+from .exchange import ExchangeName
+from .executor import UserLocks
+from .market_data import MarketData, market_data
+from .orders import order_tracker
+from .metrics import phase
+from .sharding import shard_coordinator
+from .streams import PriceKey
+from .strategy import (
+    is_active, needs_action, price_keys, process_user,
+    save_states, state_values, users_query, user_locks
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+def _drain(queue: asyncio.Queue, first) -> list:
+    items = [first]
+    while not queue.empty():
+        items.append(queue.get_nowait())
+    return items
+
+
+class StrategyPipeline:
+    """Событийный конвейер auto trading.
+
+    Состояние пользователя пересчитывается сразу после изменения цены
+    его монеты, без ожидания периодического тика. Пользователь
+    находится в конвейере не более одного раза одновременно.
+    """
+
+    def __init__(self, market_data: MarketData, locks: UserLocks, concurrency: int,
+                 queue_size: int, refresh_interval: float):
+        """
+        :param market_data: Источник цен (с запущенными потоками).
+        :param locks: Блокировки пользователей.
+        :param concurrency: Число обработчиков стадий решения и исполнения.
+        :param queue_size: Размер очередей между стадиями.
+        :param refresh_interval: Период обновления списка отслеживаемых пользователей (в секундах).
+        """
+        self.market_data = market_data
+        self.locks = locks
+        self.concurrency = max(1, concurrency)
+        self.queue_size = queue_size
+        self.refresh_interval = refresh_interval
+
+        self.prices: typing.Optional[asyncio.Queue] = None
+        self.decisions: asyncio.Queue = asyncio.Queue(queue_size)
+        self.orders: asyncio.Queue = asyncio.Queue(self.concurrency)
+        self.results: asyncio.Queue = asyncio.Queue(queue_size)
+
+        # (биржа, символ) -> id пользователей
+        self._watchers: typing.Dict[PriceKey, typing.Set[int]] = {}
+        # id пользователя -> (пользователь, его ключи цен)
+        self._users: typing.Dict[int, typing.Tuple[models.User, typing.List[PriceKey]]] = {}
+        # пользователи, находящиеся в конвейере
+        self._pending: typing.Set[int] = set()
+
+        self._tasks: typing.List[asyncio.Task] = []
+
+    def start(self) -> None:
+        """Функция запускает стадии конвейера."""
+        if self._tasks:
+            return
+
+        self.prices = self.market_data.streams.store.listen(self.queue_size)
+        order_tracker.listener = self.wake
+        self._tasks = [
+            asyncio.create_task(self._refresh_loop()),
+            asyncio.create_task(self._detect()),
+            asyncio.create_task(self._persist()),
+            *(asyncio.create_task(self._decide()) for _ in range(self.concurrency)),
+            *(asyncio.create_task(self._execute()) for _ in range(self.concurrency)),
+        ]
+
+    async def stop(self) -> None:
+        """Функция останавливает конвейер."""
+        order_tracker.listener = None
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def wake(self, user_id: int) -> None:
+        """Функция ставит пользователя в конвейер без проверки цен
+        (например, по событию исполнения ордера).
+
+        :param user_id: Идентификатор пользователя.
+        """
+        if user_id in self._pending:
+            return
+        try:
+            self.decisions.put_nowait((user_id, True))
+        except asyncio.QueueFull:
+            # пользователя обработает периодический тик
+            return
+        self._pending.add(user_id)
+
+    async def refresh(self) -> None:
+        """Функция обновляет список отслеживаемых пользователей и подписки на цены."""
+        async with db.session.Session() as session:
+            users = (await session.scalars(sa.select(models.User).options(
+                joinedload(models.User.target_coin)
+            ))).all()
+
+        watchers: typing.Dict[PriceKey, typing.Set[int]] = {}
+        registry = {}
+        for user in users:
+            if not is_active(user) or not shard_coordinator.owns(user.id):
+                continue
+            keys = [(ExchangeName(exchange), symbol) for exchange, symbol in price_keys(user)]
+            registry[user.id] = (user, keys)
+            for key in keys:
+                watchers.setdefault(key, set()).add(user.id)
+
+        self._watchers = watchers
+        self._users = registry
+
+        await self.market_data.streams.subscribe(watchers)
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"pipeline refresh error: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    async def _detect(self) -> None:
+        """Стадия поиска спредов: изменившиеся цены -> пользователи, которым нужно действие."""
+        store = self.market_data.streams.store
+        while True:
+            keys = set(_drain(self.prices, await self.prices.get()))
+
+            user_ids = set()
+            for key in keys:
+                user_ids |= self._watchers.get(key, set())
+
+            for user_id in user_ids - self._pending:
+                user, (bybit_key, binance_key) = self._users[user_id]
+                bybit_price = store.get(bybit_key, self.market_data.max_age)
+                binance_price = store.get(binance_key, self.market_data.max_age)
+                if bybit_price is None or binance_price is None:
+                    continue
+
+                if needs_action(user, bybit_price, binance_price):
+                    self._pending.add(user_id)
+                    await self.decisions.put((user_id, False))
+
+    async def _decide(self) -> None:
+        """Стадия решения: актуальное состояние пользователя из БД и свежие цены."""
+        while True:
+            user_id, force = await self.decisions.get()
+
+            if not shard_coordinator.acquire(user_id):
+                self._pending.discard(user_id)
+                continue
+
+            lock = self.locks[user_id]
+            await lock.acquire()
+            try:
+                with phase('pipeline', 'user_load'):
+                    async with db.session.Session() as session:
+                        user = await session.scalar(users_query().where(models.User.id == user_id))
+
+                if user is not None and is_active(user):
+                    with phase('pipeline', 'price_fetch'):
+                        snapshot = await self.market_data.snapshot(price_keys(user))
+                    bybit_key, binance_key = price_keys(user)
+                    if bybit_key in snapshot and binance_key in snapshot and (force or needs_action(
+                            user, snapshot.price(*bybit_key), snapshot.price(*binance_key))):
+                        # блокировка передается дальше и снимается после сохранения
+                        await self.orders.put((user, snapshot, state_values(user)))
+                        continue
+            except Exception as e:
+                logger.error(f"pipeline decision error for user {user_id}: {e}")
+
+            self._done(user_id)
+
+    async def _execute(self) -> None:
+        """Стадия исполнения ордеров."""
+        while True:
+            user, snapshot, before = await self.orders.get()
+            try:
+                await process_user(user, snapshot, task='pipeline')
+            finally:
+                await self.results.put((user, before))
+
+    async def _persist(self) -> None:
+        """Стадия сохранения: изменения состояния пачкой в одной транзакции."""
+        while True:
+            batch = _drain(self.results, await self.results.get())
+            try:
+                with phase('pipeline', 'commit'):
+                    await self.save(batch)
+                for user, _ in batch:
+                    self._update(user)
+            except Exception as e:
+                logger.error(f"pipeline persist error: {e}")
+            finally:
+                for user, _ in batch:
+                    self.locks.touch(user.id)
+                    self._done(user.id)
+
+    @staticmethod
+    async def save(batch: typing.List[typing.Tuple[models.User, dict]]) -> None:
+        """Функция сохраняет измененные поля состояния пользователей.
+
+        :param batch: Пары (пользователь, состояние до обработки).
+        """
+        async with db.session.Session() as session:
+            try:
+                await save_states(session, batch)
+            except sa.exc.DBAPIError:
+                await session.rollback()
+                raise
+
+    def _update(self, user: models.User) -> None:
+        """Функция заменяет пользователя в списке отслеживаемых сохраненным состоянием.
+
+        Иначе до следующего refresh поиск спредов решал бы по состоянию до обработки
+        (например, WAIT_FILLED после исполнения ордеров) и пропускал бы изменения цен.
+        """
+        entry = self._users.get(user.id)
+        if entry is not None:
+            self._users[user.id] = (user, entry[1])
+
+    def _done(self, user_id: int) -> None:
+        self._pending.discard(user_id)
+        self.locks[user_id].release()
+        shard_coordinator.release(user_id)
+
+
+pipeline = StrategyPipeline(
+    market_data=market_data,
+    locks=user_locks,
+    concurrency=base_config.AUTO_MODE_CONCURRENCY,
+    queue_size=base_config.PIPELINE_QUEUE_SIZE,
+    refresh_interval=base_config.AUTO_MODE_INTERVAL
+)
@@ -0,0 +1,279 @@
+"""
+Модуль ограничения частоты запросов к биржам.
+
+Все вызовы асинхронных адаптеров бирж проходят через RateGovernor:
+token bucket на IP процесса (вес запросов) и на API-ключ аккаунта.
+При нехватке лимита запрос ждет в очереди, а не завершается ошибкой.
+Очередь приоритетная: размещение и отмена ордеров обслуживаются раньше
+проверок статусов, балансов и цен. Остаток лимита сверяется
+с заголовками ответов бирж (X-MBX-USED-WEIGHT-1M, X-Bapi-Limit-Status),
+Retry-After приостанавливает запросы к бирже.
+
+Клиенты бирж хранят заголовки только последнего ответа сессии, и при
+параллельных запросах одного клиента они могут относиться к чужому запросу.
+Поэтому сверка приблизительная и только ужесточает лимит: в окне лимита
+учитывается лишь наибольший увиденный расход, повтор или устаревший
+заголовок ничего не меняет.
+"""
+import time
+import heapq
+import typing
+import asyncio
+import functools
+import itertools
+import logging
+
+from .metrics import RATE_LIMIT_WAIT
+
+
+logger = logging.getLogger(__name__)
+
+# меньше - раньше
+PRIORITIES = {
+    'place_order': 0,
+    'cancel_order': 0,
+    'check_order': 1,
+    'balance': 2,
+    'balances': 2,
+    'price': 3,
+}
+
+
+class TokenBucket:
+    """Token bucket с приоритетной очередью ожидания.
+
+    Запросы с одинаковым приоритетом обслуживаются в порядке поступления.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        :param rate: Пополнение (единиц веса в секунду).
+        :param capacity: Емкость (максимальный всплеск).
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+        self._waiters: typing.List[tuple] = []
+        self._seq = itertools.count()
+        self._timer: typing.Optional[asyncio.TimerHandle] = None
+
+    def __len__(self):
+        return sum(1 for *_, future in self._waiters if not future.done())
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, weight: float = 1, priority: int = 0) -> None:
+        weight = min(weight, self.capacity)
+        self._refill()
+        if not self._waiters and self.tokens >= weight and time.monotonic() >= self.paused_until:
+            self.tokens -= weight
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), weight, future))
+        self._schedule()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # вес уже списан - возвращаем
+                self.tokens += weight
+            raise
+
+    def _schedule(self) -> None:
+        if self._timer is not None or not self._waiters:
+            return
+        _, _, weight, _ = self._waiters[0]
+        now = time.monotonic()
+        delay = max(self.paused_until - now, (weight - self.tokens) / self.rate, 0)
+        self._timer = asyncio.get_running_loop().call_later(delay, self._wake)
+
+    def _wake(self) -> None:
+        self._timer = None
+        self._refill()
+        while self._waiters and time.monotonic() >= self.paused_until:
+            _, _, weight, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if self.tokens < weight:
+                break
+            heapq.heappop(self._waiters)
+            self.tokens -= weight
+            future.set_result(None)
+        self._schedule()
+
+    def limit_remaining(self, remaining: float) -> None:
+        """Сверка с остатком лимита, который сообщила биржа."""
+        self._refill()
+        self.tokens = min(self.tokens, max(remaining, 0))
+
+    def pause(self, seconds: float) -> None:
+        """Приостановка запросов (бан, Retry-After, исчерпанный лимит окна)."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        try:
+            self._schedule()
+        except RuntimeError:
+            # нет цикла событий - очередь пуста
+            pass
+
+
+class ExchangeLimits(typing.NamedTuple):
+    """Лимиты биржи с запасом от официальных."""
+    # вес запросов с одного IP
+    ip_rate: float
+    ip_capacity: float
+    # запросы одного API-ключа
+    key_rate: float
+    key_capacity: float
+    # вес операции (по умолчанию 1)
+    weights: typing.Dict[str, float] = {}
+    # операции, которые считаются в лимите ключа (None - все)
+    key_operations: typing.Optional[typing.Tuple[str, ...]] = None
+    # лимит веса IP за минуту, о расходе которого сообщает биржа
+    weight_limit_1m: typing.Optional[float] = None
+
+
+LIMITS: typing.Dict[str, ExchangeLimits] = {
+    # 6000 веса в минуту на IP, 100 ордеров за 10 секунд на аккаунт
+    'Binance': ExchangeLimits(
+        ip_rate=90, ip_capacity=1200,
+        key_rate=8, key_capacity=40,
+        weights={'price': 2, 'check_order': 4, 'cancel_order': 1, 'place_order': 1,
+                 'balance': 20, 'balances': 20},
+        key_operations=('place_order', 'cancel_order'),
+        weight_limit_1m=6000
+    ),
+    # 600 запросов за 5 секунд на IP, 10-20 запросов в секунду на ключ и метод
+    'Bybit': ExchangeLimits(
+        ip_rate=100, ip_capacity=500,
+        key_rate=10, key_capacity=20
+    ),
+}
+
+
+class RateGovernor:
+    """Лимиты запросов к биржам процесса: по IP и по API-ключу."""
+
+    def __init__(self, limits: typing.Dict[str, ExchangeLimits]):
+        """
+        :param limits: Лимиты по названию биржи (ExchangeName.value).
+        """
+        self.limits = limits
+        # (биржа, None) - IP, (биржа, api_key) - ключ
+        self._buckets: typing.Dict[tuple, TokenBucket] = {}
+        # (биржа, api_key) -> (окно лимита, наибольший расход из заголовков)
+        self._used: typing.Dict[tuple, typing.Tuple[float, float]] = {}
+
+    def bucket(self, exchange: str, api_key: typing.Optional[str] = None) -> TokenBucket:
+        key = (exchange, api_key)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            limits = self.limits[exchange]
+            if api_key is None:
+                bucket = TokenBucket(limits.ip_rate, limits.ip_capacity)
+            else:
+                bucket = TokenBucket(limits.key_rate, limits.key_capacity)
+            self._buckets[key] = bucket
+        return bucket
+
+    async def acquire(self, exchange: str, api_key: typing.Optional[str], operation: str) -> float:
+        """Функция ждет лимита для запроса.
+
+        :return: Время ожидания (в секундах).
+        """
+        limits = self.limits.get(exchange)
+        if limits is None:
+            return 0
+
+        started = time.perf_counter()
+        priority = PRIORITIES.get(operation, 1)
+
+        if api_key and (limits.key_operations is None or operation in limits.key_operations):
+            await self.bucket(exchange, api_key).acquire(1, priority)
+        await self.bucket(exchange).acquire(limits.weights.get(operation, 1), priority)
+
+        waited = time.perf_counter() - started
+        RATE_LIMIT_WAIT.labels(exchange, operation).observe(waited)
+        return waited
+
+    def _exceeds(self, key: tuple, window: float, used: float) -> bool:
+        # заголовок мог прийти от другого запроса: учитывается только рост расхода в окне
+        seen = self._used.get(key)
+        if seen is not None and seen[0] == window and seen[1] >= used:
+            return False
+        self._used[key] = (window, used)
+        return True
+
+    def observe(self, exchange: str, api_key: typing.Optional[str],
+                headers: typing.Optional[typing.Mapping[str, str]]) -> None:
+        """Функция сверяет лимиты с заголовками последнего ответа биржи."""
+        if not headers or exchange not in self.limits:
+            return
+        headers = {str(name).lower(): value for name, value in headers.items()}
+
+        retry_after = headers.get('retry-after')
+        if retry_after:
+            try:
+                seconds = float(retry_after)
+            except ValueError:
+                seconds = 60
+            logger.warning(f"{exchange} rate limit exceeded, requests paused for {seconds}s")
+            self.bucket(exchange).pause(seconds)
+            return
+
+        limits = self.limits[exchange]
+        used = headers.get('x-mbx-used-weight-1m')
+        # окно Binance - календарная минута
+        if (used is not None and limits.weight_limit_1m and
+                self._exceeds((exchange, None), time.time() // 60, float(used))):
+            remaining = limits.weight_limit_1m - float(used)
+            self.bucket(exchange).limit_remaining(remaining)
+            if remaining <= 0:
+                self.bucket(exchange).pause(60 - time.time() % 60)
+
+        remaining = headers.get('x-bapi-limit-status')
+        reset = headers.get('x-bapi-limit-reset-timestamp')
+        # окно Bybit заканчивается в reset-timestamp
+        if (remaining is not None and api_key and
+                self._exceeds((exchange, api_key), float(reset or time.time() // 1), -float(remaining))):
+            bucket = self.bucket(exchange, api_key)
+            bucket.limit_remaining(float(remaining))
+            if float(remaining) <= 0 and reset:
+                bucket.pause(max(float(reset) / 1000 - time.time(), 0))
+
+    def queued(self, exchange: str) -> int:
+        return sum(len(bucket) for (name, _), bucket in self._buckets.items() if name == exchange)
+
+
+rate_governor = RateGovernor(LIMITS)
+
+
+def rate_limited(operation: str):
+    """Декоратор метода асинхронного адаптера биржи: ожидание лимита
+    перед запросом и сверка с заголовками последнего ответа сессии (в т.ч. при ошибке)."""
+    def decorator(method):
+        @functools.wraps(method)
+        async def wrapper(self, *args, **kwargs):
+            exchange = getattr(self.name, 'value', self.name)
+            await rate_governor.acquire(exchange, self.api_key, operation)
+            previous = self.response_headers()
+            try:
+                return await method(self, *args, **kwargs)
+            finally:
+                # без нового ответа (ошибка до запроса) заголовки прошлого ответа не учитываются
+                headers = self.response_headers()
+                if headers is not previous:
+                    rate_governor.observe(exchange, self.api_key, headers)
+        return wrapper
+    return decorator
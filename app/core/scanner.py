@@ -0,0 +1,59 @@
+"""
+Модуль поиска арбитражных ситуаций (update_arbi_situations).
+
+За тик строится вектор цен связок: цена монеты связки на первой и второй
+бирже, по одному запросу цены на (биржу, монету). Прибыль
+|price1 - price2| * volume и сравнение с порогом считаются сразу для всей
+матрицы пользователей × связок операциями NumPy. Наружу выдаются только
+ячейки, состояние которых изменилось: открытие ситуации, закрытие,
+разворот направления спреда (закрытие и открытие) и расширение диапазона
+прибыли открытой ситуации.
+"""
+import typing
+
+import numpy as np
+
+
+Cells = typing.Tuple[np.ndarray, np.ndarray]
+
+
+class Scan(typing.NamedTuple):
+    """Результат тика: индексы (пользователь, связка) изменившихся ячеек."""
+    profit: np.ndarray
+    opened: Cells
+    closed: Cells
+    widened: Cells
+
+
+def scan(price1: np.ndarray, price2: np.ndarray,
+         volume: np.ndarray, threshold: np.ndarray,
+         open_sign: np.ndarray, open_min: np.ndarray, open_max: np.ndarray) -> Scan:
+    """Функция находит ячейки, в которых изменилась арбитражная ситуация.
+
+    :param price1: Цены связок на первой бирже (связок,), NaN - цены нет.
+    :param price2: Цены связок на второй бирже (связок,), NaN - цены нет.
+    :param volume: Объемы пользователей (пользователей,).
+    :param threshold: Пороги пользователей (пользователей,).
+    :param open_sign: Знак price1 - price2 открытой ситуации (пользователей, связок), 0 - нет открытой.
+    :param open_min: Минимальная прибыль открытой ситуации.
+    :param open_max: Максимальная прибыль открытой ситуации.
+
+    :return: Scan. Ячейки связок без цены не меняются.
+    """
+    diff = np.asarray(price1, dtype=float) - np.asarray(price2, dtype=float)
+    known = np.isfinite(diff)
+    sign = np.sign(np.where(known, diff, 0))
+
+    profit = np.abs(np.where(known, diff, 0))[None, :] * np.asarray(volume, dtype=float)[:, None]
+    active = (profit > np.asarray(threshold, dtype=float)[:, None]) & known[None, :]
+
+    is_open = open_sign != 0
+    # открытая ситуация продолжается, только если спред не сменил направление
+    same = is_open & (open_sign * sign[None, :] > 0)
+    kept = active & same
+
+    opened = active & ~same
+    closed = is_open & known[None, :] & ~kept
+    widened = kept & ((profit < open_min) | (profit > open_max))
+
+    return Scan(profit, np.nonzero(opened), np.nonzero(closed), np.nonzero(widened))
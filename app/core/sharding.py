@@ -0,0 +1,264 @@
+"""
+Модуль распределения пользователей между процессами стратегии.
+
+Пользователи делятся на шарды по идентификатору. Владение шардом
+закрепляется advisory-блокировкой Postgres на отдельном соединении процесса:
+при падении процесса соединение закрывается, блокировки снимаются,
+и шарды забирают оставшиеся процессы. Соединение блокировок не возвращается
+в пул SQLAlchemy, а закрывается вместе с backend: иначе блокировки остались бы
+за соединением обычных сессий. Перед записью состояния владение шардами
+проверяется по pg_locks в той же транзакции.
+"""
+import math
+import random
+import typing
+import asyncio
+import logging
+
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from app import db
+from app.core.config import base_config
+
+
+logger = logging.getLogger(__name__)
+
+# пространства ключей advisory-блокировок (первый ключ пары)
+RUNNER_LOCK_NAMESPACE = 0x41524249
+SHARD_LOCK_NAMESPACE = 0x41524250
+
+
+class ShardCoordinator:
+    """Владение шардами пользователей текущим процессом.
+
+    Каждый процесс держит блокировку присутствия (RUNNER_LOCK_NAMESPACE, pid
+    соединения) и стремится владеть ceil(shard_count / число процессов) шардами.
+    Шард отдается другому процессу только после завершения обработки
+    его пользователей в текущем процессе.
+
+    Для БД без advisory-блокировок (sqlite в тестах) процесс владеет всеми шардами.
+    """
+
+    def __init__(self, engine: AsyncEngine, shard_count: int, rebalance_interval: float,
+                 heartbeat_interval: float = 1):
+        """
+        :param engine: Движок БД.
+        :param shard_count: Число шардов.
+        :param rebalance_interval: Период перераспределения шардов (в секундах).
+        :param heartbeat_interval: Период проверки соединения блокировок (в секундах).
+        """
+        self.engine = engine
+        self.shard_count = max(1, shard_count)
+        self.rebalance_interval = rebalance_interval
+        self.heartbeat_interval = heartbeat_interval
+
+        self.enabled = engine.dialect.name == 'postgresql'
+
+        self._owned: typing.Set[int] = set() if self.enabled else set(range(self.shard_count))
+        # шард -> число пользователей в обработке
+        self._in_flight: typing.Dict[int, int] = {}
+        self._idle: typing.Dict[int, asyncio.Event] = {}
+
+        self._conn: typing.Optional[AsyncConnection] = None
+        # pid backend соединения блокировок
+        self._pid: typing.Optional[int] = None
+        # соединение не допускает параллельных запросов
+        self._conn_lock = asyncio.Lock()
+        self._task: typing.Optional[asyncio.Task] = None
+        self._heartbeat: typing.Optional[asyncio.Task] = None
+
+    def shard(self, user_id: int) -> int:
+        return user_id % self.shard_count
+
+    @property
+    def owned(self) -> typing.FrozenSet[int]:
+        return frozenset(self._owned)
+
+    def owns(self, user_id: int) -> bool:
+        return self.shard(user_id) in self._owned
+
+    def acquire(self, user_id: int) -> bool:
+        """Функция отмечает начало обработки пользователя.
+
+        :return: False, если шард пользователя не принадлежит процессу.
+        """
+        shard = self.shard(user_id)
+        if shard not in self._owned:
+            return False
+
+        self._in_flight[shard] = self._in_flight.get(shard, 0) + 1
+        self._idle.setdefault(shard, asyncio.Event()).clear()
+        return True
+
+    def release(self, user_id: int) -> None:
+        """Функция отмечает окончание обработки пользователя (после сохранения)."""
+        shard = self.shard(user_id)
+        count = self._in_flight.get(shard, 0) - 1
+        if count > 0:
+            self._in_flight[shard] = count
+        else:
+            self._in_flight.pop(shard, None)
+            self._idle.setdefault(shard, asyncio.Event()).set()
+
+    async def start(self) -> None:
+        """Функция регистрирует процесс и запускает перераспределение шардов."""
+        if not self.enabled or self._task is not None:
+            return
+
+        try:
+            await self.rebalance()
+        except Exception as e:
+            logger.error(f"shard rebalance error: {e}")
+            await self._disconnect()
+        self._task = asyncio.create_task(self._rebalance_loop())
+        self._heartbeat = asyncio.create_task(self._heartbeat_loop())
+
+    async def stop(self) -> None:
+        """Функция отдает все шарды и закрывает соединение."""
+        for task in (self._heartbeat, self._task):
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._task = self._heartbeat = None
+
+        if self.enabled:
+            await self._disconnect()
+
+    async def _connect(self) -> AsyncConnection:
+        if self._conn is None:
+            # advisory-блокировки уровня сессии не зависят от транзакций
+            self._conn = await self.engine.connect()
+            await self._conn.execution_options(isolation_level='AUTOCOMMIT')
+            self._pid = await self._conn.scalar(sa.text('SELECT pg_backend_pid()'))
+            await self._conn.execute(sa.text('SELECT pg_advisory_lock(:namespace, :pid)'),
+                                     {'namespace': RUNNER_LOCK_NAMESPACE, 'pid': self._pid})
+        return self._conn
+
+    async def _close(self) -> None:
+        # блокировки уровня сессии живут, пока жив backend: соединение закрывается, а не возвращается в пул
+        try:
+            await self._conn.invalidate()
+        except Exception as e:
+            logger.warning(f"shard connection close error: {e}")
+        self._conn = None
+        self._pid = None
+
+    async def _disconnect(self) -> None:
+        # новые пользователи не берутся в обработку, начатая завершается до снятия блокировок
+        shards, self._owned = self._owned, set()
+        for shard in shards:
+            await self._wait_idle(shard)
+
+        if self._conn is not None:
+            await self._close()
+
+    async def check(self) -> bool:
+        """Функция проверяет соединение, на котором держатся блокировки.
+
+        При обрыве соединения Postgres уже снял блокировки, и шарды могут быть
+        заняты другими процессами: владение сбрасывается сразу, без ожидания
+        перераспределения. Соединение восстанавливает следующее перераспределение.
+
+        :return: False, если соединение потеряно.
+        """
+        # перераспределение само работает с соединением и обрабатывает его ошибки
+        if not self.enabled or self._conn is None or self._conn_lock.locked():
+            return True
+
+        async with self._conn_lock:
+            try:
+                await self._conn.scalar(sa.text('SELECT 1'))
+                return True
+            except Exception as e:
+                logger.error(f"shard connection lost, shards {sorted(self._owned)} dropped: {e}")
+                self._owned = set()
+                await self._close()
+                return False
+
+    async def confirm(self, session: db.AsyncSession, user_ids: typing.Iterable[int]) -> typing.Set[int]:
+        """Функция проверяет владение шардами пользователей в транзакции записи их состояния.
+
+        Между проверками соединения шард мог перейти к другому процессу: его
+        блокировки в pg_locks уже нет у соединения процесса. Такие шарды
+        сразу перестают принадлежать процессу.
+
+        :return: Пользователи, шарды которых принадлежат процессу.
+        """
+        user_ids = set(user_ids)
+        if not self.enabled:
+            return user_ids
+
+        held = set()
+        if self._pid is not None:
+            held = set((await session.scalars(sa.text(
+                "SELECT objid FROM pg_locks WHERE locktype = 'advisory' AND granted "
+                "AND classid = :namespace AND objsubid = 2 AND pid = :pid"
+            ), {'namespace': SHARD_LOCK_NAMESPACE, 'pid': self._pid})).all())
+
+        lost = {self.shard(user_id) for user_id in user_ids} - held
+        if lost & self._owned:
+            logger.error(f"shards {sorted(lost & self._owned)} are lost, their states are not saved")
+            self._owned -= lost
+        return {user_id for user_id in user_ids if self.shard(user_id) in held}
+
+    async def _wait_idle(self, shard: int) -> None:
+        if self._in_flight.get(shard):
+            await self._idle[shard].wait()
+
+    async def runners(self) -> int:
+        """Функция возвращает число живых процессов стратегии."""
+        conn = await self._connect()
+        return await conn.scalar(sa.text(
+            "SELECT count(*) FROM pg_locks WHERE locktype = 'advisory' AND granted "
+            "AND classid = :namespace AND objsubid = 2 "
+            "AND database = (SELECT oid FROM pg_database WHERE datname = current_database())"
+        ), {'namespace': RUNNER_LOCK_NAMESPACE})
+
+    async def rebalance(self) -> None:
+        """Функция приводит число шардов процесса к его доле."""
+        async with self._conn_lock:
+            await self._rebalance()
+
+    async def _rebalance(self) -> None:
+        conn = await self._connect()
+        target = math.ceil(self.shard_count / max(1, await self.runners()))
+
+        # лишние шарды отдаются после завершения обработки их пользователей
+        for shard in sorted(self._owned)[target:]:
+            self._owned.discard(shard)
+            await self._wait_idle(shard)
+            await conn.execute(sa.text('SELECT pg_advisory_unlock(:namespace, :shard)'),
+                               {'namespace': SHARD_LOCK_NAMESPACE, 'shard': shard})
+
+        free = [shard for shard in range(self.shard_count) if shard not in self._owned]
+        random.shuffle(free)
+        for shard in free:
+            if len(self._owned) >= target:
+                break
+            locked = await conn.scalar(sa.text('SELECT pg_try_advisory_lock(:namespace, :shard)'),
+                                       {'namespace': SHARD_LOCK_NAMESPACE, 'shard': shard})
+            if locked:
+                self._owned.add(shard)
+
+    async def _rebalance_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.rebalance_interval)
+            try:
+                await self.rebalance()
+            except Exception as e:
+                logger.error(f"shard rebalance error: {e}")
+                await self._disconnect()
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            await self.check()
+
+
+shard_coordinator = ShardCoordinator(
+    engine=db.engine,
+    shard_count=base_config.SHARD_COUNT,
+    rebalance_interval=base_config.SHARD_REBALANCE_INTERVAL,
+    heartbeat_interval=base_config.SHARD_HEARTBEAT_INTERVAL
+)
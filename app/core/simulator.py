@@ -0,0 +1,400 @@
+"""
+Модуль симулятора бирж для нагрузочных тестов без сети и API-ключей.
+
+Симулированные клиенты реализуют AsyncExchange и подменяют клиентов
+Binance и Bybit в пуле подключений и в рыночных данных (install).
+Биржа моделирует задержку ответа (логнормальное распределение),
+ограничение частоты запросов аккаунта, случайные ошибки,
+вероятностное исполнение лимитных ордеров и цены по сценарию.
+"""
+import time
+import typing
+import random
+import asyncio
+import itertools
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from .exchange import (
+    AsyncExchange, ExchangeName, OrderStatus, OrderSide,
+    BinanceExchange, BybitExchange, BinanceError, BybitError
+)
+from .metrics import exchange_request
+
+
+QUOTES = ('USDT', 'USDC', 'BUSD', 'BTC', 'ETH')
+
+
+def split_symbol(symbol: str) -> typing.Tuple[str, str]:
+    """Символ биржи -> (монета, котируемая монета): BTC/USDT, BTCUSDT -> (BTC, USDT)"""
+    if '/' in symbol:
+        base, quote = symbol.split('/', 1)
+        return base, quote
+    for quote in QUOTES:
+        if symbol.endswith(quote) and len(symbol) > len(quote):
+            return symbol[:-len(quote)], quote
+    raise ValueError(f'unknown symbol {symbol}')
+
+
+class SimulationParams(typing.NamedTuple):
+    """Параметры симулятора."""
+    # медиана и разброс (sigma логарифма) задержки ответа, с
+    latency_median: float = 0.05
+    latency_sigma: float = 0.5
+    # вероятность исполнения за секунду, пока цена пересекает лимит ордера
+    fill_probability: float = 0.5
+    # запросов в секунду на аккаунт (0 - без ограничения) и запас
+    rate_limit: float = 20
+    rate_burst: int = 50
+    # доля запросов, завершающихся ошибкой биржи
+    error_rate: float = 0.0
+    # начальный свободный баланс каждой монеты аккаунта
+    balance: float = 100000
+    seed: int = 0
+
+
+class PricePath(ABC):
+    """Цена по сценарию: (биржа, монета, время с начала симуляции) -> цена."""
+
+    @abstractmethod
+    def price(self, exchange: ExchangeName, coin: str, t: float) -> float:
+        pass
+
+
+class ScriptedPath(PricePath):
+    """Цены, заданные точками во времени (линейная интерполяция, по кругу)."""
+
+    def __init__(self, times: np.ndarray, prices: typing.Dict[typing.Tuple[ExchangeName, str], np.ndarray],
+                 loop: bool = True):
+        """
+        :param times: Время точек, с (по возрастанию, от 0).
+        :param prices: (биржа, монета) -> цены в точках.
+        :param loop: Повторять сценарий после окончания.
+        """
+        self.times = np.asarray(times, dtype=np.float64)
+        self.prices = {key: np.asarray(values, dtype=np.float64) for key, values in prices.items()}
+        self.loop = loop
+
+    @classmethod
+    def from_csv(cls, path: str, coin: str, loop: bool = True) -> 'ScriptedPath':
+        """Сценарий из CSV timestamp,bybit,binance (как у scripts/backtest.py)."""
+        timestamps, bybit, binance = np.loadtxt(path, delimiter=',', skiprows=1, unpack=True, ndmin=2)
+        return cls(timestamps - timestamps[0],
+                   {(ExchangeName.BYBIT, coin): bybit, (ExchangeName.BINANCE, coin): binance}, loop)
+
+    def price(self, exchange, coin, t):
+        if self.loop and self.times[-1] > 0:
+            t = t % self.times[-1]
+        return float(np.interp(t, self.times, self.prices[(exchange, coin)]))
+
+
+class RandomWalkPath(PricePath):
+    """Общее для бирж случайное блуждание цены монеты и шум спреда между биржами.
+
+    Значения строятся посекундно и детерминированы seed.
+    """
+
+    def __init__(self, prices: typing.Dict[str, float] = None, default_price: float = 100,
+                 volatility: float = 0.0002, spread: float = 0.0005, seed: int = 0):
+        """
+        :param prices: Начальные цены монет.
+        :param default_price: Начальная цена остальных монет.
+        :param volatility: Волатильность за секунду (доля цены).
+        :param spread: Разброс отклонения цены биржи от общей (доля цены).
+        :param seed: Seed генератора.
+        """
+        self.start_prices = prices or {}
+        self.default_price = default_price
+        self.volatility = volatility
+        self.spread = spread
+        self.seed = seed
+        # монета -> (общая цена, отклонения по биржам) посекундно
+        self._paths: typing.Dict[str, typing.Tuple[np.ndarray, typing.Dict[ExchangeName, np.ndarray]]] = {}
+
+    def _extend(self, coin: str, seconds: int) -> None:
+        rnd = np.random.default_rng([self.seed, seconds, *coin.encode()])
+        n = max(3600, seconds + 1)
+
+        base, offsets = self._paths.get(coin, (None, None))
+        last = base[-1] if base is not None else self.start_prices.get(coin, self.default_price)
+
+        steps = last * np.exp(np.cumsum(rnd.normal(0, self.volatility, n)))
+        extra = {exchange: rnd.normal(0, self.spread, n) for exchange in ExchangeName}
+        if base is None:
+            self._paths[coin] = (steps, extra)
+        else:
+            self._paths[coin] = (np.concatenate([base, steps]),
+                                 {exchange: np.concatenate([offsets[exchange], extra[exchange]])
+                                  for exchange in ExchangeName})
+
+    def price(self, exchange, coin, t):
+        second = int(t)
+        while coin not in self._paths or second >= len(self._paths[coin][0]):
+            self._extend(coin, second)
+        base, offsets = self._paths[coin]
+        return float(base[second] * (1 + offsets[exchange][second]))
+
+
+class _Order:
+    __slots__ = ('id', 'account', 'symbol', 'side', 'quantity', 'price', 'status', 'checked')
+
+    def __init__(self, order_id, account, symbol, side, quantity, price, now):
+        self.id = order_id
+        self.account = account
+        self.symbol = symbol
+        self.side = side
+        self.quantity = quantity
+        self.price = price
+        self.status = OrderStatus.NEW
+        self.checked = now
+
+
+class _RateLimiter:
+    """Token bucket аккаунта."""
+    __slots__ = ('tokens', 'updated')
+
+    def __init__(self, burst: int, now: float):
+        self.tokens = float(burst)
+        self.updated = now
+
+
+class SimulatedMarket:
+    """Состояние симулированных бирж: цены, ордера, балансы и лимиты аккаунтов."""
+
+    def __init__(self, params: SimulationParams = SimulationParams(), path: PricePath = None,
+                 clock: typing.Callable[[], float] = time.monotonic):
+        """
+        :param params: Параметры симулятора.
+        :param path: Сценарий цен (по умолчанию - случайное блуждание).
+        :param clock: Часы (для ускоренного времени в тестах).
+        """
+        self.params = params
+        self.path = path or RandomWalkPath(seed=params.seed)
+        self.clock = clock
+        self.started = clock()
+
+        self._random = random.Random(params.seed)
+        self._ids = itertools.count(1)
+        # (биржа, id) -> ордер
+        self._orders: typing.Dict[typing.Tuple[ExchangeName, str], _Order] = {}
+        # (биржа, api_key, client_order_id) -> id ордера
+        self._client_ids: typing.Dict[tuple, str] = {}
+        # (биржа, api_key) -> монета -> [свободно, заблокировано]
+        self._balances: typing.Dict[tuple, typing.Dict[str, typing.List[float]]] = {}
+        self._limits: typing.Dict[tuple, _RateLimiter] = {}
+
+        self.requests = 0
+        self.errors = 0
+
+    def elapsed(self) -> float:
+        return self.clock() - self.started
+
+    def price(self, exchange: ExchangeName, symbol: str) -> float:
+        return self.path.price(exchange, split_symbol(symbol)[0], self.elapsed())
+
+    def balance(self, account: tuple, coin: str) -> typing.List[float]:
+        balances = self._balances.setdefault(account, {})
+        if coin not in balances:
+            balances[coin] = [self.params.balance, 0.0]
+        return balances[coin]
+
+    async def request(self, account: tuple, error: typing.Type[Exception]) -> None:
+        """Задержка ответа, лимит частоты и случайные ошибки одного запроса."""
+        p = self.params
+        self.requests += 1
+        await asyncio.sleep(self._random.lognormvariate(0, p.latency_sigma) * p.latency_median)
+
+        if p.rate_limit:
+            now = self.clock()
+            limiter = self._limits.get(account)
+            if limiter is None:
+                limiter = self._limits[account] = _RateLimiter(p.rate_burst, now)
+            limiter.tokens = min(p.rate_burst, limiter.tokens + (now - limiter.updated) * p.rate_limit)
+            limiter.updated = now
+            if limiter.tokens < 1:
+                self.errors += 1
+                raise error(f"{account[0]} simulated: too many requests")
+            limiter.tokens -= 1
+
+        if p.error_rate and self._random.random() < p.error_rate:
+            self.errors += 1
+            raise error(f"{account[0]} simulated: internal error")
+
+    def _lock(self, order: _Order) -> typing.Tuple[str, float]:
+        coin, quote = split_symbol(order.symbol)
+        if order.side == OrderSide.BUY:
+            return quote, order.quantity * order.price
+        return coin, order.quantity
+
+    def place(self, account: tuple, symbol: str, side: OrderSide, quantity: float, price: float,
+              error: typing.Type[Exception], client_order_id: str = None) -> _Order:
+        order = _Order(str(next(self._ids)), account, symbol, side, quantity, price, self.elapsed())
+
+        coin, amount = self._lock(order)
+        balance = self.balance(account, coin)
+        if balance[0] < amount:
+            raise error(f"{account[0]} simulated: insufficient balance {coin}")
+        balance[0] -= amount
+        balance[1] += amount
+
+        self._orders[(account[0], order.id)] = order
+        if client_order_id is not None:
+            self._client_ids[(*account, client_order_id)] = order.id
+        self._update(order)
+        return order
+
+    def find(self, account: tuple, client_order_id: str) -> typing.Optional[str]:
+        return self._client_ids.get((*account, client_order_id))
+
+    def _update(self, order: _Order) -> None:
+        """Исполнение ордера с вероятностью fill_probability за каждую секунду,
+        пока рыночная цена не хуже лимита."""
+        if order.status != OrderStatus.NEW:
+            return
+
+        now = self.elapsed()
+        seconds, order.checked = max(now - order.checked, 1e-3), now
+
+        market = self.path.price(order.account[0], split_symbol(order.symbol)[0], now)
+        crossed = market <= order.price if order.side == OrderSide.BUY else market >= order.price
+        if not crossed or self._random.random() >= 1 - (1 - self.params.fill_probability) ** seconds:
+            return
+
+        coin, quote = split_symbol(order.symbol)
+        locked, amount = self._lock(order)
+        self.balance(order.account, locked)[1] -= amount
+        if order.side == OrderSide.BUY:
+            self.balance(order.account, coin)[0] += order.quantity
+        else:
+            self.balance(order.account, quote)[0] += order.quantity * order.price
+        order.status = OrderStatus.FILLED
+
+    def order(self, account: tuple, order_id: str, error: typing.Type[Exception]) -> _Order:
+        order = self._orders.get((account[0], str(order_id)))
+        if order is None or order.account != account:
+            raise error(f"{account[0]} simulated: order {order_id} does not exist")
+        self._update(order)
+        return order
+
+    def cancel(self, order: _Order) -> bool:
+        if order.status != OrderStatus.NEW:
+            return False
+        coin, amount = self._lock(order)
+        balance = self.balance(order.account, coin)
+        balance[0] += amount
+        balance[1] -= amount
+        order.status = OrderStatus.CANCELED
+        return True
+
+
+class AsyncSimulatedExchange(AsyncExchange):
+    """Клиент симулированной биржи. Рынок общий для всех клиентов (market)."""
+    market: SimulatedMarket = None
+    error: typing.Type[Exception] = Exception
+
+    @property
+    def account(self) -> tuple:
+        return self.name, self.api_key
+
+    @exchange_request('connect')
+    async def connect(self):
+        if AsyncSimulatedExchange.market is None:
+            AsyncSimulatedExchange.market = SimulatedMarket()
+        self.session = self.market
+
+    @exchange_request('place_order')
+    async def place_order(self, symbol, side, order_type, quantity, price, client_order_id=None, **kwargs):
+        if price <= 0 or quantity <= 0:
+            return None
+        await self.session.request(self.account, self.error)
+        order = self.session.place(self.account, symbol, side, quantity, price, self.error, client_order_id)
+        return order.id, order.status
+
+    @exchange_request('check_order')
+    async def find_order(self, symbol, client_order_id):
+        await self.session.request(self.account, self.error)
+        return self.session.find(self.account, client_order_id)
+
+    @exchange_request('cancel_order')
+    async def cancel_order(self, symbol, order_id):
+        await self.session.request(self.account, self.error)
+        return self.session.cancel(self.session.order(self.account, order_id, self.error))
+
+    @exchange_request('check_order')
+    async def check_order(self, symbol, order_id):
+        await self.session.request(self.account, self.error)
+        return self.session.order(self.account, order_id, self.error).status
+
+    @exchange_request('price')
+    async def get_price(self, symbol):
+        await self.session.request(self.account, self.error)
+        return self.session.price(self.name, symbol)
+
+    @exchange_request('balance')
+    async def get_balance(self, symbol):
+        await self.session.request(self.account, self.error)
+        return tuple(self.session.balance(self.account, symbol))
+
+    @exchange_request('balances')
+    async def get_balances(self, symbols):
+        await self.session.request(self.account, self.error)
+        return {symbol: tuple(self.session.balance(self.account, symbol)) for symbol in symbols}
+
+    async def close(self):
+        self.session = None
+
+
+class AsyncSimulatedBinance(AsyncSimulatedExchange):
+    order_type_map = BinanceExchange.order_type_map
+    order_side_map = BinanceExchange.order_side_map
+    order_status_map = BinanceExchange.order_status_map
+    error = BinanceError
+
+    make_symbol = staticmethod(BinanceExchange.make_symbol)
+
+    def __init__(self, api_key, api_secret, test=False):
+        super().__init__(ExchangeName.BINANCE, api_key, api_secret, test)
+
+
+class AsyncSimulatedBybit(AsyncSimulatedExchange):
+    order_type_map = BybitExchange.order_type_map
+    order_side_map = BybitExchange.order_side_map
+    order_status_map = BybitExchange.order_status_map
+    error = BybitError
+
+    make_symbol = staticmethod(BybitExchange.make_symbol)
+
+    def __init__(self, api_key, api_secret, test=False):
+        super().__init__(ExchangeName.BYBIT, api_key, api_secret, test)
+
+
+SIMULATED_EXCHANGES: typing.Dict[ExchangeName, typing.Type[AsyncExchange]] = {
+    ExchangeName.BINANCE: AsyncSimulatedBinance,
+    ExchangeName.BYBIT: AsyncSimulatedBybit,
+}
+
+
+def install(market: SimulatedMarket = None) -> SimulatedMarket:
+    """Функция подменяет биржи симулятором во всем процессе стратегии.
+
+    Клиенты пула и рыночных данных создаются симулированными,
+    WebSocket потоки цен и ордеров бирж не используются.
+    Вызывается до запуска market_data и первого тика.
+
+    :param market: Рынок симулятора (по умолчанию - с параметрами по умолчанию).
+
+    :return: SimulatedMarket
+    """
+    from .client_pool import client_pool
+    from .market_data import market_data
+    from .orders import order_tracker
+
+    AsyncSimulatedExchange.market = market or SimulatedMarket()
+
+    client_pool.exchanges = SIMULATED_EXCHANGES
+    market_data.exchanges = SIMULATED_EXCHANGES
+    market_data.streams = None
+    order_tracker.streams = {}
+
+    return AsyncSimulatedExchange.market
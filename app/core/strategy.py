@@ -1,357 +1,688 @@
+import time
+import asyncio
+import logging
 from datetime import datetime
 
 import sqlalchemy as sa
 import sqlalchemy.exc
 from sqlalchemy.orm import joinedload, selectinload
-import requests
+import aiohttp
 
 from app import models, db
 from app.core.config import base_config
 from app.models import AutoState, ExchangeName, AutoStatus
 from .exchange import (
-    Exchange, BybitExchange, BinanceExchange,
+    AsyncExchange, AsyncBybitExchange, AsyncBinanceExchange,
     OrderSide, OrderStatus, OrderType,
     ExchangeInsufficientFunds
 )
+from .breaker import CircuitOpenError, ExchangeUnavailable, breakers, is_outage
+from .notifications import outbox
+from .executor import TickExecutor, UserLocks
+from .client_pool import client_pool
+from .market_data import MarketSnapshot, market_data
+from .orders import order_tracker
+from .legs import LegError, new_client_order_id, order_id, order_journal, reconcile, submit_legs
+from .sharding import shard_coordinator
+from .symbol_rules import SymbolRulesError, symbol_rules
+from .machine import (
+    Action, decide, order_timed_out, orders_transition, spread_profit
+)
+from .metrics import PHASE_DURATION, TICK_DURATION, TICK_ERRORS, phase, state_transition
+
+logger = logging.getLogger(__name__)
 
 BASE_SYMBOL = "USDT"
 
+# User columns changed by auto trading
+STATE_FIELDS = (
+    'current_state', 'status', 'auto', 'profit',
+    'order_id_binance', 'order_id_bybit',
+    'order_time_binance', 'order_time_bybit',
+)
+
+
+async def place_pair(user: models.User, quantity: float,
+                     bybit: AsyncBybitExchange, bybit_symbol: str, bybit_price: float, place_bybit,
+                     binance: AsyncBinanceExchange, binance_symbol: str, binance_price: float, place_binance,
+                     task: str = 'auto_mode'):
+    """Submit bybit and binance legs concurrently and record their timings.
+
+    Both legs are rounded to one quantity and checked against symbol rules
+    before any of them is sent. place_bybit and place_binance take
+    (quantity, price, client order id) and return the order id or None.
+    task is the entry point (auto_mode, pipeline) that labels the phase metrics.
+
+    A leg that failed after the request may have reached the exchange is looked up
+    by its client order id. If a leg is not placed (error, rejected), the placed
+    legs are cancelled at once and their ids are kept on the user, so a cancel
+    that did not go through is repeated on stop.
+
+    :return: (bybit order id, binance order id)
+    """
+    # a leg rejected locally must not leave the other one unhedged
+    quantity, (bybit_price, binance_price) = symbol_rules.prepare_pair(quantity, [
+        (bybit.name.value, bybit_symbol, bybit_price),
+        (binance.name.value, binance_symbol, binance_price),
+    ])
+
+    # both exchanges must be reachable, otherwise one leg would be left unhedged
+    breakers.check(bybit.name, binance.name)
+    sides = {bybit.name: (bybit, bybit_symbol, new_client_order_id()),
+             binance.name: (binance, binance_symbol, new_client_order_id())}
+    with phase(task, 'order_placement'):
+        legs = await submit_legs([
+            (bybit, lambda: place_bybit(quantity, bybit_price, sides[bybit.name][2])),
+            (binance, lambda: place_binance(quantity, binance_price, sides[binance.name][2])),
+        ])
+        legs = [await reconcile(*sides[leg.exchange], leg) for leg in legs]
+    order_journal.add(user.id, legs)
+
+    placed = {leg.exchange: order_id(leg) for leg in legs}
+    failed = [leg for leg in legs if placed[leg.exchange] is None]
+    if failed:
+        # circuit opened after the check, but no order was sent: the tick can be skipped
+        if not any(placed.values()) and all(isinstance(leg.error, CircuitOpenError) for leg in failed):
+            raise failed[0].error
+
+        user.order_id_bybit = placed[bybit.name]
+        user.order_id_binance = placed[binance.name]
+
+        for exchange, symbol in ((bybit, bybit_symbol), (binance, binance_symbol)):
+            if placed[exchange.name] is None:
+                continue
+            try:
+                await exchange.cancel_order(symbol, placed[exchange.name])
+            except Exception as e:
+                logger.error(f"user {user.id} unhedged {exchange.name} order {placed[exchange.name]} "
+                             f"is not cancelled: {e}")
 
-def now_equal_price(bybit_profit: float, binance_profit: float, epsilon: float):
-    """Check equal price"""
-    if abs(bybit_profit - binance_profit) < epsilon:
-        return True
-    return False
+        error = failed[0].error
+        raise LegError(f"{failed[0].exchange.value} leg failed: {error or 'order is rejected'}") from error
 
+    return placed[bybit.name], placed[binance.name]
 
-def init_purchase(bybit_sym: str, binance_sym: str, bybit: BybitExchange, binance: BinanceExchange, bybit_price: float,
-                  binance_price: float,
-                  deposit: float, telegram_id: str):
+
+async def init_purchase(bybit_sym: str, binance_sym: str, bybit: AsyncBybitExchange, binance: AsyncBinanceExchange, bybit_price: float,
+                        binance_price: float,
+                        deposit: float, telegram_id: str, user: models.User, task: str = 'auto_mode'):
     """Place two orders in bybit and binance to buy TARGET COIN """
-    order_id_binance, order_status_binance = binance.place_order(symbol=binance_sym,
-                                                                 side=OrderSide.BUY,
-                                                                 order_type=OrderType.LIMIT,
-                                                                 quantity=deposit,
-                                                                 price=binance_price)
-
-    order_id_bybit, order_status_bybit = bybit.place_order(symbol=bybit_sym,
-                                                           side=OrderSide.BUY,
-                                                           order_type=OrderType.LIMIT,
-                                                           quantity=deposit,
-                                                           price=bybit_price)
-
-    if (bybit.order_status_map.get(order_status_bybit) != OrderStatus.REJECTED and
-            binance.order_status_map.get(order_status_binance) != OrderStatus.REJECTED):
-        return order_id_bybit, order_id_binance
-    else:
-        db.bot_sender.send_task('debug',
-                                (telegram_id, "ERROR", f"\nОшибка при размещении ордера"))
+    return await place_pair(
+        user, deposit,
+        bybit, bybit_sym, bybit_price,
+        lambda quantity, price, client_order_id: bybit.place_order(symbol=bybit_sym,
+                                                                   side=OrderSide.BUY,
+                                                                   order_type=OrderType.LIMIT,
+                                                                   quantity=quantity,
+                                                                   price=price,
+                                                                   client_order_id=client_order_id),
+        binance, binance_sym, binance_price,
+        lambda quantity, price, client_order_id: binance.place_order(symbol=binance_sym,
+                                                                     side=OrderSide.BUY,
+                                                                     order_type=OrderType.LIMIT,
+                                                                     quantity=quantity,
+                                                                     price=price,
+                                                                     client_order_id=client_order_id),
+        task=task
+    )
 
 
-def sell(symbol: str, quantity: float, price: float, exchange: Exchange,
-         telegram_id: str):
-    order_id, order_status = exchange.place_order(
+async def sell(symbol: str, quantity: float, price: float, exchange: AsyncExchange,
+               telegram_id: str, client_order_id: str = None):
+    order_id, order_status = await exchange.place_order(
         symbol=symbol,
         side=OrderSide.SELL,
         order_type=OrderType.LIMIT,
         quantity=quantity,
-        price=price
+        price=price,
+        client_order_id=client_order_id
     )
 
-    db.bot_sender.send_task('debug', (
+    outbox.send_task('debug', (
         telegram_id, "INFO",
         f"\nРазмещен ордер на продажу <b>{quantity} {symbol}</b> на бирже {exchange.name}\n\nID оредра: <b>{order_id}</b>"))
 
-    if exchange.order_status_map.get(order_status) != OrderStatus.REJECTED:
+    if order_status != OrderStatus.REJECTED:
         return order_id
     else:
-        db.bot_sender.send_task('debug',
-                                (telegram_id, "ERROR", f"Ошибка при размещении ордера..."))
+        outbox.send_task('debug',
+                         (telegram_id, "ERROR", f"Ошибка при размещении ордера..."))
 
 
-def buy(symbol: str, quantity: float, price: float, exchange: Exchange,
-        telegram_id: str):
-    order_id, order_status = exchange.place_order(
+async def buy(symbol: str, quantity: float, price: float, exchange: AsyncExchange,
+              telegram_id: str, client_order_id: str = None):
+    order_id, order_status = await exchange.place_order(
         symbol=symbol,
         side=OrderSide.BUY,
         order_type=OrderType.LIMIT,
         quantity=quantity,
-        price=price
+        price=price,
+        client_order_id=client_order_id
     )
 
-    db.bot_sender.send_task('debug', (
+    outbox.send_task('debug', (
         telegram_id, "INFO",
         f"\nРазмещен ордер на покупку <b>{quantity} {symbol} </b> на бирже {exchange.name}\n ID оредра: <b> {order_id} </b>"))
 
-    if exchange.order_status_map.get(order_status) != OrderStatus.REJECTED:
+    if order_status != OrderStatus.REJECTED:
         return order_id
     else:
-        db.bot_sender.send_task('debug',
-                                (telegram_id, "ERROR", f"Ошибка при размещении ордера..."))
+        outbox.send_task('debug',
+                         (telegram_id, "ERROR", f"Ошибка при размещении ордера..."))
+
+
+async def get_balances(bybit: AsyncBybitExchange, binance: AsyncBinanceExchange, target_ticker: str,
+                       task: str = 'auto_mode'):
+    """Fetch each account once: (bybit balances, binance balances) as {asset: (free, locked)}"""
+    with phase(task, 'balance_fetch'):
+        return await asyncio.gather(
+            bybit.get_balances([BASE_SYMBOL, target_ticker]),
+            binance.get_balances([BASE_SYMBOL, target_ticker])
+        )
 
 
-def check_sell(exchange: Exchange, ticker: str, quantity: float):
-    target_balance, _ = exchange.get_balance(ticker)
+def check_sell(balances: dict, ticker: str, quantity: float):
+    target_balance, _ = balances[ticker]
     if target_balance < quantity:
         return False
 
     return True
 
 
-def check_buy(exchange: Exchange, ticker: str, quantity: float, price: float):
-    target_balance, _ = exchange.get_balance(ticker)
+def check_buy(balances: dict, ticker: str, quantity: float, price: float):
+    target_balance, _ = balances[ticker]
     if quantity > (target_balance * 1 / price):
         return False
 
     return True
 
 
-def cancel_orders(symbol_binance, symbol_bybit, bybit, binance, order_id_binance, order_id_bybit, user_telegram_id):
+async def cancel_orders(symbol_binance, symbol_bybit, bybit, binance, order_id_binance, order_id_bybit, user_telegram_id):
+    """Cancel both orders.
+
+    If an exchange is unavailable, the other order is still cancelled and
+    ExchangeUnavailable is raised: the user keeps the state and cancels again next tick.
+    """
+    unavailable = None
     try:
-        binance.cancel_order(symbol_binance, order_id_binance)
-        db.bot_sender.send_task('debug', (
+        await binance.cancel_order(symbol_binance, order_id_binance)
+        outbox.send_task('debug', (
             user_telegram_id, "INFO", f"\nОрдер c ID: <b>{order_id_binance}</b> на бирже Binance отменен"))
-    except:
-        db.bot_sender.send_task('debug', (
-            user_telegram_id, "INFO", f"\nОрдер на бирже Binance отсутсвует"))
+    except Exception as e:
+        if isinstance(e, ExchangeUnavailable) or is_outage(e):
+            unavailable = e
+        else:
+            outbox.send_task('debug', (
+                user_telegram_id, "INFO", f"\nОрдер на бирже Binance отсутсвует"))
     try:
-        bybit.cancel_order(symbol_bybit, order_id_bybit)
-        db.bot_sender.send_task('debug', (
+        await bybit.cancel_order(symbol_bybit, order_id_bybit)
+        outbox.send_task('debug', (
             user_telegram_id, "INFO", f"\nОрдер c ID: <b>{order_id_bybit}</b> на бирже Bybit отменен"))
-    except:
-        db.bot_sender.send_task('debug', (
-            user_telegram_id, "INFO", f"\nОрдер на бирже Bybit отсутсвует"))
+    except Exception as e:
+        if isinstance(e, ExchangeUnavailable) or is_outage(e):
+            unavailable = unavailable or e
+        else:
+            outbox.send_task('debug', (
+                user_telegram_id, "INFO", f"\nОрдер на бирже Bybit отсутсвует"))
+
+    if unavailable is not None:
+        raise ExchangeUnavailable(f"order cancel failed: {unavailable}") from unavailable
 
 
-def get_common_balance(bybit, binance, bybit_price, binance_price, target_ticker):
-    usdt_balance_binance, _ = binance.get_balance(BASE_SYMBOL)
-    usdt_balance_bybit, _ = bybit.get_balance(BASE_SYMBOL)
-    target_balance_binance, _ = binance.get_balance(target_ticker)
-    target_balance_bybit, _ = bybit.get_balance(target_ticker)
+def get_common_balance(bybit_balances, binance_balances, bybit_price, binance_price, target_ticker):
+    usdt_balance_binance, _ = binance_balances[BASE_SYMBOL]
+    usdt_balance_bybit, _ = bybit_balances[BASE_SYMBOL]
+    target_balance_binance, _ = binance_balances[target_ticker]
+    target_balance_bybit, _ = bybit_balances[target_ticker]
 
     return (usdt_balance_binance + target_balance_binance * binance_price) + (
             usdt_balance_bybit + target_balance_bybit * bybit_price)
 
 
+def track_orders(user: models.User, bybit: AsyncBybitExchange, binance: AsyncBinanceExchange,
+                 symbol_bybit: str, symbol_binance: str):
+    """Follow fills of user orders through private exchange streams"""
+    order_tracker.track(user.id, bybit, symbol_bybit, user.order_id_bybit)
+    order_tracker.track(user.id, binance, symbol_binance, user.order_id_binance)
+
+
 def stop(user):
     user.current_state = AutoState.ON_STOP
     user.auto = False
 
 
-async def auto_mode():
-    async with db.session.Session() as session:
+def state_values(user: models.User) -> dict:
+    """Current auto trading state of user"""
+    return {field: getattr(user, field) for field in STATE_FIELDS}
 
-        users = (await session.scalars(sa.select(models.User).options(
-            joinedload(models.User.target_coin),
-            selectinload(models.User.user_exchanges).options(
-                joinedload(models.UserExchange.exchange)
-            )
-        ))).all()
 
-        for user in users:
+def is_active(user: models.User) -> bool:
+    return user.status != AutoStatus.STOPPED and user.current_state is not None
 
+
+def needs_action(user: models.User, bybit_price: float, binance_price: float) -> bool:
+    """Check whether new prices can move user state machine"""
+    if not is_active(user):
+        return False
+    action = decide(user.current_state, bybit_price, binance_price, user.volume, user.threshold, user.epsilon)
+    # WAIT_FILLED does not depend on prices
+    return action not in (Action.NONE, Action.CHECK_ORDERS)
+
+
+def users_query():
+    return sa.select(models.User).options(
+        joinedload(models.User.target_coin),
+        selectinload(models.User.user_exchanges).options(
+            joinedload(models.UserExchange.exchange)
+        )
+    )
+
+
+def price_keys(user: models.User):
+    """Market prices required by user"""
+    return [
+        (ExchangeName.BYBIT, AsyncBybitExchange.make_symbol(user.target_coin.ticker, BASE_SYMBOL)),
+        (ExchangeName.BINANCE, AsyncBinanceExchange.make_symbol(user.target_coin.ticker, BASE_SYMBOL)),
+    ]
+
+
+async def process_user(user: models.User, snapshot: MarketSnapshot, task: str = 'auto_mode'):
+    """Process one tick of auto trading for user
+
+    :param task: entry point (auto_mode, pipeline), labels the phase metrics
+    """
+    # clients are leased from the pool until the user is processed
+    bybit, binance = None, None
+    try:
+
+        if not is_active(user):
+            return
+
+        if user.debug_mode:
+            outbox.send_task('debug', (user.telegram_id, "INFO",
+                                       f"\nПользователь c состоянием <b>{user.current_state.name}</b> в режиме <b>{user.status.name}</b>"))
+        # Create correct symbols for user
+        SYMBOL_BYBIT = AsyncBybitExchange.make_symbol(user.target_coin.ticker, BASE_SYMBOL)
+        SYMBOL_BINANCE = AsyncBinanceExchange.make_symbol(user.target_coin.ticker, BASE_SYMBOL)
+
+        # Get bybit and binance exchange clients
+        with phase(task, 'client_connect'):
+            for user_exchange in user.user_exchanges:
+                try:
+                    if user_exchange.exchange.name == ExchangeName.BYBIT:
+                        bybit = await client_pool.get(
+                            ExchangeName.BYBIT,
+                            api_key=user_exchange.api_key,
+                            api_secret=user_exchange.api_secret,
+                            test=base_config.TEST_API
+                        )
+                    if user_exchange.exchange.name == ExchangeName.BINANCE:
+                        binance = await client_pool.get(
+                            ExchangeName.BINANCE,
+                            api_key=user_exchange.api_key,
+                            api_secret=user_exchange.api_secret,
+                            test=base_config.TEST_API
+                        )
+                except ExchangeUnavailable:
+                    # no ERROR message on every tick of an outage, the user is retried next tick
+                    raise
+                except Exception as e:
+                    outbox.send_task('debug',
+                                     (user.telegram_id, "ERROR", f"Ошибка при подключении к бирже: {e}"))
+
+        if bybit and binance:
+
+            # get current price from exchanges
             try:
+                bybit_price = snapshot.price(ExchangeName.BYBIT, SYMBOL_BYBIT)
+                binance_price = snapshot.price(ExchangeName.BINANCE, SYMBOL_BINANCE)
+                if user.debug_mode:
+                    outbox.send_task('debug', (user.telegram_id, "INFO",
+                                               f"\nЦена на binance: <b>{binance_price} {BASE_SYMBOL}</b>\nЦена на Bybit: <b>{bybit_price} {BASE_SYMBOL}</b>\nПотенциальный профит <b>{abs(binance_price * user.volume - bybit_price * user.volume)}</b>"))
+            except Exception as e:
+                outbox.send_task('debug', (user.telegram_id, "WARNING", f"Cant get price. Reconnect..."))
+                return
+
+
+            action = decide(user.current_state, bybit_price, binance_price,
+                            user.volume, user.threshold, user.epsilon)
+
+            # stopping auto trade
+            if action == Action.STOP:
+                await cancel_orders(SYMBOL_BINANCE, SYMBOL_BYBIT, bybit, binance, user.order_id_binance,
+                                    user.order_id_bybit, user.telegram_id)
+                order_tracker.untrack(user.id)
+                outbox.send_task('stop_auto', (user.telegram_id,))
+                user.status = AutoStatus.STOPPED
+            # initial process
+            elif action == Action.INIT_PURCHASE:
+
+                order_id_bybit, order_id_binance = await init_purchase(SYMBOL_BYBIT, SYMBOL_BINANCE, bybit, binance,
+                                                                       bybit_price, binance_price,
+                                                                       user.init_volume, user.telegram_id, user,
+                                                                       task=task)
+                user.current_state = AutoState.WAIT_FILLED
+                user.order_id_bybit = order_id_bybit
+                user.order_id_binance = order_id_binance
+                user.order_time_bybit = datetime.now()
+                user.order_time_binance = datetime.now()
+                user.status = AutoStatus.STARTED
+                track_orders(user, bybit, binance, SYMBOL_BYBIT, SYMBOL_BINANCE)
+                outbox.send_task('debug', (user.telegram_id, "INFO",
+                                           f"\nЗавершена стартавая закупка\nРазмещены ордеры на покупку <b>{user.volume} {user.target_coin.ticker}</b> на биржак bybit и bibnance.\nID ордера Binance <b>{order_id_binance}</b>\nID ордера на Bybit: <b>{order_id_bybit}</b>\n"))
+
+            elif action == Action.CHECK_ORDERS:
+
+                # orders placed before restart are picked up here
+                track_orders(user, bybit, binance, SYMBOL_BYBIT, SYMBOL_BINANCE)
+
+                # statuses from user data streams, REST only when a stream is not connected
+                bybit_status = (order_tracker.status(bybit, user.order_id_bybit) or
+                                await bybit.check_order(symbol=SYMBOL_BYBIT, order_id=user.order_id_bybit))
+                binance_status = (order_tracker.status(binance, user.order_id_binance) or
+                                  await binance.check_order(symbol=SYMBOL_BINANCE, order_id=user.order_id_binance))
+
+                if user.debug_mode:
+                    outbox.send_task('debug', (user.telegram_id, "INFO",
+                                               f"\nОжидание исполнения ордеров\nТекущие статусы: \nСтатус ордера на Binance: <b>{binance_status}</b>\nСтатус ордера на Bybit: <b>{bybit_status}</b>"))
+
+                filled = bybit_status == OrderStatus.FILLED and binance_status == OrderStatus.FILLED
+                timed_out = (order_timed_out((datetime.now() - user.order_time_bybit).seconds, user.wait_order_minutes) or
+                             order_timed_out((datetime.now() - user.order_time_binance).seconds, user.wait_order_minutes))
+                next_state, cancel = orders_transition(user.status, filled, timed_out)
+
+                if filled:
+                    user.current_state = next_state
+                    user.order_id_bybit = None
+                    user.order_id_binance = None
+                    order_tracker.untrack(user.id)
+
+                    if user.debug_mode:
+                        outbox.send_task('debug', (user.telegram_id, "INFO",
+                                                   f"\n🎉Оба ордера успешно выполнились!🎉"))
+                    bybit_balances, binance_balances = await get_balances(bybit, binance, user.target_coin.ticker,
+                                                                          task=task)
+
+                    if user.status == AutoStatus.STARTED:
+                        user.profit = get_common_balance(bybit_balances, binance_balances, bybit_price, binance_price,
+                                                         user.target_coin.ticker)
+
+                        if user.debug_mode:
+                            outbox.send_task('debug', (user.telegram_id, "INFO",
+                                                       f"\nОбщий баланс на момент старта алгоритма равен: <b>{user.profit} {BASE_SYMBOL}</b>"))
+                    elif user.status == AutoStatus.PLAY:
+                        profit = get_common_balance(bybit_balances, binance_balances, bybit_price, binance_price,
+                                                    user.target_coin.ticker) - user.profit
 
-                if user.status == AutoStatus.STOPPED or user.current_state is None:
-                    continue
+                        outbox.send_task('profit', (user.telegram_id, f"{profit} {BASE_SYMBOL}"))
+
+                elif cancel:
+                    await cancel_orders(SYMBOL_BINANCE, SYMBOL_BYBIT, bybit, binance, user.order_id_binance,
+                                        user.order_id_bybit, user.telegram_id)
+                    order_tracker.untrack(user.id)
+                    user.current_state = next_state
+                    outbox.send_task('orders_canceled', (user.telegram_id,))
+
+            # an arbitration situation occurred
+            elif action in (Action.SELL_BYBIT, Action.SELL_BINANCE):
 
                 if user.debug_mode:
-                    db.bot_sender.send_task('debug', (user.telegram_id, "INFO",
-                                                      f"\nПользователь c состоянием <b>{user.current_state.name}</b> в режиме <b>{user.status.name}</b>"))
-                # Create correct symbols for user
-                SYMBOL_BYBIT = BybitExchange.make_symbol(user.target_coin.ticker, BASE_SYMBOL)
-                SYMBOL_BINANCE = BinanceExchange.make_symbol(user.target_coin.ticker, BASE_SYMBOL)
-
-                # Init bybit and binance exchange
-                bybit, binance = None, None
-                for user_exchange in user.user_exchanges:
+                    outbox.send_task('debug', (user.telegram_id, "INFO",
+                                               f"\nПроизошла арбитражная ситуация:\nЦена на Bybit: <b>{bybit_price} {BASE_SYMBOL} </b> \nЦена на Binance <b>{binance_price} {user.target_coin.ticker}</b>\nПотенциальный профит <b>{spread_profit(user.volume, bybit_price, binance_price)} {BASE_SYMBOL}</b>"))
+
+                user.status = AutoStatus.PLAY
+
+                bybit_balances, binance_balances = await get_balances(bybit, binance, user.target_coin.ticker,
+                                                                      task=task)
+
+                # bybit > binance
+                if action == Action.SELL_BYBIT:
                     try:
-                        if user_exchange.exchange.name == ExchangeName.BYBIT:
-                            bybit = BybitExchange(
-                                api_key=user_exchange.api_key,
-                                api_secret=user_exchange.api_secret,
-                                test=base_config.TEST_API
+                        if check_sell(bybit_balances, user.target_coin.ticker, user.volume) and check_buy(
+                                binance_balances, BASE_SYMBOL, user.volume, binance_price):
+
+                            order_id_bybit, order_id_binance = await place_pair(
+                                user, user.volume,
+                                bybit, SYMBOL_BYBIT, bybit_price,
+                                lambda quantity, price, client_order_id: sell(SYMBOL_BYBIT, quantity, price, bybit,
+                                                                              user.telegram_id, client_order_id),
+                                binance, SYMBOL_BINANCE, binance_price,
+                                lambda quantity, price, client_order_id: buy(SYMBOL_BINANCE, quantity, price, binance,
+                                                                             user.telegram_id, client_order_id),
+                                task=task
                             )
-                        if user_exchange.exchange.name == ExchangeName.BINANCE:
-                            binance = BinanceExchange(
-                                api_key=user_exchange.api_key,
-                                api_secret=user_exchange.api_secret,
-                                test=base_config.TEST_API
-                            )
-                    except Exception as e:
-                        db.bot_sender.send_task('debug',
-                                                (user.telegram_id, "ERROR", f"Ошибка при подключении к бирже: {e}"))
 
-                if bybit and binance:
+                            user.current_state = AutoState.WAIT_FILLED
+                            user.order_id_bybit = order_id_bybit
+                            user.order_id_binance = order_id_binance
+                            user.order_time_bybit = datetime.now()
+                            user.order_time_binance = datetime.now()
+                            track_orders(user, bybit, binance, SYMBOL_BYBIT, SYMBOL_BINANCE)
+                        else:
+                            raise ExchangeInsufficientFunds()
+                    except ExchangeInsufficientFunds:
+                        outbox.send_task('need_transfer', (user.telegram_id,))
+
 
-                    # get current price from exchanges
+                # binance > bybit
+                else:
                     try:
-                        # connect to db
-                        bybit.connect()
-                        binance.connect()
-                        
-                        bybit_price = bybit.get_price(symbol=SYMBOL_BYBIT)
-                        binance_price = binance.get_price(symbol=SYMBOL_BINANCE)
-                        if user.debug_mode:
-                            db.bot_sender.send_task('debug', (user.telegram_id, "INFO",
-                                                              f"\nЦена на binance: <b>{binance_price} {BASE_SYMBOL}</b>\nЦена на Bybit: <b>{bybit_price} {BASE_SYMBOL}</b>\nПотенциальный профит <b>{abs(binance_price * user.volume - bybit_price * user.volume)}</b>"))
-                    except Exception as e:
-                        db.bot_sender.send_task('debug', (user.telegram_id, "WARNING", f"Cant get price. Reconnect..."))
-                        continue
-                        
-
-                    # stopping auto trade
-                    if user.current_state == AutoState.ON_STOP:
-                        cancel_orders(SYMBOL_BINANCE, SYMBOL_BYBIT, bybit, binance, user.order_id_binance,
-                                      user.order_id_bybit, user.telegram_id)
-                        db.bot_sender.send_task('stop_auto', (user.telegram_id,))
-                        user.status = AutoStatus.STOPPED
-                    # initial process
-                    elif user.current_state == AutoState.INITIAL and now_equal_price(bybit_price, binance_price,
-                                                                                     user.epsilon):
-
-                        order_id_bybit, order_id_binance = init_purchase(SYMBOL_BYBIT, SYMBOL_BINANCE, bybit, binance,
-                                                                         bybit_price, binance_price,
-                                                                         user.init_volume, user.telegram_id)
-                        user.current_state = AutoState.WAIT_FILLED
-                        user.order_id_bybit = order_id_bybit
-                        user.order_id_binance = order_id_binance
-                        user.order_time_bybit = datetime.now()
-                        user.order_time_binance = datetime.now()
-                        user.status = AutoStatus.STARTED
-                        db.bot_sender.send_task('debug', (user.telegram_id, "INFO",
-                                                          f"\nЗавершена стартавая закупка\nРазмещены ордеры на покупку <b>{user.volume} {user.target_coin.ticker}</b> на биржак bybit и bibnance.\nID ордера Binance <b>{order_id_binance}</b>\nID ордера на Bybit: <b>{order_id_bybit}</b>\n"))
-
-                    elif user.current_state == AutoState.WAIT_FILLED:
-
-                        bybit_status = bybit.check_order(symbol=SYMBOL_BYBIT, order_id=user.order_id_bybit)
-                        binance_status = binance.check_order(symbol=SYMBOL_BINANCE, order_id=user.order_id_binance)
+                        if check_sell(binance_balances, user.target_coin.ticker, user.volume) and check_buy(
+                                bybit_balances, BASE_SYMBOL, user.volume, bybit_price):
+
+                            order_id_bybit, order_id_binance = await place_pair(
+                                user, user.volume,
+                                bybit, SYMBOL_BYBIT, bybit_price,
+                                lambda quantity, price, client_order_id: buy(SYMBOL_BYBIT, quantity, price, bybit,
+                                                                             user.telegram_id, client_order_id),
+                                binance, SYMBOL_BINANCE, binance_price,
+                                lambda quantity, price, client_order_id: sell(SYMBOL_BINANCE, quantity, price, binance,
+                                                                              user.telegram_id, client_order_id),
+                                task=task
+                            )
 
-                        if user.debug_mode:
-                            db.bot_sender.send_task('debug', (user.telegram_id, "INFO",
-                                                              f"\nОжидание исполнения ордеров\nТекущие статусы: \nСтатус ордера на Binance: <b>{binance_status}</b>\nСтатус ордера на Bybit: <b>{bybit_status}</b>"))
+                            user.current_state = AutoState.WAIT_FILLED
+                            user.order_id_bybit = order_id_bybit
+                            user.order_id_binance = order_id_binance
+                            user.order_time_bybit = datetime.now()
+                            user.order_time_binance = datetime.now()
+                            track_orders(user, bybit, binance, SYMBOL_BYBIT, SYMBOL_BINANCE)
+                        else:
+                            raise ExchangeInsufficientFunds()
 
-                        if (bybit_status == OrderStatus.FILLED and
-                                binance_status == OrderStatus.FILLED):
-                            user.current_state = AutoState.IN_PROGRESS
-                            user.order_id_bybit = None
-                            user.order_id_binance = None
 
-                            if user.debug_mode:
-                                db.bot_sender.send_task('debug', (user.telegram_id, "INFO",
-                                                                  f"\n🎉Оба ордера успешно выполнились!🎉"))
-                            if user.status == AutoStatus.STARTED:
-                                user.profit = get_common_balance(bybit, binance, bybit_price, binance_price,
-                                                                 user.target_coin.ticker)
+                    except ExchangeInsufficientFunds:
+                        outbox.send_task('need_transfer', (user.telegram_id,))
+            else:
+                return
 
-                                if user.debug_mode:
-                                    db.bot_sender.send_task('debug', (user.telegram_id, "INFO",
-                                                                      f"\nОбщий баланс на момент старта алгоритма равен: <b>{user.profit} {BASE_SYMBOL}</b>"))
-                            elif user.status == AutoStatus.PLAY:
-                                profit = get_common_balance(bybit, binance, bybit_price, binance_price,
-                                                            user.target_coin.ticker) - user.profit
+    except aiohttp.ClientProxyConnectionError:
+        outbox.send_task('debug',
+                         (user.telegram_id, "WARNING", f"\nReconnect..."))
+        return
 
-                                db.bot_sender.send_task('profit', (user.telegram_id, f"{profit} {BASE_SYMBOL}"))
+    except aiohttp.ClientResponseError:
+        outbox.send_task('debug',
+                         (user.telegram_id, "WARNING", f"\nReconnect..."))
+        return
 
+    except SymbolRulesError as e:
+        # no order is sent, the user settings do not fit the exchange rules
+        outbox.send_task('debug',
+                         (user.telegram_id, "ERROR", f"\nОрдер не соответствует правилам биржи: {e}"))
+        stop(user)
 
-                        else:
-                            if ((datetime.now() - user.order_time_bybit).seconds // 60 > user.wait_order_minutes) or (
-                                    (datetime.now() - user.order_time_binance).seconds // 60 > user.wait_order_minutes):
-
-                                if user.status == AutoStatus.STARTED:
-                                    # db.bot_sender.send_task('debug',
-                                    #                         (user.telegram_id, "WARNING", f"Не получилось совершить стартовую закупку"))
-                                    # user.current_state = AutoState.INITIAL
-                                    pass
-                                elif user.status == AutoStatus.PLAY:
-                                    cancel_orders(SYMBOL_BINANCE, SYMBOL_BYBIT, bybit, binance, user.order_id_binance,
-                                                  user.order_id_bybit, user.telegram_id)
-                                    user.current_state = AutoState.IN_PROGRESS
-                                    db.bot_sender.send_task('orders_canceled', (user.telegram_id,))
-
-                    # an arbitration situation occurred
-                    elif (user.current_state == AutoState.IN_PROGRESS) \
-                            and (abs(user.volume * bybit_price - user.volume * binance_price) >= user.threshold):
+    except LegError as e:
+        # an order may have been sent: placed legs are cancelled, stop cancels them again by saved ids
+        outbox.send_task('debug',
+                         (user.telegram_id, "ERROR", f"\nОшибка при размещении ордеров: {e}"))
+        stop(user)
 
-                        if user.debug_mode:
-                            db.bot_sender.send_task('debug', (user.telegram_id, "INFO",
-                                                              f"\nПроизошла арбитражная ситуация:\nЦена на Bybit: <b>{bybit_price} {BASE_SYMBOL} </b> \nЦена на Binance <b>{binance_price} {user.target_coin.ticker}</b>\nПотенциальный профит <b>{abs(user.volume * bybit_price - user.volume * binance_price)} {BASE_SYMBOL}</b>"))
+    except ExchangeUnavailable as e:
+        # exchange outage before any order is sent: keep auto mode, retry next tick
+        logger.debug(f"user {user.id} skipped: {e}")
+        return
 
-                        user.status = AutoStatus.PLAY
+    except Exception as e:
+        outbox.send_task('debug',
+                         (user.telegram_id, "ERROR", f"\nCritical error {e}"))
 
-                        # bybit > binance
-                        if bybit_price >= binance_price:
-                            try:
-                                if check_sell(bybit, user.target_coin.ticker, user.volume) and check_buy(
-                                        binance, BASE_SYMBOL, user.volume, binance_price):
+        # stop auto mode
+        stop(user)
 
-                                    order_id_bybit = sell(SYMBOL_BYBIT, user.volume,
-                                                          bybit_price,
-                                                          bybit,
-                                                          user.telegram_id)
+    finally:
+        for client in (bybit, binance):
+            if client is not None:
+                client_pool.release(client)
 
-                                    order_id_binance = buy(SYMBOL_BINANCE, user.volume, binance_price, binance,
-                                                           user.telegram_id)
 
-                                    user.current_state = AutoState.WAIT_FILLED
-                                    user.order_id_bybit = order_id_bybit
-                                    user.order_id_binance = order_id_binance
-                                    user.order_time_bybit = datetime.now()
-                                    user.order_time_binance = datetime.now()
-                                else:
-                                    raise ExchangeInsufficientFunds()
-                            except ExchangeInsufficientFunds:
-                                db.bot_sender.send_task('need_transfer', (user.telegram_id,))
+executor = TickExecutor(base_config.AUTO_MODE_CONCURRENCY)
+user_locks = UserLocks()
 
 
-                        # binance > bybit
-                        else:
-                            try:
-                                if check_sell(binance, user.target_coin.ticker, user.volume) and check_buy(
-                                        bybit, BASE_SYMBOL, user.volume, bybit_price):
-
-                                    order_id_binance = sell(SYMBOL_BINANCE, user.volume,
-                                                            binance_price,
-                                                            binance,
-                                                            user.telegram_id)
-                                    order_id_bybit = buy(SYMBOL_BYBIT, user.volume, bybit_price, bybit,
-                                                         user.telegram_id)
-
-                                    user.current_state = AutoState.WAIT_FILLED
-                                    user.order_id_bybit = order_id_bybit
-                                    user.order_id_binance = order_id_binance
-                                    user.order_time_bybit = datetime.now()
-                                    user.order_time_binance = datetime.now()
-                                else:
-                                    raise ExchangeInsufficientFunds()
-
-
-                            except ExchangeInsufficientFunds:
-                                db.bot_sender.send_task('need_transfer', (user.telegram_id,))
-                    else:
-                        continue
-
-            except requests.exceptions.ProxyError:
-                db.bot_sender.send_task('debug',
-                                        (user.telegram_id, "WARNING", f"\nReconnect..."))
-                continue
-                
-            except requests.exceptions.HTTPError:
-                db.bot_sender.send_task('debug',
-                                        (user.telegram_id, "WARNING", f"\nReconnect..."))
-                continue
+async def save_states(session: db.AsyncSession, batch):
+    """Write changed state fields of processed users in one transaction.
 
-            except Exception as e:
-                db.bot_sender.send_task('debug',
-                                        (user.telegram_id, "ERROR", f"\nCritical error {e}"))
+    Users whose shard is no longer held by this runner are skipped.
+    All updates go in one SAVEPOINT. If it fails, users are written again,
+    each in its own SAVEPOINT, so a failed update rolls back only that user.
+
+    :param batch: pairs (user, state values before processing)
 
-                # stop auto mode
-                stop(user)
+    :return: number of saved users and commit duration in seconds
+    """
+    # a shard taken over by another runner is not written over
+    owned = await shard_coordinator.confirm(session, (user.id for user, _ in batch))
 
+    updates = []
+    for user, before in batch:
+        if user.id not in owned:
+            continue
+        changes = {
+            field: value for field, value in state_values(user).items()
+            if before[field] != value
+        }
+        if changes:
+            updates.append((user, before, sa.update(models.User).where(models.User.id == user.id).values(**changes)))
+
+    saved = []
+    try:
+        async with session.begin_nested():
+            for _, _, update in updates:
+                await session.execute(update)
+        saved = updates
+    except sa.exc.DBAPIError:
+        for user_update in updates:
+            user, _, update = user_update
+            try:
+                async with session.begin_nested():
+                    await session.execute(update)
+                saved.append(user_update)
+            except sa.exc.DBAPIError as e:
+                logger.error(f"save state error for user {user.id}: {e}")
+
+    pairs = order_journal.drain()
+    if pairs:
+        try:
+            async with session.begin_nested():
+                session.add_all(pairs)
+                await session.flush()
+        except sa.exc.DBAPIError as e:
+            logger.error(f"save order pairs error: {e}")
+
+    commit_started = time.perf_counter()
+    await session.commit()
+
+    for user, before, _ in saved:
+        state_transition(before['current_state'], user.current_state)
+
+    return len(saved), time.perf_counter() - commit_started
+
+
+async def auto_mode():
+    """Periodic sweep over all users.
+
+    Price driven work is done by the event pipeline, the sweep handles
+    the rest (order fills, timeouts) and works as a fallback.
+
+    Users are read in a short session before exchange requests, state changes
+    are written after them in one short transaction.
+    """
+    started = time.perf_counter()
+
+    async with db.session.Session() as session:
+        loaded = time.monotonic()
+        users = (await session.scalars(users_query())).all()
+    read_time = time.perf_counter() - started
+    PHASE_DURATION.labels('auto_mode', 'user_load').observe(read_time)
+
+    # a lost lock connection drops the shards before any user is taken
+    await shard_coordinator.check()
+    # users of shards owned by other runners are skipped
+    active_users = [user for user in users if is_active(user) and shard_coordinator.owns(user.id)]
+    # clients of one tick must not evict each other
+    client_pool.fit(len(active_users) * len(ExchangeName))
+
+    # one request per distinct (exchange, symbol) for the whole tick
+    with phase('auto_mode', 'price_fetch'):
+        snapshot = await market_data.snapshot(key for user in active_users for key in price_keys(user))
+
+    # locks are held until commit, so the pipeline never reads a state that is not saved yet
+    held = []
+    claimed = []
+    processed = []
+
+    async def handle(user: models.User):
+        # shard may be given away while the tick goes
+        if not shard_coordinator.acquire(user.id):
+            return
+        claimed.append(user.id)
+
+        lock = user_locks[user.id]
+        await lock.acquire()
+        held.append(lock)
+
+        # already processed by the pipeline, loaded state is stale
+        if user_locks.processed_since(user.id, loaded):
+            return
+
+        before = state_values(user)
+        await process_user(user, snapshot, task='auto_mode')
+        processed.append((user, before))
+        user_locks.touch(user.id)
+
+    try:
+        results = await executor.run(active_users, handle)
+        for user, result in zip(active_users, results):
+            if isinstance(result, BaseException):
+                TICK_ERRORS.labels('auto_mode').inc()
+                logger.error(f"auto_mode error for user {user.id}: {result!r}", exc_info=result)
+
+        write_started = time.perf_counter()
+        async with db.session.Session() as session:
             try:
-                await session.commit()
+                saved, commit_time = await save_states(session, processed)
             except sa.exc.DBAPIError as e:
-                db.bot_sender.send_task('debug',
-                                        (user.telegram_id, "ERROR", f"\nError {e}"))
+                logger.error(f"auto_mode commit error: {e}")
 
                 await session.rollback()
+                saved, commit_time = 0, 0
+        write_time = time.perf_counter() - write_started
+        PHASE_DURATION.labels('auto_mode', 'commit').observe(write_time)
+    finally:
+        for lock in held:
+            lock.release()
+        for user_id in claimed:
+            shard_coordinator.release(user_id)
+        # notifications of the tick go out as one batch
+        outbox.wake()
+
+    tick_time = time.perf_counter() - started
+    TICK_DURATION.labels('auto_mode').observe(tick_time)
+    # compared to one commit per changed user and a transaction open for the whole tick
+    logger.info(
+        f"auto_mode tick: {len(active_users)} users, {saved} saved, "
+        f"read {read_time * 1000:.1f} ms, write {write_time * 1000:.1f} ms, "
+        f"transaction open {(read_time + write_time) * 1000:.1f} ms of {tick_time * 1000:.1f} ms tick, "
+        f"~{max(saved - 1, 0) * commit_time * 1000:.1f} ms of commits saved"
+    )
@@ -0,0 +1,314 @@
+"""
+Модуль потоковых рыночных данных (WebSocket тикеры бирж).
+"""
+import json
+import time
+import typing
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+
+import websockets
+
+from .exchange import ExchangeName
+from .ticks import TickRecorder
+
+
+logger = logging.getLogger(__name__)
+
+PriceKey = typing.Tuple[ExchangeName, str]
+
+
+class PriceStore:
+    """Хранилище последних цен в памяти.
+
+    Ключ - (биржа, символ в формате адаптера биржи), значение - (цена, время получения).
+    """
+
+    def __init__(self, recorder: TickRecorder = None):
+        """
+        :param recorder: Запись всех полученных цен в хранилище тиков.
+        """
+        self.recorder = recorder
+        self._prices: typing.Dict[PriceKey, typing.Tuple[float, float]] = {}
+        self._queues: typing.List[asyncio.Queue] = []
+
+    def update(self, exchange: ExchangeName, symbol: str, price: float, received: float = None) -> bool:
+        """Функция сохраняет цену.
+
+        :return: Изменилась ли цена.
+        """
+        if self.recorder is not None:
+            self.recorder.record(exchange, symbol, price)
+
+        key = (exchange, symbol)
+        previous = self._prices.get(key)
+        self._prices[key] = (price, received if received is not None else time.monotonic())
+
+        return previous is None or previous[0] != price
+
+    def listen(self, maxsize: int = 0) -> asyncio.Queue:
+        """Функция возвращает очередь изменений цен.
+
+        Очередь ограничена: если потребитель не успевает,
+        чтение потоков бирж приостанавливается (backpressure).
+
+        :param maxsize: Размер очереди.
+
+        :return: Очередь ключей (биржа, символ).
+        """
+        queue = asyncio.Queue(maxsize)
+        self._queues.append(queue)
+        return queue
+
+    async def publish(self, key: PriceKey) -> None:
+        for queue in self._queues:
+            await queue.put(key)
+
+    def get(self, key: PriceKey, max_age: float = None) -> typing.Optional[float]:
+        """Функция возвращает последнюю цену.
+
+        :param key: Пара (биржа, символ).
+        :param max_age: Максимальный возраст цены (в секундах).
+
+        :return: Цена или None, если цены нет или она устарела.
+        """
+        value = self._prices.get(key)
+        if value is None:
+            return None
+
+        price, received = value
+        if max_age is not None and time.monotonic() - received > max_age:
+            return None
+
+        return price
+
+    def __len__(self):
+        return len(self._prices)
+
+
+class TickerStream(ABC):
+    """Подписка на публичный поток тикеров одной биржи.
+
+    Поддерживает переподключение с экспоненциальной задержкой
+    и повторную подписку на все символы после переподключения.
+    """
+    exchange: ExchangeName
+    url: str
+    test_url: str
+    # символов в одном сообщении подписки (None - без ограничения)
+    subscribe_batch: typing.Optional[int] = None
+
+    def __init__(self, store: PriceStore, test: bool = False, url: str = None,
+                 reconnect_delay: float = 1, max_reconnect_delay: float = 30):
+        """
+        :param store: Хранилище цен.
+        :param test: Тестовый режим биржи.
+        :param url: Адрес потока (по умолчанию - адрес биржи).
+        :param reconnect_delay: Начальная задержка переподключения (в секундах).
+        :param max_reconnect_delay: Максимальная задержка переподключения (в секундах).
+        """
+        self.store = store
+        self.url = url or (self.test_url if test else self.url)
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+
+        # символ потока -> символ адаптера
+        self.symbols: typing.Dict[str, str] = {}
+
+        self.connected = asyncio.Event()
+        self._ws = None
+        self._request_id = 0
+
+    @staticmethod
+    @abstractmethod
+    def stream_symbol(symbol: str) -> str:
+        """Символ адаптера -> символ потока"""
+        pass
+
+    @abstractmethod
+    def subscribe_message(self, stream_symbols: typing.List[str]) -> dict:
+        pass
+
+    @abstractmethod
+    def parse(self, message: dict) -> typing.Iterable[typing.Tuple[str, float]]:
+        """Сообщение потока -> (символ потока, цена)"""
+        pass
+
+    async def heartbeat(self, ws) -> None:
+        """Прикладной ping, если биржа его требует."""
+        pass
+
+    async def subscribe(self, symbols: typing.Iterable[str]) -> None:
+        """Функция добавляет символы в подписку.
+
+        :param symbols: Символы в формате адаптера биржи.
+        """
+        new = {}
+        for symbol in symbols:
+            stream_symbol = self.stream_symbol(symbol)
+            if stream_symbol not in self.symbols:
+                new[stream_symbol] = symbol
+
+        if not new:
+            return
+
+        self.symbols.update(new)
+        if self._ws is not None:
+            try:
+                await self._send_subscribe(self._ws, list(new))
+            except websockets.ConnectionClosed:
+                # подписка повторится после переподключения
+                pass
+
+    async def _send_subscribe(self, ws, stream_symbols: typing.List[str]) -> None:
+        size = self.subscribe_batch or len(stream_symbols)
+        for i in range(0, len(stream_symbols), size):
+            await ws.send(json.dumps(self.subscribe_message(stream_symbols[i:i + size])))
+
+    def _handle(self, raw: typing.Union[str, bytes]) -> typing.List[PriceKey]:
+        try:
+            message = json.loads(raw)
+        except ValueError:
+            logger.warning(f"{self.exchange} stream: bad message {raw!r}")
+            return []
+
+        changed = []
+        received = time.monotonic()
+        for stream_symbol, price in self.parse(message):
+            symbol = self.symbols.get(stream_symbol)
+            if symbol is not None and self.store.update(self.exchange, symbol, price, received):
+                changed.append((self.exchange, symbol))
+
+        return changed
+
+    async def run(self) -> None:
+        """Функция читает поток до отмены задачи, переподключаясь при ошибках."""
+        delay = self.reconnect_delay
+        while True:
+            heartbeat = None
+            try:
+                async with websockets.connect(self.url) as ws:
+                    self._ws = ws
+                    await self._send_subscribe(ws, list(self.symbols))
+                    self.connected.set()
+                    delay = self.reconnect_delay
+
+                    heartbeat = asyncio.create_task(self.heartbeat(ws))
+                    async for raw in ws:
+                        for key in self._handle(raw):
+                            await self.store.publish(key)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"{self.exchange} stream error: {e!r}. Reconnect in {delay}s")
+            finally:
+                self._ws = None
+                self.connected.clear()
+                if heartbeat:
+                    heartbeat.cancel()
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+
+class BinanceTickerStream(TickerStream):
+    exchange = ExchangeName.BINANCE
+    url = 'wss://stream.binance.com:9443/ws'
+    test_url = 'wss://testnet.binance.vision/ws'
+
+    @staticmethod
+    def stream_symbol(symbol):
+        return symbol.lower() + '@ticker'
+
+    def subscribe_message(self, stream_symbols):
+        self._request_id += 1
+        return {'method': 'SUBSCRIBE', 'params': stream_symbols, 'id': self._request_id}
+
+    def parse(self, message):
+        if message.get('e') == '24hrTicker':
+            yield message['s'].lower() + '@ticker', float(message['c'])
+
+
+class BybitTickerStream(TickerStream):
+    exchange = ExchangeName.BYBIT
+    url = 'wss://stream.bybit.com/v5/public/spot'
+    test_url = 'wss://stream-testnet.bybit.com/v5/public/spot'
+
+    # Bybit закрывает соединение без прикладного ping
+    ping_interval = 20
+    # лимит args одного запроса подписки спотового потока
+    subscribe_batch = 10
+
+    @staticmethod
+    def stream_symbol(symbol):
+        return 'tickers.' + symbol.replace('/', '')
+
+    def subscribe_message(self, stream_symbols):
+        return {'op': 'subscribe', 'args': stream_symbols}
+
+    def parse(self, message):
+        topic = message.get('topic')
+        data = message.get('data')
+        if topic and isinstance(data, dict) and 'lastPrice' in data:
+            yield topic, float(data['lastPrice'])
+
+    async def heartbeat(self, ws):
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            await ws.send(json.dumps({'op': 'ping'}))
+
+
+class MarketStreams:
+    """Сервис потоковых цен Binance и Bybit."""
+
+    streams: typing.Dict[ExchangeName, typing.Type[TickerStream]] = {
+        ExchangeName.BINANCE: BinanceTickerStream,
+        ExchangeName.BYBIT: BybitTickerStream,
+    }
+
+    def __init__(self, store: PriceStore = None, test: bool = False,
+                 urls: typing.Dict[ExchangeName, str] = None):
+        """
+        :param store: Хранилище цен.
+        :param test: Тестовый режим бирж.
+        :param urls: Адреса потоков по биржам (для локальных серверов).
+        """
+        self.store = store or PriceStore()
+        urls = urls or {}
+        self._streams = {
+            exchange: stream(self.store, test=test, url=urls.get(exchange))
+            for exchange, stream in self.streams.items()
+        }
+        self._tasks: typing.List[asyncio.Task] = []
+
+    def __getitem__(self, exchange: ExchangeName) -> TickerStream:
+        return self._streams[exchange]
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self) -> None:
+        """Функция запускает чтение потоков в фоне."""
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(stream.run()) for stream in self._streams.values()]
+
+    async def stop(self) -> None:
+        """Функция останавливает чтение потоков."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def subscribe(self, keys: typing.Iterable[PriceKey]) -> None:
+        """Функция подписывается на цены.
+
+        :param keys: Пары (биржа, символ в формате адаптера).
+        """
+        by_exchange: typing.Dict[ExchangeName, typing.List[str]] = {}
+        for exchange, symbol in keys:
+            by_exchange.setdefault(ExchangeName(exchange), []).append(symbol)
+
+        for exchange, symbols in by_exchange.items():
+            await self._streams[exchange].subscribe(symbols)
@@ -0,0 +1,223 @@
+"""
+Модуль правил торговли символов бирж (шаг цены, шаг объема, минимальная сумма).
+
+Правила загружаются один раз на процесс (Binance exchangeInfo, рынки Bybit
+через ccxt) и периодически обновляются в фоне. Адаптеры бирж округляют цену
+и объем ордера по правилам до отправки и отклоняют ордер локально, если он
+меньше минимального - без запроса к бирже. Обе ноги арбитражной сделки
+проверяются и округляются к общему объему до отправки любой из них.
+Загруженные рынки Bybit
+передаются новым клиентам ccxt, чтобы каждый из них не вызывал load_markets.
+"""
+import math
+import typing
+import asyncio
+import logging
+from decimal import Decimal, ROUND_DOWN, ROUND_HALF_UP
+
+from binance import AsyncClient
+import ccxt.async_support as ccxt_async
+
+from app.core.config import base_config
+
+
+logger = logging.getLogger(__name__)
+
+
+class SymbolRulesError(ValueError):
+    pass
+
+
+class SymbolRules(typing.NamedTuple):
+    tick_size: typing.Optional[Decimal] = None
+    step_size: typing.Optional[Decimal] = None
+    min_qty: float = 0
+    max_qty: typing.Optional[float] = None
+    min_notional: float = 0
+
+
+def _decimal(value) -> typing.Optional[Decimal]:
+    if value is None:
+        return None
+    value = Decimal(str(value))
+    return value if value > 0 else None
+
+
+def _round(value: float, step: typing.Optional[Decimal], rounding: str) -> float:
+    if step is None:
+        return value
+    return float((Decimal(str(value)) / step).to_integral_value(rounding) * step)
+
+
+def _common_step(steps: typing.List[Decimal]) -> typing.Optional[Decimal]:
+    """Наименьший шаг, кратный всем шагам (для шагов 10^-n - самый крупный из них)"""
+    if not steps:
+        return None
+    unit = Decimal(1).scaleb(min(step.as_tuple().exponent for step in steps))
+    return math.lcm(*(int(step / unit) for step in steps)) * unit
+
+
+def binance_rules(info: dict) -> typing.Dict[str, SymbolRules]:
+    """exchangeInfo Binance -> правила по символу (BTCUSDT)"""
+    rules = {}
+    for symbol in info.get('symbols', []):
+        filters = {f['filterType']: f for f in symbol.get('filters', [])}
+        price = filters.get('PRICE_FILTER', {})
+        lot = filters.get('LOT_SIZE', {})
+        notional = filters.get('NOTIONAL') or filters.get('MIN_NOTIONAL') or {}
+
+        rules[symbol['symbol']] = SymbolRules(
+            tick_size=_decimal(price.get('tickSize')),
+            step_size=_decimal(lot.get('stepSize')),
+            min_qty=float(lot.get('minQty') or 0),
+            max_qty=float(lot['maxQty']) if float(lot.get('maxQty') or 0) > 0 else None,
+            min_notional=float(notional.get('minNotional') or 0)
+        )
+    return rules
+
+
+def ccxt_rules(markets: dict) -> typing.Dict[str, SymbolRules]:
+    """Рынки ccxt (precision в шагах - TICK_SIZE) -> правила по символу (BTC/USDT)"""
+    rules = {}
+    for symbol, market in markets.items():
+        if not market.get('spot'):
+            continue
+        precision = market.get('precision') or {}
+        limits = market.get('limits') or {}
+
+        rules[symbol] = SymbolRules(
+            tick_size=_decimal(precision.get('price')),
+            step_size=_decimal(precision.get('amount')),
+            min_qty=float((limits.get('amount') or {}).get('min') or 0),
+            max_qty=(limits.get('amount') or {}).get('max'),
+            min_notional=float((limits.get('cost') or {}).get('min') or 0)
+        )
+    return rules
+
+
+class SymbolRulesCache:
+    """Правила символов Binance и Bybit, общие для всех адаптеров процесса.
+
+    Ключ - (название биржи, символ в формате адаптера).
+    Пока правила символа не загружены, ордер отправляется без изменений.
+    """
+
+    def __init__(self, test: bool = False, refresh_interval: float = 3600):
+        """
+        :param test: Тестовый режим бирж.
+        :param refresh_interval: Период обновления правил (в секундах).
+        """
+        self.test = test
+        self.refresh_interval = refresh_interval
+
+        self._rules: typing.Dict[typing.Tuple[str, str], SymbolRules] = {}
+        self._bybit_markets: typing.Optional[tuple] = None
+        self._task: typing.Optional[asyncio.Task] = None
+
+    def __len__(self):
+        return len(self._rules)
+
+    def get(self, exchange: str, symbol: str) -> typing.Optional[SymbolRules]:
+        return self._rules.get((exchange, symbol))
+
+    def prepare(self, exchange: str, symbol: str, quantity: float, price: float) -> typing.Tuple[float, float]:
+        """Функция округляет объем (вниз) и цену (до ближайшего шага) ордера.
+
+        :param exchange: Название биржи (ExchangeName.value).
+        :param symbol: Символ в формате адаптера.
+
+        :return: (объем, цена). SymbolRulesError, если ордер вне лимитов символа.
+        """
+        rules = self._rules.get((exchange, symbol))
+        if rules is None:
+            return quantity, price
+
+        quantity = _round(quantity, rules.step_size, ROUND_DOWN)
+        price = _round(price, rules.tick_size, ROUND_HALF_UP)
+
+        if quantity <= 0 or quantity < rules.min_qty:
+            raise SymbolRulesError(f"quantity {quantity} {symbol} is less than minimum {rules.min_qty}")
+        if rules.max_qty and quantity > rules.max_qty:
+            raise SymbolRulesError(f"quantity {quantity} {symbol} is greater than maximum {rules.max_qty}")
+        if quantity * price < rules.min_notional:
+            raise SymbolRulesError(f"order value {quantity * price} {symbol} is less than minimum {rules.min_notional}")
+
+        return quantity, price
+
+    def prepare_pair(self, quantity: float,
+                     legs: typing.List[typing.Tuple[str, str, float]]) -> typing.Tuple[float, typing.List[float]]:
+        """Функция округляет ноги сделки к одному объему и проверяет их до отправки.
+
+        Объем округляется вниз до шага, кратного шагам объема всех ног: при разных
+        шагах бирж округление каждой ноги отдельно дало бы разные объемы.
+
+        :param quantity: Объем сделки.
+        :param legs: Ноги: (название биржи, символ, цена).
+
+        :return: (объем, цены ног). SymbolRulesError, если хоть одна нога вне лимитов символа.
+        """
+        rules = [self._rules.get((exchange, symbol)) for exchange, symbol, _ in legs]
+        quantity = _round(quantity, _common_step([
+            leg_rules.step_size for leg_rules in rules if leg_rules is not None and leg_rules.step_size is not None
+        ]), ROUND_DOWN)
+
+        prices = [self.prepare(exchange, symbol, quantity, price)[1] for exchange, symbol, price in legs]
+        return quantity, prices
+
+    def share_markets(self, session) -> None:
+        """Функция передает загруженные рынки Bybit новому клиенту ccxt."""
+        if self._bybit_markets is not None and session.markets is None:
+            markets, currencies = self._bybit_markets
+            try:
+                session.set_markets(markets, currencies)
+            except Exception as e:
+                # клиент загрузит рынки сам
+                logger.warning(f"Bybit markets are not shared: {e!r}")
+
+    async def _load_binance(self) -> None:
+        client = await AsyncClient.create(testnet=self.test)
+        try:
+            rules = binance_rules(await client.get_exchange_info())
+        finally:
+            await client.close_connection()
+        self._rules.update({('Binance', symbol): value for symbol, value in rules.items()})
+
+    async def _load_bybit(self) -> None:
+        session = ccxt_async.bybit()
+        if self.test:
+            session.set_sandbox_mode(True)
+        try:
+            markets = await session.load_markets()
+            self._bybit_markets = (markets, session.currencies)
+        finally:
+            await session.close()
+        self._rules.update({('Bybit', symbol): value for symbol, value in ccxt_rules(markets).items()})
+
+    async def refresh(self) -> None:
+        """Функция загружает правила обеих бирж. Ошибка одной биржи не мешает другой."""
+        for name, load in (('Binance', self._load_binance), ('Bybit', self._load_bybit)):
+            try:
+                await load()
+            except Exception as e:
+                logger.warning(f"{name} symbol rules are not loaded: {e!r}")
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            await self.refresh()
+
+    async def start(self) -> None:
+        """Функция загружает правила и запускает фоновое обновление."""
+        await self.refresh()
+        logger.info(f"symbol rules loaded: {len(self._rules)}")
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+symbol_rules = SymbolRulesCache(test=base_config.TEST_API, refresh_interval=base_config.SYMBOL_RULES_REFRESH_INTERVAL)
@@ -1,134 +1,147 @@
+import time
+import asyncio
 import logging
 import json
 import sqlalchemy as sa
 import sqlalchemy.exc
 from sqlalchemy.orm import joinedload, selectinload
-from fastapi import status
+
+import numpy as np
 
 from app import models, db
-from app.api import helpers
-from app.core.exchanges_api import get_price
+from app.core.exchanges_api import get_prices
+from app.core.metrics import TICK_DURATION, phase
+from app.core.notifications import outbox
+from app.core.arbi_events import open_events
+from app.core.scanner import scan
+from app.core.sharding import shard_coordinator
+from app.core.strategy import BASE_SYMBOL
 
 
 # logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s:%(message)s')
 logger = logging.getLogger(__name__)
 
 
+async def bundle_prices(bundles, base_coin: str):
+    """Prices of bundle coins on both exchanges, one whole market request per exchange.
+
+    :return: (price1, price2) arrays, NaN where there is no price
+    """
+    names = list({bundle.exchange1.name for bundle in bundles} | {bundle.exchange2.name for bundle in bundles})
+    markets = dict(zip(names, await asyncio.gather(*(get_prices(name) for name in names))))
+
+    def price(exchange, ticker):
+        return markets[exchange.name].get(ticker.upper() + base_coin.upper(), np.nan)
+
+    price1 = np.full(len(bundles), np.nan)
+    price2 = np.full(len(bundles), np.nan)
+    for j, bundle in enumerate(bundles):
+        # base coin is not traded against itself
+        if bundle.coin.ticker == base_coin:
+            continue
+        price1[j] = price(bundle.exchange1, bundle.coin.ticker)
+        price2[j] = price(bundle.exchange2, bundle.coin.ticker)
+    return price1, price2
+
+
 async def update_arbi_situations():
+    started = time.perf_counter()
     async with db.session.Session() as session:
         try:
-            users = (await session.scalars(sa.select(models.User).options(
-                joinedload(models.User.base_coin),
-                selectinload(models.User.bundles)
-            ))).all()
-            bundles = (await session.scalars(sa.select(models.Bundle).options(
-                joinedload(models.Bundle.coin),
-                joinedload(models.Bundle.exchange1),
-                joinedload(models.Bundle.exchange2),
-            ))).all()
-
-            is_changed = False
-
-            for user in users:
-                for bundle in bundles:
-                    if user.base_coin.ticker == bundle.coin.ticker:
-                        continue
-
-                    price1 = get_price(
-                        coin_ticker=bundle.coin.ticker,
-                        exchange_name=bundle.exchange1.name,
-                        base_coin=user.base_coin.ticker,
-                    )
-
-                    price2 = get_price(
-                        coin_ticker=bundle.coin.ticker,
-                        exchange_name=bundle.exchange2.name,
-                        base_coin=user.base_coin.ticker,
-                    )
-
-                    arbi_event_open = (await session.scalar(sa.select(models.ArbiEvent).where(
-                        models.ArbiEvent.user_id == user.id,
-                        models.ArbiEvent.bundle_id == bundle.id,
-                        models.ArbiEvent.end == None
-                    )))
-
-                    profit = (abs(price1 - price2)*user.volume)
-                    if profit > user.threshold:
-                        if arbi_event_open:
-                            if (arbi_event_open.current_price1 - arbi_event_open.current_price2)*(price1 - price2) > 0:
-                                if arbi_event_open.min_profit > profit:
-                                    arbi_event_open.min_profit = profit
-                                elif arbi_event_open.max_profit <= profit:
-                                    arbi_event_open.max_profit = profit
-                            else:
-                                arbi_event_open.end = sa.func.now()
-                                new_arbi_event = models.ArbiEvent(
-                                    start=sa.func.now(),
-                                    bundle_id=bundle.id,
-                                    user_id=user.id,
-                                    min_profit=profit,
-                                    max_profit=profit,
-                                    current_price1=price1,
-                                    current_price2=price2,
-                                    used_base_coin_id=user.base_coin_id,
-                                    used_threshold=user.threshold,
-                                    used_volume=user.volume
-                                )
-                                session.add(new_arbi_event)
-
-                                if bundle.id in user.bundles_ids:
-                                    data = {
-                                        "ticker": bundle.coin.ticker,
-                                        "exchange1": bundle.exchange1.name,
-                                        "exchange2": bundle.exchange2.name,
-                                        "current_price1": price1,
-                                        "current_price2": price2,
-                                        "profit": profit,
-                                        "base_coin_ticker": user.base_coin.ticker
-                                    }
-                                    db.bot_sender.send_task('new_event', ([user.telegram_id], json.dumps(data)))
-
-                        else:
-                            new_arbi_event = models.ArbiEvent(
-                                start=sa.func.now(),
-                                bundle_id=bundle.id,
-                                user_id=user.id,
-                                min_profit=profit,
-                                max_profit=profit,
-                                current_price1=price1,
-                                current_price2=price2,
-                                used_base_coin_id=user.base_coin_id,
-                                used_threshold=user.threshold,
-                                used_volume=user.volume
-                            )
-                            session.add(new_arbi_event)
-
-                            if bundle.id in user.bundles_ids:
-                                data = {
-                                    "ticker": bundle.coin.ticker,
-                                    "exchange1": bundle.exchange1.name,
-                                    "exchange2": bundle.exchange2.name,
-                                    "current_price1": price1,
-                                    "current_price2": price2,
-                                    "profit": profit,
-                                    "base_coin_ticker": user.base_coin.ticker
-                                }
-                                db.bot_sender.send_task('new_event', ([user.telegram_id], json.dumps(data)))
-
-                        is_changed = True
-                    else:
-                        if arbi_event_open:
-                            arbi_event_open.end = sa.func.now()
-                            is_changed = True
-                        else:
-                            continue
+            with phase('update_arbi_situations', 'user_load'):
+                users = (await session.scalars(sa.select(models.User).options(
+                    selectinload(models.User.bundles)
+                ))).all()
+                bundles = (await session.scalars(sa.select(models.Bundle).options(
+                    joinedload(models.Bundle.coin),
+                    joinedload(models.Bundle.exchange1),
+                    joinedload(models.Bundle.exchange2),
+                ))).all()
+                base_coin_id = await session.scalar(
+                    sa.select(models.Coin.id).where(models.Coin.ticker == BASE_SYMBOL)
+                )
+                if not open_events.loaded:
+                    await open_events.load(session)
+
+            if not users or not bundles:
+                return
+
+            with phase('update_arbi_situations', 'price_fetch'):
+                price1, price2 = await bundle_prices(bundles, BASE_SYMBOL)
+
+            with phase('update_arbi_situations', 'scan'):
+                result = scan(
+                    price1, price2,
+                    np.fromiter((user.volume for user in users), dtype=float, count=len(users)),
+                    np.fromiter((user.threshold for user in users), dtype=float, count=len(users)),
+                    *open_events.matrices([user.id for user in users], [bundle.id for bundle in bundles])
+                )
+
+            widened = []
+            for i, j in zip(*result.widened):
+                event, profit = open_events.get(users[i].id, bundles[j].id), float(result.profit[i, j])
+                widened.append(((users[i].id, bundles[j].id),
+                                min(event.min_profit, profit), max(event.max_profit, profit)))
+
+            closed = [(users[i].id, bundles[j].id) for i, j in zip(*result.closed)]
+
+            opened = []
+            subscriptions = {}
+            for i, j in zip(*result.opened):
+                user, bundle, profit = users[i], bundles[j], float(result.profit[i, j])
+                opened.append(dict(
+                    bundle_id=bundle.id,
+                    user_id=user.id,
+                    min_profit=profit,
+                    max_profit=profit,
+                    current_price1=float(price1[j]),
+                    current_price2=float(price2[j]),
+                    used_base_coin_id=base_coin_id,
+                    used_threshold=user.threshold,
+                    used_volume=user.volume
+                ))
+
+                if user.id not in subscriptions:
+                    subscriptions[user.id] = set(user.bundles_ids)
+                if bundle.id in subscriptions[user.id]:
+                    data = {
+                        "ticker": bundle.coin.ticker,
+                        "exchange1": bundle.exchange1.name,
+                        "exchange2": bundle.exchange2.name,
+                        "current_price1": float(price1[j]),
+                        "current_price2": float(price2[j]),
+                        "profit": profit,
+                        "base_coin_ticker": BASE_SYMBOL
+                    }
+                    outbox.send_task('new_event', ([user.telegram_id], json.dumps(data)))
 
             try:
-                if is_changed:
-                    await session.commit()
+                if opened or closed or widened:
+                    with phase('update_arbi_situations', 'commit'):
+                        await open_events.save(session, closed, widened, opened)
             except sa.exc.DBAPIError as e:
-                await session.rollback()
+                logger.error(f"update_arbi_situations commit error: {e}")
 
-                helpers.abort(status.HTTP_400_BAD_REQUEST, detail=helpers.error_detail(e))
+                await session.rollback()
+                open_events.invalidate()
         except Exception as e:
-            pass
+            logger.error(f"update_arbi_situations error: {e!r}")
+        finally:
+            TICK_DURATION.labels('update_arbi_situations').observe(time.perf_counter() - started)
+
+
+async def scan_arbi_situations():
+    """update_arbi_situations in a single runner process, the owner of shard 0.
+
+    The scan covers all users at once, so it is not split by shards. The shard is held
+    while the scan runs, so it moves to another process only between scans.
+    """
+    if not shard_coordinator.acquire(0):
+        # events in memory go stale while another process scans
+        open_events.invalidate()
+        return
+
+    try:
+        await update_arbi_situations()
+    finally:
+        shard_coordinator.release(0)
@@ -0,0 +1,322 @@
+"""
+Модуль записи рыночных тиков в колоночное хранилище.
+
+Каждая наблюдаемая цена (время, биржа, символ, цена) дописывается
+в файлы дня (UTC) - по одному файлу фиксированной ширины на колонку:
+
+    <path>/<YYYY-MM-DD>/timestamp.f8   время получения (unix, float64)
+    <path>/<YYYY-MM-DD>/exchange.u1    код биржи (uint8, индекс в EXCHANGES)
+    <path>/<YYYY-MM-DD>/symbol.u2      код символа (uint16)
+    <path>/<YYYY-MM-DD>/price.f8       цена (float64)
+    <path>/<YYYY-MM-DD>/symbols.json   коды символов дня
+
+Файлы читаются через np.memmap без копирования, время внутри дня
+не убывает, поэтому диапазон времени - срез по searchsorted.
+"""
+import os
+import json
+import time
+import typing
+import asyncio
+import logging
+import threading
+from datetime import date, datetime, timezone, timedelta
+
+import numpy as np
+
+from .exchange import ExchangeName
+
+
+logger = logging.getLogger(__name__)
+
+# порядок не меняется - индекс записывается в файлы
+EXCHANGES = (ExchangeName.BINANCE, ExchangeName.BYBIT)
+_EXCHANGE_CODES = {exchange: code for code, exchange in enumerate(EXCHANGES)}
+
+COLUMNS = {
+    'timestamp': np.dtype('<f8'),
+    'exchange': np.dtype('u1'),
+    'symbol': np.dtype('<u2'),
+    'price': np.dtype('<f8'),
+}
+
+SYMBOLS_FILE = 'symbols.json'
+DAY_FORMAT = '%Y-%m-%d'
+
+
+def _day(timestamp: float) -> date:
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).date()
+
+
+def _day_start(day: date) -> float:
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc).timestamp()
+
+
+def _column_path(directory: str, column: str) -> str:
+    return os.path.join(directory, f'{column}.{COLUMNS[column].str[1:]}')
+
+
+class _DayWriter:
+    """Открытые файлы колонок одного дня."""
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.symbols: typing.Dict[str, int] = {}
+
+        symbols_path = os.path.join(directory, SYMBOLS_FILE)
+        if os.path.exists(symbols_path):
+            with open(symbols_path) as f:
+                self.symbols = {symbol: code for code, symbol in enumerate(json.load(f))}
+
+        self._truncate()
+        self.files = {column: open(_column_path(directory, column), 'ab') for column in COLUMNS}
+
+    def _truncate(self) -> None:
+        """Обрезка колонок до полной строки после аварийной остановки."""
+        sizes = {}
+        for column, dtype in COLUMNS.items():
+            path = _column_path(self.directory, column)
+            sizes[column] = os.path.getsize(path) // dtype.itemsize if os.path.exists(path) else 0
+
+        rows = min(sizes.values())
+        for column, dtype in COLUMNS.items():
+            path = _column_path(self.directory, column)
+            if os.path.exists(path) and os.path.getsize(path) != rows * dtype.itemsize:
+                os.truncate(path, rows * dtype.itemsize)
+
+    def symbol_code(self, symbol: str) -> int:
+        code = self.symbols.get(symbol)
+        if code is None:
+            code = self.symbols[symbol] = len(self.symbols)
+            if code > np.iinfo(COLUMNS['symbol']).max:
+                raise OverflowError('too many symbols in one day')
+
+            # коды записываются до строк, которые на них ссылаются
+            path = os.path.join(self.directory, SYMBOLS_FILE)
+            with open(path + '.tmp', 'w') as f:
+                json.dump(list(self.symbols), f)
+            os.replace(path + '.tmp', path)
+        return code
+
+    def write(self, columns: typing.Dict[str, np.ndarray]) -> None:
+        for column, values in columns.items():
+            self.files[column].write(values.astype(COLUMNS[column], copy=False).tobytes())
+        for f in self.files.values():
+            f.flush()
+
+    def close(self) -> None:
+        for f in self.files.values():
+            f.close()
+
+
+class TickRecorder:
+    """Буферизованная запись тиков.
+
+    record() только добавляет строку в буфер и вызывается из цикла событий
+    на каждую цену; запись на диск выполняется в потоке раз в flush_interval.
+    Каталог должен принадлежать одному процессу.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 1):
+        """
+        :param path: Каталог хранилища.
+        :param flush_interval: Период записи буфера (в секундах).
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+
+        self._rows: typing.List[typing.Tuple[float, int, str, float]] = []
+        self._last = 0.0
+        self._day: typing.Optional[date] = None
+        self._writer: typing.Optional[_DayWriter] = None
+        self._lock = threading.Lock()
+        self._task: typing.Optional[asyncio.Task] = None
+
+    def record(self, exchange: ExchangeName, symbol: str, price: float, timestamp: float = None) -> None:
+        """Функция добавляет цену в буфер.
+
+        :param exchange: Биржа.
+        :param symbol: Символ в формате биржи.
+        :param price: Цена.
+        :param timestamp: Время получения (unix), по умолчанию - текущее.
+        """
+        timestamp = time.time() if timestamp is None else timestamp
+        # время не убывает даже при переводе часов - иначе не работает поиск диапазона
+        self._last = max(self._last, timestamp)
+        self._rows.append((self._last, _EXCHANGE_CODES[ExchangeName(exchange)], symbol, price))
+
+    def _write(self, rows: typing.List[typing.Tuple[float, int, str, float]]) -> None:
+        with self._lock:
+            timestamps = np.fromiter((row[0] for row in rows), dtype=np.float64, count=len(rows))
+
+            start = 0
+            while start < len(rows):
+                day = _day(timestamps[start])
+                end = int(np.searchsorted(timestamps, _day_start(day + timedelta(days=1)), side='left'))
+                if day != self._day:
+                    if self._writer is not None:
+                        self._writer.close()
+                    self._writer = _DayWriter(os.path.join(self.path, day.strftime(DAY_FORMAT)))
+                    self._day = day
+
+                chunk = rows[start:end]
+                self._writer.write({
+                    'timestamp': timestamps[start:end],
+                    'exchange': np.fromiter((row[1] for row in chunk), dtype=np.uint8, count=len(chunk)),
+                    'symbol': np.fromiter((self._writer.symbol_code(row[2]) for row in chunk),
+                                          dtype=np.uint16, count=len(chunk)),
+                    'price': np.fromiter((row[3] for row in chunk), dtype=np.float64, count=len(chunk)),
+                })
+                start = end
+
+    def flush(self) -> None:
+        """Функция записывает буфер на диск (синхронно)."""
+        rows, self._rows = self._rows, []
+        if rows:
+            self._write(rows)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            rows, self._rows = self._rows, []
+            if not rows:
+                continue
+            try:
+                await asyncio.to_thread(self._write, rows)
+            except Exception as e:
+                logger.error(f"tick recorder: {len(rows)} ticks are not written: {e!r}")
+
+    def start(self) -> None:
+        """Функция запускает периодическую запись."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Функция останавливает запись и сохраняет остаток буфера."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+        await asyncio.to_thread(self.flush)
+        with self._lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer, self._day = None, None
+
+
+class Ticks(typing.NamedTuple):
+    """Колонки тиков (представления файлов дня или их срезы)."""
+    timestamp: np.ndarray
+    exchange: np.ndarray
+    symbol: np.ndarray
+    price: np.ndarray
+    # код символа -> символ
+    symbols: typing.List[str]
+
+    def mask(self, exchange: ExchangeName = None, symbol: str = None) -> np.ndarray:
+        """Маска строк биржи и/или символа."""
+        mask = np.ones(len(self.timestamp), dtype=bool)
+        if exchange is not None:
+            mask &= self.exchange == _EXCHANGE_CODES[ExchangeName(exchange)]
+        if symbol is not None:
+            if symbol not in self.symbols:
+                return np.zeros(len(self.timestamp), dtype=bool)
+            mask &= self.symbol == self.symbols.index(symbol)
+        return mask
+
+    def slice(self, start: float = None, end: float = None) -> 'Ticks':
+        """Строки с временем в [start, end) без копирования."""
+        i = 0 if start is None else int(np.searchsorted(self.timestamp, start, side='left'))
+        j = len(self.timestamp) if end is None else int(np.searchsorted(self.timestamp, end, side='left'))
+        return Ticks(self.timestamp[i:j], self.exchange[i:j], self.symbol[i:j], self.price[i:j], self.symbols)
+
+
+class TickReader:
+    """Чтение хранилища тиков через отображение файлов в память."""
+
+    def __init__(self, path: str):
+        """
+        :param path: Каталог хранилища.
+        """
+        self.path = path
+
+    def days(self) -> typing.List[date]:
+        """Дни, за которые есть записи (по возрастанию)."""
+        if not os.path.isdir(self.path):
+            return []
+
+        days = []
+        for name in os.listdir(self.path):
+            try:
+                days.append(datetime.strptime(name, DAY_FORMAT).date())
+            except ValueError:
+                continue
+        return sorted(days)
+
+    def day(self, day: date) -> Ticks:
+        """Функция отображает файлы дня в память.
+
+        Строки, которые дописываются в момент чтения, не попадают в результат.
+        """
+        directory = os.path.join(self.path, day.strftime(DAY_FORMAT))
+
+        symbols_path = os.path.join(directory, SYMBOLS_FILE)
+        symbols = []
+        if os.path.exists(symbols_path):
+            with open(symbols_path) as f:
+                symbols = json.load(f)
+
+        sizes = {}
+        for column, dtype in COLUMNS.items():
+            path = _column_path(directory, column)
+            sizes[column] = os.path.getsize(path) // dtype.itemsize if os.path.exists(path) else 0
+        rows = min(sizes.values())
+
+        columns = {}
+        for column, dtype in COLUMNS.items():
+            if rows:
+                columns[column] = np.memmap(_column_path(directory, column), dtype=dtype, mode='r', shape=(rows,))
+            else:
+                columns[column] = np.empty(0, dtype=dtype)
+
+        return Ticks(symbols=symbols, **columns)
+
+    def range(self, start: float, end: float) -> typing.Iterator[Ticks]:
+        """Функция возвращает тики с временем в [start, end) по дням без копирования.
+
+        :param start: Начало (unix).
+        :param end: Конец (unix).
+        """
+        first, last = _day(start), _day(end)
+        for day in self.days():
+            if first <= day <= last:
+                ticks = self.day(day).slice(start, end)
+                if len(ticks.timestamp):
+                    yield ticks
+
+    def read(self, start: float, end: float, exchange: ExchangeName = None, symbol: str = None) -> Ticks:
+        """Функция возвращает тики диапазона одним массивом (с копированием).
+
+        Коды символов приводятся к общему списку symbols результата.
+        """
+        parts = []
+        symbols: typing.List[str] = []
+        for ticks in self.range(start, end):
+            mask = ticks.mask(exchange, symbol)
+            remap = np.array([_index(symbols, s) for s in ticks.symbols], dtype=np.uint16)
+            codes = ticks.symbol[mask]
+            parts.append((ticks.timestamp[mask], ticks.exchange[mask],
+                          remap[codes] if len(remap) else codes, ticks.price[mask]))
+
+        if not parts:
+            return Ticks(*(np.empty(0, dtype=dtype) for dtype in COLUMNS.values()), symbols)
+
+        return Ticks(*(np.concatenate(column) for column in zip(*parts)), symbols)
+
+
+def _index(items: typing.List[str], item: str) -> int:
+    if item not in items:
+        items.append(item)
+    return items.index(item)
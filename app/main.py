@@ -4,19 +4,14 @@
 import os
 import logging
 from logging.handlers import TimedRotatingFileHandler
-from datetime import datetime
 
 import uvicorn
-from pytz import timezone
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 from app import db
 from app.api.endpoints import api_router
 from app.core.config import base_config
-from app.core.tasks import update_arbi_situations
-from app.core.strategy import auto_mode
 
 
 log_config = uvicorn.config.LOGGING_CONFIG
@@ -51,27 +46,10 @@ app = FastAPI(
 app.include_router(api_router)
 
 
-scheduler = AsyncIOScheduler(timezone=timezone('Europe/Moscow'))
-
-
 @app.on_event("startup")
 async def startup_event():
     await db.init_db()
 
-    scheduler.start()
-    # scheduler.add_job(
-    #     update_arbi_situations,
-    #     trigger="interval",
-    #     seconds=8,
-    #     next_run_time=datetime.now()
-    # )
-    scheduler.add_job(
-        auto_mode,
-        trigger="interval",
-        seconds=30,
-        next_run_time=datetime.now()
-    )
-
 
 if base_config.BACKEND_CORS_ORIGINS:
     app.add_middleware(
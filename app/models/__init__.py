@@ -6,3 +6,4 @@ from .coin import Coin
 from .exchange import Exchange, ExchangeName
 from .bundle import Bundle
 from .arbi_event import ArbiEvent
+from .order_pair import OrderPair
@@ -41,6 +41,11 @@ class ArbiEvent(db.Base):
     used_threshold = sa.Column(sa.Float, nullable=False)
     used_volume = sa.Column(sa.Float, nullable=False)
 
+    __table_args__ = (
+        # открытые ситуации (update_arbi_situations)
+        sa.Index('ix_arbi_event_open', user_id, bundle_id, postgresql_where=end.is_(None)),
+    )
+
     bundle: "Bundle" = sa.orm.relationship(
         'Bundle',
         lazy='raise_on_sql',
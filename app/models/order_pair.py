@@ -0,0 +1,46 @@
+"""
+Модуль модели пары ордеров
+"""
+import sqlalchemy as sa
+
+from app import db
+from .exchange import ExchangeName
+
+
+class OrderPair(db.Base):
+    """Модель таблицы пар ордеров (двух ног арбитражной сделки).
+
+    :id: Уникальный идентификатор пары.
+
+    :user_id: Пользователь.
+    :first_exchange: Биржа, ордер на которую отправлен первым.
+
+    :order_id_binance: Идентификатор ордера на Binance.
+    :order_id_bybit: Идентификатор ордера на Bybit.
+
+    :submitted_binance: Время отправки ордера на Binance.
+    :submitted_bybit: Время отправки ордера на Bybit.
+    :acked_binance: Время ответа Binance.
+    :acked_bybit: Время ответа Bybit.
+
+    :skew: Расхождение ног (в мс) - разница оценок времени прихода ордеров на биржи.
+    """
+    id = sa.Column(sa.Integer, primary_key=True, nullable=False)
+
+    user_id = sa.Column(sa.Integer, sa.ForeignKey('user.id'), nullable=False)
+    first_exchange = sa.Column(sa.Enum(ExchangeName), nullable=False)
+
+    order_id_binance = sa.Column(sa.String, nullable=True)
+    order_id_bybit = sa.Column(sa.String, nullable=True)
+
+    submitted_binance = sa.Column(sa.DateTime, nullable=False)
+    submitted_bybit = sa.Column(sa.DateTime, nullable=False)
+    acked_binance = sa.Column(sa.DateTime, nullable=False)
+    acked_bybit = sa.Column(sa.DateTime, nullable=False)
+
+    skew = sa.Column(sa.Float, nullable=False)
+
+    created = sa.Column(sa.DateTime, nullable=False, default=sa.func.now())
+
+    def __repr__(self):
+        return f'Order pair id: {self.id}, User id: {self.user_id}, skew: {self.skew} ms'
@@ -0,0 +1,129 @@
+"""
+Модуль процесса стратегии (auto trading).
+
+Запуск: ``python -m app.runner``.
+
+Процесс работает отдельно от API сервера: планировщик auto_mode
+и поиска арбитражных ситуаций, потоки рыночных данных, конвейер событий
+и отслеживание ордеров.
+Процессов можно запустить несколько - пользователи делятся между ними по шардам.
+"""
+import os
+import signal
+import asyncio
+import logging
+from logging.handlers import TimedRotatingFileHandler
+from datetime import datetime
+
+from pytz import timezone
+from prometheus_client import start_http_server
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+from app import db
+from app.core.config import base_config
+from app.core.strategy import auto_mode
+from app.core.tasks import scan_arbi_situations
+from app.core.client_pool import client_pool
+from app.core.market_data import market_data
+from app.core.pipeline import pipeline
+from app.core.orders import order_tracker
+from app.core.sharding import shard_coordinator
+from app.core.symbol_rules import symbol_rules
+from app.core.notifications import outbox
+from app.core.exchanges_api import public_api
+from app.core import simulator
+
+
+FORMAT_LOGS = '%(levelname)-10s | %(asctime)-15s - %(message)s'
+
+logger = logging.getLogger(__name__)
+
+
+def setup_logging() -> None:
+    handlers = [logging.StreamHandler()]
+    if base_config.LOGGER:
+        os.makedirs(base_config.LOGS_PATH, exist_ok=True)
+        handlers.append(TimedRotatingFileHandler(
+            filename=os.path.join(base_config.LOGS_PATH, 'runner.log'),
+            when='midnight',
+            backupCount=base_config.LOGS_COUNT
+        ))
+
+    logging.basicConfig(level=logging.INFO, format=FORMAT_LOGS, handlers=handlers)
+
+
+async def startup(scheduler: AsyncIOScheduler) -> None:
+    await db.init_db()
+
+    if base_config.RUNNER_METRICS_PORT:
+        start_http_server(base_config.RUNNER_METRICS_PORT)
+    elif not os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        logger.warning("runner metrics are not exported: set RUNNER_METRICS_PORT or PROMETHEUS_MULTIPROC_DIR")
+
+    await shard_coordinator.start()
+    outbox.start()
+
+    if base_config.EXCHANGE_SIMULATOR:
+        simulator.install()
+        logger.warning("exchanges are simulated (EXCHANGE_SIMULATOR)")
+    else:
+        await symbol_rules.start()
+
+    market_data.start()
+    if market_data.streams is not None:
+        pipeline.start()
+
+    scheduler.start()
+    if base_config.ARBI_SITUATIONS_INTERVAL:
+        scheduler.add_job(
+            scan_arbi_situations,
+            trigger="interval",
+            seconds=base_config.ARBI_SITUATIONS_INTERVAL,
+            next_run_time=datetime.now()
+        )
+    scheduler.add_job(
+        auto_mode,
+        trigger="interval",
+        seconds=base_config.AUTO_MODE_INTERVAL,
+        next_run_time=datetime.now()
+    )
+
+
+async def shutdown(scheduler: AsyncIOScheduler) -> None:
+    scheduler.shutdown(wait=False)
+    await pipeline.stop()
+    await shard_coordinator.stop()
+    await symbol_rules.stop()
+    order_tracker.close()
+    await outbox.stop()
+    await client_pool.close()
+    await market_data.close()
+    await public_api.close()
+    await db.engine.dispose()
+
+
+async def run() -> None:
+    """Функция запускает стратегию и ждет сигнала остановки."""
+    stopped = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopped.set)
+
+    scheduler = AsyncIOScheduler(timezone=timezone('Europe/Moscow'))
+
+    await startup(scheduler)
+    logger.info(f"strategy runner started, pid {os.getpid()}")
+    try:
+        await stopped.wait()
+    finally:
+        logger.info("strategy runner stopping")
+        await shutdown(scheduler)
+
+
+def main() -> None:
+    setup_logging()
+    asyncio.run(run())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Скрипт бэктеста автоматической торговли на исторических ценах.
+
+Цены читаются из CSV (timestamp,bybit,binance; время в секундах)
+или генерируются (--days): общее случайное блуждание цены и
+шумовой спред между биржами.
+"""
+import os
+import sys
+import time
+import inspect
+import argparse
+
+import numpy as np
+
+current_dir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from app.core.backtest import BacktestParams, backtest
+
+
+def synthetic(days: float, price: float, volatility: float, spread: float, seed: int):
+    rnd = np.random.default_rng(seed)
+    n = int(days * 86400)
+
+    timestamps = np.arange(n, dtype=np.float64)
+    base = price * np.exp(np.cumsum(rnd.normal(0, volatility, n)))
+    # спред держится несколько секунд
+    noise = np.convolve(rnd.normal(0, spread, n), np.ones(5) / 5, mode='same')
+
+    return timestamps, base + noise / 2, base - noise / 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--csv', help='Файл timestamp,bybit,binance')
+    parser.add_argument('--days', type=float, default=365, help='Дней синтетических секундных тиков')
+    parser.add_argument('--price', type=float, default=30000)
+    parser.add_argument('--volatility', type=float, default=0.0001, help='Волатильность за секунду')
+    parser.add_argument('--spread', type=float, default=5, help='Шум спреда между биржами')
+    parser.add_argument('--seed', type=int, default=0)
+
+    defaults = BacktestParams()
+    parser.add_argument('--volume', type=float, default=defaults.volume)
+    parser.add_argument('--init-volume', type=float, default=defaults.init_volume)
+    parser.add_argument('--threshold', type=float, default=defaults.threshold)
+    parser.add_argument('--epsilon', type=float, default=defaults.epsilon)
+    parser.add_argument('--wait-order-minutes', type=float, default=defaults.wait_order_minutes)
+    parser.add_argument('--balance', type=float, default=defaults.balance)
+    parser.add_argument('--fee', type=float, default=defaults.fee)
+    parser.add_argument('--fill-on-touch', action='store_true')
+    args = parser.parse_args()
+
+    if args.csv:
+        timestamps, bybit, binance = np.loadtxt(args.csv, delimiter=',', skiprows=1, unpack=True)
+    else:
+        timestamps, bybit, binance = synthetic(args.days, args.price, args.volatility, args.spread, args.seed)
+
+    params = BacktestParams(
+        volume=args.volume,
+        init_volume=args.init_volume,
+        threshold=args.threshold,
+        epsilon=args.epsilon,
+        wait_order_minutes=args.wait_order_minutes,
+        balance=args.balance,
+        fee=args.fee,
+        fill_on_touch=args.fill_on_touch
+    )
+
+    start = time.perf_counter()
+    result = backtest(timestamps, bybit, binance, params)
+    duration = time.perf_counter() - start
+
+    print(f'ticks:     {len(timestamps)} ({duration:.2f}s)')
+    print(f'pnl:       {result.pnl:.2f}')
+    print(f'trades:    {result.trades}')
+    print(f'timeouts:  {result.timeouts}')
+    if result.stopped:
+        print('stopped:   not enough balance for initial purchase')
+    total = max(timestamps[-1] - timestamps[0], 1)
+    for state, seconds in result.state_time.items():
+        print(f'{state:<11}{seconds:>12.0f}s {seconds / total:>7.1%}')
+
+
+if __name__ == '__main__':
+    main()
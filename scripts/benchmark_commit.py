@@ -0,0 +1,107 @@
+"""
+Скрипт замера времени записи состояния пользователей за тик.
+
+Сравнивается коммит после каждого пользователя, одна транзакция на тик
+(как в auto_mode) и одна транзакция с SAVEPOINT на каждого пользователя
+(запасной путь auto_mode при ошибке записи).
+Замер выполняется на отдельной временной таблице в БД приложения.
+"""
+import os
+import sys
+import time
+import asyncio
+import inspect
+import argparse
+
+import sqlalchemy as sa
+
+current_dir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from app.db.session import Session, engine
+
+
+metadata = sa.MetaData()
+bench_state = sa.Table(
+    'bench_state', metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('current_state', sa.Integer, nullable=False),
+    sa.Column('order_id', sa.String, nullable=True),
+)
+
+
+async def prepare(users: int) -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(metadata.drop_all)
+        await conn.run_sync(metadata.create_all)
+        await conn.execute(bench_state.insert(), [{'id': i, 'current_state': 1} for i in range(users)])
+
+
+async def per_user_commits(users: int, tick: int) -> float:
+    start = time.perf_counter()
+    async with Session() as session:
+        for i in range(users):
+            await session.execute(bench_state.update().where(bench_state.c.id == i).values(
+                current_state=tick % 4 + 1, order_id=f'{tick}-{i}'
+            ))
+            await session.commit()
+    return time.perf_counter() - start
+
+
+async def one_transaction(users: int, tick: int) -> float:
+    start = time.perf_counter()
+    async with Session() as session:
+        async with session.begin_nested():
+            for i in range(users):
+                await session.execute(bench_state.update().where(bench_state.c.id == i).values(
+                    current_state=tick % 4 + 1, order_id=f'{tick}-{i}'
+                ))
+        await session.commit()
+    return time.perf_counter() - start
+
+
+async def savepoint_per_user(users: int, tick: int) -> float:
+    start = time.perf_counter()
+    async with Session() as session:
+        for i in range(users):
+            async with session.begin_nested():
+                await session.execute(bench_state.update().where(bench_state.c.id == i).values(
+                    current_state=tick % 4 + 1, order_id=f'{tick}-{i}'
+                ))
+        await session.commit()
+    return time.perf_counter() - start
+
+
+async def run(users_list: list, ticks: int) -> None:
+    print(' | '.join(f'{h:>14}' for h in ['users', 'per-user', 'one tx', 'savepoints', 'saved/tick']))
+    try:
+        for users in users_list:
+            await prepare(users)
+            per_user = min([await per_user_commits(users, tick) for tick in range(ticks)])
+            one_tx = min([await one_transaction(users, tick) for tick in range(ticks)])
+            savepoints = min([await savepoint_per_user(users, tick) for tick in range(ticks)])
+            print(' | '.join([
+                f'{users:>14}',
+                f'{per_user * 1000:>11.1f} ms',
+                f'{one_tx * 1000:>11.1f} ms',
+                f'{savepoints * 1000:>11.1f} ms',
+                f'{(per_user - one_tx) * 1000:>11.1f} ms',
+            ]))
+    finally:
+        async with engine.begin() as conn:
+            await conn.run_sync(metadata.drop_all)
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--ticks', type=int, default=5, help='Число повторов (берется лучший результат)')
+    args = parser.parse_args()
+
+    asyncio.run(run(args.users, args.ticks))
+
+
+if __name__ == '__main__':
+    main()
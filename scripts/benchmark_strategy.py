@@ -0,0 +1,260 @@
+"""
+Скрипт нагрузочного замера стратегии: auto_mode и update_arbi_situations.
+
+Работает на тестовой БД (TESTING, sqlite в памяти) и симуляторе бирж,
+уведомления бота не отправляются. Для каждого числа пользователей
+выполняется несколько тиков и замеряются: длительность тика, задержка
+решения по пользователю (p50/p99), число SQL запросов, запросов к биржам
+и уведомлений за тик. Результаты сохраняются в JSON для сравнения
+между изменениями движка.
+"""
+import os
+import sys
+import json
+import time
+import inspect
+import logging
+import argparse
+import platform
+import contextlib
+import subprocess
+from datetime import datetime
+
+import numpy as np
+
+current_dir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+# только sqlite в памяти - замер не должен трогать рабочую БД
+os.environ['TESTING'] = 'True'
+
+import asyncio
+import sqlalchemy as sa
+
+from app import db, models
+from app.core import simulator, strategy, tasks
+from app.core.executor import TickExecutor
+from app.core.client_pool import client_pool
+from app.core.market_data import market_data
+from app.core.exchange import ExchangeName
+from app.core.notifications import outbox
+from app.core.arbi_events import open_events
+
+
+COINS = ['BTC', 'ETH', 'BNB', 'XRP', 'ADA', 'SOL', 'DOGE', 'DOT', 'LTC', 'TRX',
+         'AVAX', 'LINK', 'ATOM', 'XLM', 'ETC', 'FIL', 'APT', 'NEAR', 'ARB', 'OP']
+
+
+class BotSender:
+    """Брокер бота: задачи только считаются."""
+
+    def __init__(self, counters: 'Counters'):
+        self.counters = counters
+
+    def producer_or_acquire(self):
+        return contextlib.nullcontext()
+
+    def send_task(self, name, args, **kwargs):
+        self.counters.notifications += 1
+
+
+class Counters:
+    """Счетчики одного тика."""
+
+    def __init__(self, market: simulator.SimulatedMarket):
+        self.market = market
+        self.statements = 0
+        self.notifications = 0
+        self.price_calls = 0
+        self.decisions = []
+
+    def reset(self):
+        self.statements = self.notifications = self.price_calls = 0
+        self.decisions = []
+        self._requests = self.market.requests
+
+    @property
+    def exchange_calls(self) -> int:
+        return self.market.requests - self._requests + self.price_calls
+
+
+def instrument(counters: Counters) -> None:
+    sa.event.listen(db.engine.sync_engine, 'before_cursor_execute',
+                    lambda *args, **kwargs: setattr(counters, 'statements', counters.statements + 1))
+
+    outbox.sender = BotSender(counters)
+
+    process_user = strategy.process_user
+
+    async def timed_process_user(user, snapshot, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await process_user(user, snapshot, **kwargs)
+        finally:
+            counters.decisions.append(time.perf_counter() - started)
+    strategy.process_user = timed_process_user
+
+    # публичные цены update_arbi_situations - из того же симулятора
+    async def get_prices(exchange_name):
+        counters.price_calls += 1
+        return {coin + 'USDT': counters.market.price(ExchangeName(exchange_name), coin + 'USDT') for coin in COINS}
+    tasks.get_prices = get_prices
+
+
+async def seed(users: int, bundles: int) -> None:
+    async with db.engine.begin() as conn:
+        await conn.run_sync(db.Base.metadata.drop_all)
+        await conn.run_sync(db.Base.metadata.create_all)
+    # БД создана заново
+    open_events.invalidate()
+
+    coins = ['USDT'] + COINS[:max(1, bundles)]
+    async with db.session.Session() as session:
+        await session.execute(sa.insert(models.Coin), [
+            {'id': i, 'name': ticker, 'ticker': ticker} for i, ticker in enumerate(coins, start=1)
+        ])
+        await session.execute(sa.insert(models.Exchange), [
+            {'id': 1, 'name': models.ExchangeName.BINANCE}, {'id': 2, 'name': models.ExchangeName.BYBIT}
+        ])
+        await session.execute(sa.insert(models.Bundle), [
+            {'id': i, 'coin_id': i + 1, 'exchange1_id': 1, 'exchange2_id': 2} for i in range(1, bundles + 1)
+        ])
+        await session.execute(sa.insert(models.User), [
+            {'id': i, 'telegram_id': str(i), 'target_coin_id': 2 + i % max(1, bundles),
+             'current_state': models.AutoState.INITIAL, 'status': models.AutoStatus.STARTED, 'auto': True,
+             'volume': 1, 'init_volume': 10, 'threshold': 0.05, 'epsilon': 0.2, 'wait_order_minutes': 1}
+            for i in range(1, users + 1)
+        ])
+        await session.execute(sa.insert(models.UserExchange), [
+            {'user_id': i, 'exchange_id': exchange_id, 'api_key': f'{exchange_id}-{i}', 'api_secret': 's'}
+            for i in range(1, users + 1) for exchange_id in (1, 2)
+        ])
+        await session.commit()
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else None
+
+
+async def run_task(name: str, task, counters: Counters, clock: list, ticks: int, interval: float) -> dict:
+    results = []
+    for _ in range(ticks):
+        counters.reset()
+        started = time.perf_counter()
+        await task()
+        tick_time = time.perf_counter() - started
+        await outbox.flush()
+        clock[0] += interval
+
+        results.append({
+            'tick_time': tick_time,
+            'decision_p50': percentile(counters.decisions, 50),
+            'decision_p99': percentile(counters.decisions, 99),
+            'statements': counters.statements,
+            'exchange_calls': counters.exchange_calls,
+            'notifications': counters.notifications,
+        })
+
+    async with db.session.Session() as session:
+        states = (await session.execute(
+            sa.select(models.User.current_state, sa.func.count()).group_by(models.User.current_state)
+        )).all()
+
+    return {
+        'task': name,
+        'ticks': results,
+        'tick_time_p50': percentile([r['tick_time'] for r in results], 50),
+        'tick_time_max': max(r['tick_time'] for r in results),
+        'states': {state.name if state else None: count for state, count in states},
+    }
+
+
+async def run(args) -> list:
+    clock = [0.0]
+    market = simulator.install(simulator.SimulatedMarket(
+        simulator.SimulationParams(
+            latency_median=args.latency,
+            fill_probability=args.fill_probability,
+            rate_limit=0,
+            error_rate=args.error_rate,
+            seed=args.seed
+        ),
+        path=simulator.RandomWalkPath(default_price=100, seed=args.seed),
+        clock=lambda: clock[0]
+    ))
+    counters = Counters(market)
+    instrument(counters)
+    if args.concurrency:
+        strategy.executor = TickExecutor(args.concurrency)
+    outbox.start()
+
+    results = []
+    for users in args.users:
+        await seed(users, args.bundles)
+        for name, task in (('auto_mode', strategy.auto_mode), ('update_arbi_situations', tasks.update_arbi_situations)):
+            if name not in args.tasks:
+                continue
+            result = await run_task(name, task, counters, clock, args.ticks, args.interval)
+            result['users'] = users
+            results.append(result)
+
+            tick = result['ticks'][-1]
+            print(f"{name:<24}{users:>7} users | tick p50 {result['tick_time_p50']:>8.3f}s "
+                  f"max {result['tick_time_max']:>8.3f}s | decision p50/p99 "
+                  f"{_ms(tick['decision_p50'])}/{_ms(tick['decision_p99'])} | "
+                  f"sql {tick['statements']:>6} | exchange {tick['exchange_calls']:>6} | "
+                  f"bot {tick['notifications']:>6}")
+
+    await outbox.stop()
+    await client_pool.close()
+    await market_data.close()
+    await db.engine.dispose()
+    return results
+
+
+def _ms(value) -> str:
+    return f'{value * 1000:6.1f}ms' if value is not None else '     -  '
+
+
+def revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=parent_dir,
+                              capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ''
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, nargs='+', default=[10, 100, 1000, 10000])
+    parser.add_argument('--tasks', nargs='+', default=['auto_mode', 'update_arbi_situations'])
+    parser.add_argument('--ticks', type=int, default=3, help='Тиков на каждое число пользователей')
+    parser.add_argument('--interval', type=float, default=30, help='Время симулятора между тиками, с')
+    parser.add_argument('--bundles', type=int, default=5, help='Связок (монет) для update_arbi_situations')
+    parser.add_argument('--latency', type=float, default=0.005, help='Медианная задержка биржи, с')
+    parser.add_argument('--fill-probability', type=float, default=0.9)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--concurrency', type=int, default=0, help='Лимит конкурентности (0 - из конфигурации)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark_strategy.json')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+
+    results = asyncio.run(run(args))
+
+    with open(args.output, 'w') as f:
+        json.dump({
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'revision': revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'params': vars(args),
+            'results': results,
+        }, f, indent=2)
+    print(f'saved to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
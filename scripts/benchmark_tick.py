@@ -0,0 +1,72 @@
+"""
+Скрипт замера длительности тика auto_mode в зависимости от числа пользователей.
+
+Каждый пользователь имитируется задержкой, сопоставимой с сетевыми
+запросами к биржам за один тик (подключение, две цены, статусы ордеров, балансы).
+Часть пользователей "медленные" - их биржевой аккаунт отвечает долго.
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import inspect
+import argparse
+
+current_dir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
+parent_dir = os.path.dirname(current_dir)
+sys.path.insert(0, parent_dir)
+
+from app.core.executor import TickExecutor
+
+
+def make_latencies(users: int, latency: float, slow_share: float, slow_latency: float, seed: int) -> list:
+    rnd = random.Random(seed)
+    return [
+        slow_latency if rnd.random() < slow_share else rnd.uniform(latency / 2, latency * 3 / 2)
+        for _ in range(users)
+    ]
+
+
+def run_sequential(latencies: list) -> float:
+    start = time.perf_counter()
+    for latency in latencies:
+        time.sleep(latency)
+    return time.perf_counter() - start
+
+
+async def run_concurrent(latencies: list, concurrency: int) -> float:
+    executor = TickExecutor(concurrency)
+    start = time.perf_counter()
+    await executor.run(latencies, asyncio.sleep)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, nargs='+', default=[10, 50, 100, 200])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--latency', type=float, default=0.05, help='Средняя задержка пользователя, с')
+    parser.add_argument('--slow-share', type=float, default=0.05, help='Доля медленных пользователей')
+    parser.add_argument('--slow-latency', type=float, default=1.0, help='Задержка медленного пользователя, с')
+    parser.add_argument('--skip-sequential', action='store_true')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    header = ['users'] + ([] if args.skip_sequential else ['sequential']) + [f'c={c}' for c in args.concurrency]
+    print(' | '.join(f'{h:>10}' for h in header))
+
+    for users in args.users:
+        latencies = make_latencies(users, args.latency, args.slow_share, args.slow_latency, args.seed)
+
+        row = [f'{users:>10}']
+        if not args.skip_sequential:
+            row.append(f'{run_sequential(latencies):>9.2f}s')
+        for concurrency in args.concurrency:
+            row.append(f'{asyncio.run(run_concurrent(latencies, concurrency)):>9.2f}s')
+
+        print(' | '.join(row))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Тесты индекса открытых арбитражных ситуаций.
+"""
+import unittest
+
+import numpy as np
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from app import models
+from app.core.arbi_events import OpenEvent, OpenEvents
+
+
+def row(user_id, bundle_id, price1, price2, profit):
+    return dict(bundle_id=bundle_id, user_id=user_id, min_profit=profit, max_profit=profit,
+                current_price1=price1, current_price2=price2, used_base_coin_id=None,
+                used_threshold=1, used_volume=1)
+
+
+class OpenEventsTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.engine = create_async_engine('sqlite+aiosqlite://')
+        async with self.engine.begin() as conn:
+            await conn.run_sync(models.ArbiEvent.__table__.create)
+        self.events = OpenEvents()
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+
+    async def save(self, closed=(), widened=(), opened=()):
+        async with AsyncSession(self.engine) as session:
+            await self.events.save(session, list(closed), list(widened), list(opened))
+
+    async def rows(self):
+        table = models.ArbiEvent.__table__
+        async with AsyncSession(self.engine) as session:
+            return (await session.execute(sa.select(
+                table.c.user_id, table.c.bundle_id, table.c.min_profit, table.c.max_profit, table.c.end
+            ).order_by(table.c.id))).all()
+
+    async def test_tick_changes_are_saved(self):
+        await self.save(opened=[row(1, 10, 101, 100, 5), row(2, 10, 99, 100, 5)])
+        await self.save(widened=[((1, 10), 3, 8)], closed=[(2, 10)])
+
+        self.assertEqual(self.events.get(1, 10), OpenEvent(1, 3, 8))
+        self.assertIsNone(self.events.get(2, 10))
+
+        rows = await self.rows()
+        self.assertEqual([(r.user_id, r.min_profit, r.max_profit) for r in rows], [(1, 3, 8), (2, 5, 5)])
+        self.assertIsNone(rows[0].end)
+        self.assertIsNotNone(rows[1].end)
+
+    async def test_reversed_spread_reopens_event(self):
+        await self.save(opened=[row(1, 10, 101, 100, 5)])
+        await self.save(closed=[(1, 10)], opened=[row(1, 10, 99, 100, 6)])
+
+        self.assertEqual(self.events.get(1, 10), OpenEvent(-1, 6, 6))
+        self.assertEqual([r.end is None for r in await self.rows()], [False, True])
+
+    async def test_load_restores_open_events(self):
+        await self.save(opened=[row(1, 10, 101, 100, 5), row(2, 11, 99, 100, 7)])
+        await self.save(closed=[(2, 11)])
+
+        events = OpenEvents()
+        async with AsyncSession(self.engine) as session:
+            await events.load(session)
+        self.assertTrue(events.loaded)
+        self.assertEqual(events._events, {(1, 10): OpenEvent(1, 5, 5)})
+
+    async def test_index_is_kept_on_failed_commit(self):
+        await self.save(opened=[row(1, 10, 101, 100, 5)])
+
+        with self.assertRaises(sa.exc.DBAPIError):
+            await self.save(widened=[((1, 10), 1, 9)], opened=[dict(row(2, 10, 101, 100, 5), min_profit=None)])
+        self.assertEqual(self.events.get(1, 10), OpenEvent(1, 5, 5))
+        self.assertIsNone(self.events.get(2, 10))
+
+    def test_matrices(self):
+        self.events._events = {(1, 10): OpenEvent(1, 2, 3), (2, 11): OpenEvent(-1, 4, 5), (3, 10): OpenEvent(1, 1, 1)}
+
+        sign, min_profit, max_profit = self.events.matrices([1, 2], [10, 11])
+        np.testing.assert_array_equal(sign, [[1, 0], [0, -1]])
+        np.testing.assert_array_equal(min_profit, [[2, np.nan], [np.nan, 4]])
+        np.testing.assert_array_equal(max_profit, [[3, np.nan], [np.nan, 5]])
+
+
+if __name__ == '__main__':
+    unittest.main()
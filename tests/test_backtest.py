@@ -0,0 +1,77 @@
+"""
+Тесты бэктеста автоматической торговли.
+"""
+import unittest
+
+import numpy as np
+
+from app.core.backtest import BacktestParams, _scan, backtest
+
+
+MINUTE = 60.0
+
+
+def run(bybit, binance, **params):
+    t = np.arange(len(bybit)) * MINUTE
+    params = BacktestParams(**{'volume': 1, 'init_volume': 10, 'threshold': 4, 'epsilon': 0.1, 'fee': 0,
+                               **params})
+    return backtest(t, np.array(bybit, dtype=float), np.array(binance, dtype=float), params)
+
+
+class ScanTest(unittest.TestCase):
+
+    def test_first_hit(self):
+        values = np.arange(1000)
+
+        self.assertEqual(_scan(lambda s, e: values[s:e] >= 700, 0, 1000), 700)
+        self.assertEqual(_scan(lambda s, e: values[s:e] >= 700, 800, 1000), 800)
+        self.assertIsNone(_scan(lambda s, e: values[s:e] < 0, 0, 1000))
+
+
+class BacktestTest(unittest.TestCase):
+
+    def test_arbitrage_trade(self):
+        # purchase at 100, fill at 99, sell Bybit at 110 / buy Binance at 100, both legs fill
+        result = run(bybit=[100, 99, 99, 110, 111, 111, 111, 99],
+                     binance=[100, 99, 99, 100, 100, 101, 99, 99])
+
+        self.assertEqual(result.trades, 1)
+        self.assertEqual(result.timeouts, 0)
+        self.assertEqual(result.start_equity, 2 * (100000 - 1000) + 2 * 10 * 99)
+        self.assertAlmostEqual(result.pnl, 10)
+        self.assertFalse(result.stopped)
+
+    def test_unfilled_trade_times_out(self):
+        result = run(bybit=[100, 99, 99, 110, 110, 110, 110, 110],
+                     binance=[100, 99, 99, 100, 99, 99, 99, 99],
+                     wait_order_minutes=1)
+
+        self.assertEqual(result.trades, 0)
+        self.assertEqual(result.timeouts, 1)
+
+    def test_initial_purchase_is_not_cancelled(self):
+        result = run(bybit=[100] * 10, binance=[100] * 10, wait_order_minutes=1)
+
+        self.assertEqual(result.timeouts, 0)
+        self.assertIsNone(result.start_equity)
+        self.assertEqual(result.state_time['WAIT_FILLED'], 9 * MINUTE)
+
+    def test_stops_without_funds(self):
+        result = run(bybit=[100, 99], binance=[100, 99], balance=500)
+
+        self.assertTrue(result.stopped)
+        self.assertEqual(result.pnl, 0)
+
+    def test_fee_is_charged(self):
+        prices = dict(bybit=[100, 99, 99, 110, 111, 111, 111, 99],
+                      binance=[100, 99, 99, 100, 100, 101, 99, 99])
+
+        self.assertLess(run(**prices, fee=0.001).pnl, run(**prices).pnl)
+
+    def test_lengths_must_match(self):
+        with self.assertRaises(ValueError):
+            backtest(np.arange(3), np.ones(3), np.ones(2))
+
+
+if __name__ == '__main__':
+    unittest.main()
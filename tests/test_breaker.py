@@ -0,0 +1,186 @@
+"""
+Тесты выключателей бирж и отмены ордеров при недоступности биржи.
+"""
+import time
+import asyncio
+import unittest
+from unittest import mock
+
+from app.core import strategy
+from app.core.breaker import (
+    CircuitBreaker, CircuitOpenError, CircuitState, ExchangeUnavailable, breakers, guarded
+)
+from app.core.exchange import AsyncBinanceExchange, ExchangeName
+
+
+class CircuitBreakerTest(unittest.TestCase):
+
+    def breaker(self) -> CircuitBreaker:
+        return CircuitBreaker('Binance', failure_threshold=2, recovery_timeout=30)
+
+    def test_opens_after_consecutive_outages(self):
+        breaker = self.breaker()
+
+        breaker.failure(ConnectionError())
+        self.assertEqual(breaker.state, CircuitState.CLOSED)
+        breaker.failure(asyncio.TimeoutError())
+        self.assertEqual(breaker.state, CircuitState.OPEN)
+        with self.assertRaises(CircuitOpenError):
+            breaker.before()
+
+    def test_request_error_is_not_outage(self):
+        breaker = self.breaker()
+
+        breaker.failure(ConnectionError())
+        breaker.failure(ValueError('insufficient balance'))
+        breaker.failure(ConnectionError())
+        self.assertEqual(breaker.state, CircuitState.CLOSED)
+
+    def test_single_probe_after_recovery_timeout(self):
+        breaker = self.breaker()
+        breaker.failure(ConnectionError())
+        breaker.failure(ConnectionError())
+        breaker.opened = time.monotonic() - 31
+
+        breaker.check()
+        breaker.before()
+        self.assertEqual(breaker.state, CircuitState.HALF_OPEN)
+        # only one probe at a time
+        with self.assertRaises(CircuitOpenError):
+            breaker.before()
+
+        breaker.success()
+        self.assertEqual(breaker.state, CircuitState.CLOSED)
+
+    def test_failed_probe_opens_again(self):
+        breaker = self.breaker()
+        breaker.failure(ConnectionError())
+        breaker.failure(ConnectionError())
+        breaker.opened = time.monotonic() - 31
+
+        breaker.before()
+        breaker.failure(ConnectionError())
+        self.assertEqual(breaker.state, CircuitState.OPEN)
+        with self.assertRaises(CircuitOpenError):
+            breaker.before()
+
+    def test_cancelled_probe_allows_new_probe(self):
+        breaker = self.breaker()
+        breaker.failure(ConnectionError())
+        breaker.failure(ConnectionError())
+        breaker.opened = time.monotonic() - 31
+
+        breaker.before()
+        breaker.cancelled()
+        breaker.before()
+        self.assertEqual(breaker.state, CircuitState.HALF_OPEN)
+
+
+class FakeClient:
+    name = ExchangeName.BINANCE
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    async def call(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return 'ok'
+
+    check_order = guarded('check_order')(call)
+    place_order = guarded('place_order')(call)
+
+
+class GuardedTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        breakers._breakers.clear()
+
+    def tearDown(self):
+        breakers._breakers.clear()
+
+    async def test_read_is_retried(self):
+        client = FakeClient([ConnectionError()])
+
+        with mock.patch.object(breakers, 'delay', return_value=0):
+            self.assertEqual(await client.check_order(), 'ok')
+        self.assertEqual(client.calls, 2)
+
+    async def test_read_outage_after_retries(self):
+        client = FakeClient([ConnectionError()] * (breakers.retries + 1))
+
+        with mock.patch.object(breakers, 'delay', return_value=0):
+            with self.assertRaises(ExchangeUnavailable):
+                await client.check_order()
+
+    async def test_order_is_not_retried(self):
+        client = FakeClient([ConnectionError()])
+
+        with self.assertRaises(ConnectionError):
+            await client.place_order()
+        self.assertEqual(client.calls, 1)
+
+    async def test_open_circuit_skips_connect(self):
+        breakers[ExchangeName.BINANCE].failure_threshold = 1
+        breakers[ExchangeName.BINANCE].failure(ConnectionError())
+        client = AsyncBinanceExchange('key', 'secret')
+
+        with mock.patch('app.core.exchange.AsyncClient.create') as create:
+            with self.assertRaises(CircuitOpenError):
+                await client.connect()
+        create.assert_not_called()
+
+
+class FakeExchange:
+
+    def __init__(self, name: ExchangeName, error: Exception = None):
+        self.name = name
+        self.error = error
+        self.canceled = []
+
+    async def cancel_order(self, symbol, order_id):
+        if self.error is not None:
+            raise self.error
+        self.canceled.append(order_id)
+        return True
+
+
+class CancelOrdersTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(strategy.outbox, 'send_task')
+        self.send_task = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def cancel(self, bybit, binance):
+        await strategy.cancel_orders('BTCUSDT', 'BTC/USDT', bybit, binance, 'binance-1', 'bybit-1', '1')
+
+    async def test_unavailable_exchange_is_retried(self):
+        bybit = FakeExchange(ExchangeName.BYBIT, CircuitOpenError('Bybit is unavailable'))
+        binance = FakeExchange(ExchangeName.BINANCE)
+
+        with self.assertRaises(ExchangeUnavailable):
+            await self.cancel(bybit, binance)
+        # the reachable exchange is cancelled anyway
+        self.assertEqual(binance.canceled, ['binance-1'])
+
+    async def test_network_error_is_retried(self):
+        bybit = FakeExchange(ExchangeName.BYBIT)
+        binance = FakeExchange(ExchangeName.BINANCE, asyncio.TimeoutError())
+
+        with self.assertRaises(ExchangeUnavailable):
+            await self.cancel(bybit, binance)
+        self.assertEqual(bybit.canceled, ['bybit-1'])
+
+    async def test_missing_order_is_not_retried(self):
+        bybit = FakeExchange(ExchangeName.BYBIT, ValueError('order does not exist'))
+        binance = FakeExchange(ExchangeName.BINANCE)
+
+        await self.cancel(bybit, binance)
+        self.assertEqual(binance.canceled, ['binance-1'])
+
+
+if __name__ == '__main__':
+    unittest.main()
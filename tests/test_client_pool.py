@@ -0,0 +1,96 @@
+"""
+Тесты пула клиентов бирж.
+"""
+import unittest
+
+from app.core.client_pool import ExchangeClientPool
+from app.core.exchange import ExchangeName
+
+
+class FakeClient:
+
+    def __init__(self, api_key, api_secret, test=False):
+        self.api_key = api_key
+        self.connected = False
+        self.closed = False
+
+    async def connect(self):
+        self.connected = True
+
+    async def close(self):
+        self.closed = True
+
+
+class ClientPoolTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.pool = ExchangeClientPool(max_size=1, ttl=600)
+        self.pool.exchanges = {ExchangeName.BINANCE: FakeClient, ExchangeName.BYBIT: FakeClient}
+
+    async def get(self, api_key, api_secret='secret'):
+        return await self.pool.get(ExchangeName.BINANCE, api_key, api_secret)
+
+    async def test_client_is_reused(self):
+        client = await self.get('a')
+        self.pool.release(client)
+
+        self.assertIs(await self.get('a'), client)
+        self.assertTrue(client.connected)
+
+    async def test_released_client_is_evicted(self):
+        first = await self.get('a')
+        self.pool.release(first)
+        second = await self.get('b')
+
+        self.assertTrue(first.closed)
+        self.assertFalse(second.closed)
+        self.assertEqual(len(self.pool), 1)
+
+    async def test_leased_client_is_not_closed(self):
+        first = await self.get('a')
+        second = await self.get('b')
+
+        # the pool grows over its size while both clients are in use
+        self.assertFalse(first.closed)
+        self.assertEqual(len(self.pool), 2)
+
+        self.pool.release(first)
+        self.pool.release(second)
+        await self.get('c')
+        self.assertTrue(first.closed)
+        self.assertTrue(second.closed)
+
+    async def test_dropped_client_is_closed_after_last_release(self):
+        client = await self.get('a')
+        self.pool.lease(client)
+
+        # the secret changed: a new client replaces the leased one
+        replacement = await self.get('a', 'new secret')
+        self.assertIsNot(replacement, client)
+        self.assertFalse(client.closed)
+
+        self.pool.release(client)
+        self.pool.release(client)
+        self.pool.release(replacement)
+        await self.get('a', 'new secret')
+        self.assertTrue(client.closed)
+        self.assertFalse(replacement.closed)
+
+    async def test_fit_grows_pool(self):
+        self.pool.fit(2)
+        for api_key in ('a', 'b'):
+            self.pool.release(await self.get(api_key))
+
+        self.assertEqual(len(self.pool), 2)
+        self.pool.fit(0)
+        self.assertEqual(self.pool.max_size, 1)
+
+    async def test_close_closes_leased_clients(self):
+        client = await self.get('a')
+
+        await self.pool.close()
+        self.assertTrue(client.closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
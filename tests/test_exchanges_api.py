@@ -0,0 +1,75 @@
+"""
+Тесты публичного API бирж.
+"""
+import asyncio
+import unittest
+
+import aiohttp
+from aiohttp import web
+
+from app.core.exchanges_api import PublicApi
+
+
+class PublicApiTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.release = asyncio.Event()
+
+        async def ticker(request):
+            if request.query.get('wait'):
+                await self.release.wait()
+            if request.query.get('bad'):
+                return web.json_response({'code': -1121}, status=400)
+            return web.json_response([{'symbol': 'BTCUSDT', 'price': '100.5'}])
+
+        app = web.Application()
+        app.router.add_get('/api/v3/ticker/price', ticker)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+
+        self.api = PublicApi({'Binance': f'http://127.0.0.1:{port}'}, pool_size=4)
+
+    async def asyncTearDown(self):
+        await self.api.close()
+        await self.runner.cleanup()
+
+    async def get(self, **params):
+        return await self.api.get('Binance', '/api/v3/ticker/price', params)
+
+    async def test_connection_is_reused(self):
+        await self.get()
+        self.assertEqual((self.api.acquired('Binance'), self.api.idle('Binance')), (0, 1))
+
+        await self.get()
+        self.assertEqual((self.api.acquired('Binance'), self.api.idle('Binance')), (0, 1))
+
+    async def test_concurrent_requests_are_acquired(self):
+        requests = asyncio.gather(*(self.get(wait=1) for _ in range(3)))
+        for _ in range(100):
+            if self.api.acquired('Binance') == 3:
+                break
+            await asyncio.sleep(0.01)
+        self.assertEqual(self.api.acquired('Binance'), 3)
+
+        self.release.set()
+        await requests
+        self.assertEqual((self.api.acquired('Binance'), self.api.idle('Binance')), (0, 3))
+
+    async def test_error_response_releases_connection(self):
+        with self.assertRaises(aiohttp.ClientResponseError):
+            await self.get(bad=1)
+        self.assertEqual(self.api.acquired('Binance'), 0)
+
+    async def test_idle_connections_expire(self):
+        self.api.keepalive_timeout = 0
+        await self.get()
+        await asyncio.sleep(0.01)
+
+        self.assertEqual(self.api.idle('Binance'), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
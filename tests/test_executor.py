@@ -0,0 +1,49 @@
+"""
+Тесты исполнителя тиков стратегии.
+"""
+import asyncio
+import unittest
+
+from app.core.executor import TickExecutor
+
+
+class TickExecutorTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_start_is_rotated(self):
+        executor = TickExecutor(concurrency=2)
+
+        self.assertEqual(executor.order([1, 2, 3]), [1, 2, 3])
+        self.assertEqual(executor.order([1, 2, 3]), [3, 1, 2])
+
+    async def test_results_follow_items(self):
+        executor = TickExecutor(concurrency=2)
+        executor.order([1, 2, 3])
+
+        async def handler(item):
+            await asyncio.sleep(0)
+            if item == 2:
+                raise ValueError(item)
+            return item * 10
+
+        results = await executor.run([1, 2, 3], handler)
+        self.assertEqual(results[0], 10)
+        self.assertIsInstance(results[1], ValueError)
+        self.assertEqual(results[2], 30)
+
+    async def test_concurrency_is_limited(self):
+        executor = TickExecutor(concurrency=2)
+        running, peak = 0, 0
+
+        async def handler(item):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0)
+            running -= 1
+
+        await executor.run(range(5), handler)
+        self.assertEqual(peak, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,207 @@
+"""
+Тесты размещения ног арбитражной сделки.
+"""
+import asyncio
+import unittest
+from decimal import Decimal
+from unittest import mock
+
+from app import models
+from app.core import strategy
+from app.core.exchange import ExchangeName, OrderStatus
+from app.core.breaker import CircuitOpenError
+from app.core.legs import LegError, order_journal
+from app.core.symbol_rules import SymbolRules, SymbolRulesError, symbol_rules
+
+
+class FakeExchange:
+
+    def __init__(self, name: ExchangeName):
+        self.name = name
+        self.canceled = []
+        # client order id -> order id of orders that reached the exchange
+        self.orders = {}
+
+    async def cancel_order(self, symbol, order_id):
+        self.canceled.append((symbol, order_id))
+        return True
+
+    async def find_order(self, symbol, client_order_id):
+        return self.orders.get(client_order_id)
+
+
+async def place(user, bybit, place_bybit, binance, place_binance):
+    return await strategy.place_pair(user, 1, bybit, 'BTC/USDT', 100, place_bybit, binance, 'BTCUSDT', 100, place_binance)
+
+
+class PlacePairTest(unittest.IsolatedAsyncioTestCase):
+
+    def tearDown(self):
+        order_journal.drain()
+
+    async def test_failed_leg_cancels_placed_leg(self):
+        user = models.User(id=1)
+        bybit, binance = FakeExchange(ExchangeName.BYBIT), FakeExchange(ExchangeName.BINANCE)
+
+        async def place_bybit(quantity, price, client_order_id):
+            return 'bybit-1', 'NEW'
+
+        async def place_binance(quantity, price, client_order_id):
+            raise ConnectionError('binance is down')
+
+        with self.assertRaises(LegError):
+            await place(user, bybit, place_bybit, binance, place_binance)
+
+        self.assertEqual(bybit.canceled, [('BTC/USDT', 'bybit-1')])
+        self.assertEqual(binance.canceled, [])
+        self.assertEqual(user.order_id_bybit, 'bybit-1')
+        self.assertIsNone(user.order_id_binance)
+
+    async def test_failed_leg_after_open_circuit_is_not_skipped(self):
+        user = models.User(id=1)
+        bybit, binance = FakeExchange(ExchangeName.BYBIT), FakeExchange(ExchangeName.BINANCE)
+
+        async def place_bybit(quantity, price, client_order_id):
+            return 'bybit-1', 'NEW'
+
+        async def place_binance(quantity, price, client_order_id):
+            raise CircuitOpenError('Binance is unavailable')
+
+        # the bybit order was sent - the tick must not be retried as an outage
+        with self.assertRaises(LegError):
+            await place(user, bybit, place_bybit, binance, place_binance)
+        self.assertEqual(bybit.canceled, [('BTC/USDT', 'bybit-1')])
+
+    async def test_open_circuit_without_orders_is_skipped(self):
+        user = models.User(id=1)
+        bybit, binance = FakeExchange(ExchangeName.BYBIT), FakeExchange(ExchangeName.BINANCE)
+
+        async def place_bybit(quantity, price, client_order_id):
+            raise CircuitOpenError('Bybit is unavailable')
+
+        async def place_binance(quantity, price, client_order_id):
+            raise CircuitOpenError('Binance is unavailable')
+
+        with self.assertRaises(CircuitOpenError):
+            await place(user, bybit, place_bybit, binance, place_binance)
+        self.assertEqual(bybit.canceled + binance.canceled, [])
+
+    async def test_placed_legs_are_not_cancelled(self):
+        user = models.User(id=1)
+        bybit, binance = FakeExchange(ExchangeName.BYBIT), FakeExchange(ExchangeName.BINANCE)
+
+        async def place_bybit(quantity, price, client_order_id):
+            return 'bybit-1'
+
+        async def place_binance(quantity, price, client_order_id):
+            return 'binance-1'
+
+        placed = await place(user, bybit, place_bybit, binance, place_binance)
+
+        self.assertEqual(placed, ('bybit-1', 'binance-1'))
+        self.assertEqual(bybit.canceled + binance.canceled, [])
+
+
+    async def test_rejected_leg_is_failed(self):
+        user = models.User(id=1)
+        bybit, binance = FakeExchange(ExchangeName.BYBIT), FakeExchange(ExchangeName.BINANCE)
+
+        async def place_bybit(quantity, price, client_order_id):
+            return 'bybit-1', OrderStatus.NEW
+
+        async def place_binance(quantity, price, client_order_id):
+            return 'binance-1', OrderStatus.REJECTED
+
+        with self.assertRaises(LegError):
+            await place(user, bybit, place_bybit, binance, place_binance)
+        self.assertEqual(bybit.canceled, [('BTC/USDT', 'bybit-1')])
+
+    async def test_empty_leg_result_is_failed(self):
+        user = models.User(id=1)
+        bybit, binance = FakeExchange(ExchangeName.BYBIT), FakeExchange(ExchangeName.BINANCE)
+
+        async def place_bybit(quantity, price, client_order_id):
+            return None
+
+        async def place_binance(quantity, price, client_order_id):
+            return 'binance-1'
+
+        with self.assertRaises(LegError):
+            await place(user, bybit, place_bybit, binance, place_binance)
+        self.assertEqual(binance.canceled, [('BTCUSDT', 'binance-1')])
+        self.assertIsNone(user.order_id_bybit)
+
+    async def test_timed_out_leg_is_found_by_client_order_id(self):
+        user = models.User(id=1)
+        bybit, binance = FakeExchange(ExchangeName.BYBIT), FakeExchange(ExchangeName.BINANCE)
+
+        async def place_bybit(quantity, price, client_order_id):
+            return 'bybit-1'
+
+        async def place_binance(quantity, price, client_order_id):
+            # the order reached the exchange, the response did not come back
+            binance.orders[client_order_id] = 'binance-1'
+            raise asyncio.TimeoutError()
+
+        placed = await place(user, bybit, place_bybit, binance, place_binance)
+
+        self.assertEqual(placed, ('bybit-1', 'binance-1'))
+        self.assertEqual(bybit.canceled + binance.canceled, [])
+
+    async def test_timed_out_leg_not_on_exchange_is_failed(self):
+        user = models.User(id=1)
+        bybit, binance = FakeExchange(ExchangeName.BYBIT), FakeExchange(ExchangeName.BINANCE)
+
+        async def place_bybit(quantity, price, client_order_id):
+            return 'bybit-1'
+
+        async def place_binance(quantity, price, client_order_id):
+            raise asyncio.TimeoutError()
+
+        with self.assertRaises(LegError):
+            await place(user, bybit, place_bybit, binance, place_binance)
+        self.assertEqual(bybit.canceled, [('BTC/USDT', 'bybit-1')])
+
+    async def test_rules_are_checked_before_any_leg_is_sent(self):
+        user = models.User(id=1)
+        bybit, binance = FakeExchange(ExchangeName.BYBIT), FakeExchange(ExchangeName.BINANCE)
+        sent = []
+
+        async def place_bybit(quantity, price, client_order_id):
+            sent.append('bybit')
+            return 'bybit-1'
+
+        async def place_binance(quantity, price, client_order_id):
+            sent.append('binance')
+            return 'binance-1'
+
+        with mock.patch.dict(symbol_rules._rules, {('Binance', 'BTCUSDT'): SymbolRules(min_notional=1000)}):
+            with self.assertRaises(SymbolRulesError):
+                await place(user, bybit, place_bybit, binance, place_binance)
+        self.assertEqual(sent, [])
+
+    async def test_legs_get_one_quantity(self):
+        user = models.User(id=1)
+        bybit, binance = FakeExchange(ExchangeName.BYBIT), FakeExchange(ExchangeName.BINANCE)
+        sent = {}
+
+        async def place_bybit(quantity, price, client_order_id):
+            sent['bybit'] = quantity
+            return 'bybit-1'
+
+        async def place_binance(quantity, price, client_order_id):
+            sent['binance'] = quantity
+            return 'binance-1'
+
+        rules = {
+            ('Bybit', 'BTC/USDT'): SymbolRules(step_size=Decimal('0.001')),
+            ('Binance', 'BTCUSDT'): SymbolRules(step_size=Decimal('0.01')),
+        }
+        with mock.patch.dict(symbol_rules._rules, rules):
+            await strategy.place_pair(user, 1.2345, bybit, 'BTC/USDT', 100, place_bybit,
+                                      binance, 'BTCUSDT', 100, place_binance)
+        self.assertEqual(sent, {'bybit': 1.23, 'binance': 1.23})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+"""
+Тесты решений конечного автомата AutoState.
+"""
+import itertools
+import unittest
+
+from app.core.machine import Action, decide, order_timed_out, orders_transition
+from app.models import AutoState, AutoStatus
+
+
+def legacy_action(state, bybit_price, binance_price, volume, threshold, epsilon):
+    """Branches of the tick as they were written in auto_mode before the machine module"""
+    if state == AutoState.ON_STOP:
+        return Action.STOP
+    elif state == AutoState.INITIAL and abs(bybit_price - binance_price) < epsilon:
+        return Action.INIT_PURCHASE
+    elif state == AutoState.WAIT_FILLED:
+        return Action.CHECK_ORDERS
+    elif (state == AutoState.IN_PROGRESS) \
+            and (abs(volume * bybit_price - volume * binance_price) >= threshold):
+        if bybit_price >= binance_price:
+            return Action.SELL_BYBIT
+        return Action.SELL_BINANCE
+    return Action.NONE
+
+
+def legacy_wait_filled(status, filled, timed_out):
+    """WAIT_FILLED branch before the machine module: (next state, cancel)"""
+    if filled:
+        return AutoState.IN_PROGRESS, False
+    if timed_out:
+        if status == AutoStatus.STARTED:
+            pass
+        elif status == AutoStatus.PLAY:
+            return AutoState.IN_PROGRESS, True
+    return AutoState.WAIT_FILLED, False
+
+
+class DecideTest(unittest.TestCase):
+
+    def test_same_actions_as_legacy_branches(self):
+        prices = [99.0, 99.95, 100.0, 100.05, 100.08, 101.0]
+        for state, bybit, binance, volume, threshold, epsilon in itertools.product(
+                AutoState, prices, prices, (1, 50), (0.08, 4), (0.1, 1)):
+            with self.subTest(state=state, bybit=bybit, binance=binance, volume=volume,
+                              threshold=threshold, epsilon=epsilon):
+                self.assertEqual(decide(state, bybit, binance, volume, threshold, epsilon),
+                                 legacy_action(state, bybit, binance, volume, threshold, epsilon))
+
+    def test_equal_prices_sell_bybit(self):
+        self.assertEqual(decide(AutoState.IN_PROGRESS, 100, 100, 1, 0, 0.1), Action.SELL_BYBIT)
+
+    def test_orders_transition_as_legacy_branch(self):
+        for status, filled, timed_out in itertools.product(AutoStatus, (False, True), (False, True)):
+            with self.subTest(status=status, filled=filled, timed_out=timed_out):
+                self.assertEqual(orders_transition(status, filled, timed_out),
+                                 legacy_wait_filled(status, filled, timed_out))
+
+    def test_timeout_counts_full_minutes(self):
+        self.assertFalse(order_timed_out(60 * 60 + 59, 60))
+        self.assertTrue(order_timed_out(61 * 60, 60))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+"""
+Тесты очереди уведомлений бота.
+"""
+import asyncio
+import unittest
+from contextlib import contextmanager
+
+from app.core.notifications import Outbox
+
+
+class FakeSender:
+
+    def __init__(self, fail_after: int = None):
+        self.fail_after = fail_after
+        self.sent = []
+
+    @contextmanager
+    def producer_or_acquire(self):
+        yield object()
+
+    def send_task(self, name, args, producer=None):
+        if self.fail_after is not None and len(self.sent) >= self.fail_after:
+            raise ConnectionError('broker is unavailable')
+        self.sent.append((name, args))
+
+
+class OutboxTest(unittest.IsolatedAsyncioTestCase):
+
+    def outbox(self, sender, **kwargs) -> Outbox:
+        outbox = Outbox(sender, flush_interval=60, **kwargs)
+        # the outbox counts as started: notifications wait for flush
+        outbox._task = asyncio.get_running_loop().create_future()
+        self.addCleanup(outbox._task.cancel)
+        return outbox
+
+    async def test_not_started_sends_immediately(self):
+        sender = FakeSender()
+        outbox = Outbox(sender)
+
+        outbox.send_task('profit', ('1', 10))
+        self.assertEqual(sender.sent, [('profit', ('1', 10))])
+
+    async def test_state_is_deduplicated(self):
+        sender = FakeSender()
+        outbox = self.outbox(sender)
+
+        for _ in range(3):
+            outbox.send_task('need_transfer', ('1', 'Binance'))
+            outbox.send_task('profit', ('1', 10))
+
+        self.assertEqual(await outbox.flush(), 4)
+        self.assertEqual(sender.sent.count(('need_transfer', ('1', 'Binance'))), 1)
+        self.assertEqual(sender.sent.count(('profit', ('1', 10))), 3)
+
+    async def test_debug_is_merged(self):
+        sender = FakeSender()
+        outbox = self.outbox(sender)
+
+        outbox.send_task('debug', ('1', 'INFO', 'first'))
+        outbox.send_task('debug', ('1', 'ERROR', 'second'))
+
+        self.assertEqual(await outbox.flush(), 1)
+        self.assertEqual(sender.sent, [('debug', ('1', 'ERROR', '\nfirst\n\nsecond'))])
+
+    async def test_only_unsent_tail_is_requeued(self):
+        sender = FakeSender(fail_after=2)
+        outbox = self.outbox(sender, batch_size=10)
+        for i in range(5):
+            outbox.send_task('profit', ('1', i))
+
+        self.assertEqual(await outbox.flush(), 2)
+        self.assertEqual(len(outbox), 3)
+
+        sender.fail_after = None
+        outbox.send_task('profit', ('1', 5))
+        self.assertEqual(await outbox.flush(), 4)
+        # each task is published once, the requeued ones first
+        self.assertEqual([args[1] for _, args in sender.sent], [0, 1, 2, 3, 4, 5])
+
+    async def test_requeue_keeps_deduplication(self):
+        sender = FakeSender(fail_after=0)
+        outbox = self.outbox(sender)
+        outbox.send_task('need_transfer', ('1', 'Binance'))
+
+        self.assertEqual(await outbox.flush(), 0)
+        outbox.send_task('need_transfer', ('1', 'Binance'))
+        self.assertEqual(len(outbox), 1)
+
+    async def test_requeue_is_limited(self):
+        sender = FakeSender(fail_after=0)
+        outbox = self.outbox(sender, retry_limit=2)
+        for i in range(4):
+            outbox.send_task('profit', ('1', i))
+
+        await outbox.flush()
+        # the oldest tasks are dropped first
+        self.assertEqual([args[1] for _, args in outbox._tasks], [2, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
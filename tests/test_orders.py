@@ -0,0 +1,83 @@
+"""
+Тесты отслеживания статусов ордеров по потокам аккаунтов.
+"""
+import unittest
+from unittest import mock
+
+from app.core import orders
+from app.core.client_pool import client_pool
+from app.core.exchange import ExchangeName, OrderStatus
+from app.core.orders import OrderTracker
+
+
+class FakeClient:
+    name = ExchangeName.BINANCE
+    api_key = 'key'
+
+
+class FakeStream:
+
+    def __init__(self, tracker, client):
+        self.client = client
+        self.connected = True
+        self.started = False
+
+    def start(self):
+        self.started = True
+
+    def stop(self):
+        self.started = False
+        self.connected = False
+
+
+class OrderTrackerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tracker = OrderTracker()
+        self.tracker.streams = {ExchangeName.BINANCE: FakeStream}
+        self.client = FakeClient()
+
+        patcher = mock.patch.object(orders, 'client_pool', mock.Mock(wraps=client_pool))
+        self.pool = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(client_pool._leases.clear)
+
+    def test_untracked_events_are_not_stored(self):
+        self.tracker.update(ExchangeName.BINANCE, '1', OrderStatus.FILLED)
+        self.tracker.track(1, self.client, 'BTCUSDT', '1')
+
+        self.assertEqual(self.tracker._statuses, {})
+        self.assertIsNone(self.tracker.status(self.client, '1'))
+
+    def test_untrack_drops_statuses(self):
+        listener = self.tracker.listener = mock.Mock()
+        self.tracker.track(1, self.client, 'BTCUSDT', '1')
+        self.tracker.update(ExchangeName.BINANCE, '1', OrderStatus.FILLED)
+
+        self.assertEqual(self.tracker.status(self.client, '1'), OrderStatus.FILLED)
+        listener.assert_called_once_with(1)
+
+        self.tracker.untrack(1)
+        self.tracker.update(ExchangeName.BINANCE, '1', OrderStatus.CANCELED)
+        self.assertEqual(self.tracker._statuses, {})
+
+    def test_clients_are_leased_until_untrack(self):
+        self.tracker.track(1, self.client, 'BTCUSDT', '1')
+        self.tracker.track(1, self.client, 'BTCUSDT', '2')
+        # two orders and the account stream
+        self.assertEqual(client_pool._leases[id(self.client)], 3)
+
+        self.tracker.untrack(1)
+        self.assertNotIn(id(self.client), client_pool._leases)
+        self.assertEqual(self.tracker._streams, {})
+
+    def test_close_releases_stream_clients(self):
+        self.tracker.track(1, self.client, 'BTCUSDT', '1')
+        self.tracker.close()
+
+        self.assertEqual(self.pool.release.call_count, 1)
+        self.assertEqual(self.tracker._streams, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
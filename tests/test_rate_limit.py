@@ -0,0 +1,131 @@
+"""
+Тесты ограничения частоты запросов к биржам.
+"""
+import time
+import asyncio
+import unittest
+
+from app.core.rate_limit import ExchangeLimits, RateGovernor, TokenBucket, rate_governor, rate_limited
+
+
+class TokenBucketTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_orders_are_served_first(self):
+        bucket = TokenBucket(rate=1000, capacity=1)
+        bucket.pause(0.01)
+        served = []
+
+        async def request(name, priority):
+            await bucket.acquire(1, priority)
+            served.append(name)
+
+        await asyncio.gather(request('price', 3), request('check_order', 1), request('place_order', 0))
+        self.assertEqual(served, ['place_order', 'check_order', 'price'])
+
+    async def test_cancelled_waiter_is_skipped(self):
+        bucket = TokenBucket(rate=1000, capacity=1)
+        bucket.tokens = 0
+
+        waiter = asyncio.create_task(bucket.acquire(1))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+
+        await asyncio.wait_for(bucket.acquire(1), 1)
+        self.assertEqual(len(bucket), 0)
+
+    async def test_pause_delays_requests(self):
+        bucket = TokenBucket(rate=1000, capacity=10)
+        bucket.pause(0.05)
+
+        started = time.monotonic()
+        await bucket.acquire(1)
+        self.assertGreaterEqual(time.monotonic() - started, 0.04)
+
+
+def governor() -> RateGovernor:
+    return RateGovernor({
+        'Binance': ExchangeLimits(ip_rate=1, ip_capacity=1000, key_rate=1, key_capacity=10,
+                                  weight_limit_1m=6000),
+        'Bybit': ExchangeLimits(ip_rate=1, ip_capacity=1000, key_rate=1, key_capacity=10),
+    })
+
+
+class RateGovernorTest(unittest.IsolatedAsyncioTestCase):
+
+    async def test_used_weight_limits_tokens(self):
+        limits = governor()
+
+        limits.observe('Binance', None, {'X-MBX-USED-WEIGHT-1M': '5500'})
+        self.assertLessEqual(limits.bucket('Binance').tokens, 500)
+
+    async def test_stale_headers_are_ignored(self):
+        limits = governor()
+        bucket = limits.bucket('Binance')
+        limits.observe('Binance', None, {'X-MBX-USED-WEIGHT-1M': '5500'})
+
+        # headers of an earlier concurrent response do not change the limit again
+        bucket.tokens = 800
+        limits.observe('Binance', None, {'X-MBX-USED-WEIGHT-1M': '5400'})
+        limits.observe('Binance', None, {'X-MBX-USED-WEIGHT-1M': '5500'})
+        self.assertGreaterEqual(bucket.tokens, 800)
+
+        limits.observe('Binance', None, {'X-MBX-USED-WEIGHT-1M': '5900'})
+        self.assertLessEqual(bucket.tokens, 100)
+
+    async def test_key_limit_status(self):
+        limits = governor()
+        reset = str(int(time.time() * 1000) + 60000)
+
+        limits.observe('Bybit', 'key', {'X-Bapi-Limit-Status': '3', 'X-Bapi-Limit-Reset-Timestamp': reset})
+        self.assertLessEqual(limits.bucket('Bybit', 'key').tokens, 3)
+
+        limits.observe('Bybit', 'key', {'X-Bapi-Limit-Status': '0', 'X-Bapi-Limit-Reset-Timestamp': reset})
+        self.assertGreater(limits.bucket('Bybit', 'key').paused_until, time.monotonic() + 50)
+
+    async def test_retry_after_pauses_exchange(self):
+        limits = governor()
+
+        limits.observe('Binance', None, {'Retry-After': '30'})
+        self.assertGreater(limits.bucket('Binance').paused_until, time.monotonic() + 25)
+
+
+class FakeClient:
+    name = 'Binance'
+    api_key = 'key'
+
+    def __init__(self, headers=None):
+        self.headers = headers
+
+    def response_headers(self):
+        return self.headers
+
+    @rate_limited('check_order')
+    async def check_order(self, headers):
+        self.headers = headers
+        return 'ok'
+
+    @rate_limited('check_order')
+    async def fail(self):
+        raise ConnectionError()
+
+
+class RateLimitedTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.bucket = rate_governor.bucket('Binance')
+        self.addCleanup(rate_governor._buckets.clear)
+        self.addCleanup(rate_governor._used.clear)
+
+    async def test_response_headers_are_observed(self):
+        self.assertEqual(await FakeClient().check_order({'X-MBX-USED-WEIGHT-1M': '5999'}), 'ok')
+        self.assertLessEqual(self.bucket.tokens, 1)
+
+    async def test_previous_headers_are_not_observed_on_error(self):
+        with self.assertRaises(ConnectionError):
+            await FakeClient({'X-MBX-USED-WEIGHT-1M': '5999'}).fail()
+        self.assertGreater(self.bucket.tokens, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
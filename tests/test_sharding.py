@@ -0,0 +1,152 @@
+"""
+Тесты владения шардами пользователей.
+"""
+import unittest
+from unittest import mock
+
+from app.core import tasks
+from app.core.sharding import ShardCoordinator, SHARD_LOCK_NAMESPACE
+
+
+class FakeEngine:
+
+    class dialect:
+        name = 'postgresql'
+
+
+class FakeConnection:
+
+    def __init__(self, error: Exception = None):
+        self.error = error
+        self.invalidated = False
+        self.closed = False
+
+    async def scalar(self, statement, params=None):
+        if self.error is not None:
+            raise self.error
+        return 1
+
+    async def invalidate(self):
+        self.invalidated = True
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeResult:
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def all(self):
+        return self.rows
+
+
+class FakeSession:
+
+    def __init__(self, held):
+        self.held = held
+        self.params = None
+
+    async def scalars(self, statement, params=None):
+        self.params = params
+        return FakeResult(self.held)
+
+
+def coordinator(owned) -> ShardCoordinator:
+    shards = ShardCoordinator(FakeEngine(), shard_count=4, rebalance_interval=10)
+    shards._owned = set(owned)
+    return shards
+
+
+class ShardCoordinatorTest(unittest.IsolatedAsyncioTestCase):
+
+    def test_acquire_only_owned_shards(self):
+        shards = coordinator({1})
+
+        self.assertTrue(shards.acquire(5))
+        self.assertFalse(shards.acquire(2))
+        self.assertEqual(shards._in_flight, {1: 1})
+
+        shards.release(5)
+        self.assertEqual(shards._in_flight, {})
+        self.assertTrue(shards._idle[1].is_set())
+
+    async def test_lost_connection_drops_shards_and_backend(self):
+        shards = coordinator({0, 1})
+        conn = shards._conn = FakeConnection(ConnectionResetError('connection reset'))
+        shards._pid = 42
+
+        self.assertFalse(await shards.check())
+        self.assertFalse(shards.owns(1))
+        self.assertFalse(shards.acquire(1))
+        # the backend holding the session locks is not returned to the pool
+        self.assertTrue(conn.invalidated)
+        self.assertFalse(conn.closed)
+        self.assertIsNone(shards._conn)
+
+    async def test_live_connection_keeps_shards(self):
+        shards = coordinator({0, 1})
+        shards._conn = FakeConnection()
+
+        self.assertTrue(await shards.check())
+        self.assertEqual(shards.owned, {0, 1})
+
+    async def test_disconnect_invalidates_connection(self):
+        shards = coordinator({0})
+        conn = shards._conn = FakeConnection()
+
+        await shards._disconnect()
+        self.assertTrue(conn.invalidated)
+        self.assertEqual(shards.owned, set())
+
+    async def test_confirm_skips_shards_taken_over(self):
+        shards = coordinator({0, 1})
+        shards._pid = 42
+        session = FakeSession([1])
+
+        self.assertEqual(await shards.confirm(session, [4, 5, 9]), {5, 9})
+        self.assertEqual(session.params, {'namespace': SHARD_LOCK_NAMESPACE, 'pid': 42})
+        self.assertEqual(shards.owned, {1})
+
+    async def test_confirm_without_connection(self):
+        shards = coordinator({0, 1})
+
+        self.assertEqual(await shards.confirm(FakeSession([0, 1]), [4, 5]), set())
+        self.assertEqual(shards.owned, set())
+
+    async def test_disabled_owns_all_shards(self):
+        shards = coordinator(set())
+        shards.enabled = False
+
+        self.assertEqual(await shards.confirm(FakeSession([]), [1, 2]), {1, 2})
+
+
+class ScanArbiSituationsTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(tasks, 'update_arbi_situations')
+        self.update = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_runs_in_owner_of_first_shard(self):
+        shards = coordinator({0})
+
+        with mock.patch.object(tasks, 'shard_coordinator', shards):
+            await tasks.scan_arbi_situations()
+        self.update.assert_awaited_once()
+        # the shard is not held between scans
+        self.assertEqual(shards._in_flight, {})
+
+    async def test_skipped_in_other_processes(self):
+        shards = coordinator({1, 2})
+        tasks.open_events.loaded = True
+
+        with mock.patch.object(tasks, 'shard_coordinator', shards):
+            await tasks.scan_arbi_situations()
+        self.update.assert_not_awaited()
+        self.assertFalse(tasks.open_events.loaded)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+"""
+Тесты симулятора бирж.
+"""
+import unittest
+
+from app.core.exchange import ExchangeName, OrderSide, OrderStatus
+from app.core.simulator import (
+    AsyncSimulatedBinance, AsyncSimulatedExchange, RandomWalkPath, ScriptedPath, SimulatedMarket,
+    SimulationParams, split_symbol
+)
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def market(clock: FakeClock, **params) -> SimulatedMarket:
+    path = ScriptedPath([0, 10], {(ExchangeName.BINANCE, 'BTC'): [100, 90]}, loop=False)
+    params = SimulationParams(**{'latency_median': 0, 'fill_probability': 1, 'rate_limit': 0, **params})
+    return SimulatedMarket(params, path, clock=clock)
+
+
+class PricePathTest(unittest.TestCase):
+
+    def test_split_symbol(self):
+        self.assertEqual(split_symbol('BTC/USDT'), ('BTC', 'USDT'))
+        self.assertEqual(split_symbol('ETHBTC'), ('ETH', 'BTC'))
+        with self.assertRaises(ValueError):
+            split_symbol('USDT')
+
+    def test_scripted_path_loops(self):
+        path = ScriptedPath([0, 10], {(ExchangeName.BYBIT, 'BTC'): [100, 110]})
+
+        self.assertEqual(path.price(ExchangeName.BYBIT, 'BTC', 5), 105)
+        self.assertEqual(path.price(ExchangeName.BYBIT, 'BTC', 15), 105)
+
+    def test_random_walk_is_deterministic(self):
+        first, second = RandomWalkPath(seed=1), RandomWalkPath(seed=1)
+        prices = [first.price(ExchangeName.BYBIT, 'BTC', t) for t in (0, 100, 5000)]
+
+        self.assertEqual(prices, [second.price(ExchangeName.BYBIT, 'BTC', t) for t in (0, 100, 5000)])
+        self.assertNotEqual(first.price(ExchangeName.BYBIT, 'BTC', 1), first.price(ExchangeName.BINANCE, 'BTC', 1))
+
+
+class SimulatedMarketTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.market = market(self.clock)
+        self.account = (ExchangeName.BINANCE, 'key')
+
+    def place(self, price, side=OrderSide.BUY, quantity=1):
+        return self.market.place(self.account, 'BTCUSDT', side, quantity, price, ValueError)
+
+    def test_buy_fills_when_price_crosses(self):
+        order = self.place(95)
+        self.assertEqual(order.status, OrderStatus.NEW)
+        self.assertEqual(self.market.balance(self.account, 'USDT'), [100000 - 95, 95])
+
+        self.clock.now = 6
+        self.assertEqual(self.market.order(self.account, order.id, ValueError).status, OrderStatus.FILLED)
+        self.assertEqual(self.market.balance(self.account, 'USDT'), [100000 - 95, 0])
+        self.assertEqual(self.market.balance(self.account, 'BTC'), [100001, 0])
+
+    def test_cancel_unlocks_balance(self):
+        order = self.place(50)
+
+        self.assertTrue(self.market.cancel(order))
+        self.assertFalse(self.market.cancel(order))
+        self.assertEqual(self.market.balance(self.account, 'USDT'), [100000, 0])
+
+    def test_insufficient_balance(self):
+        with self.assertRaises(ValueError):
+            self.place(100, quantity=2000)
+
+    def test_foreign_order_does_not_exist(self):
+        order = self.place(50)
+
+        with self.assertRaises(ValueError):
+            self.market.order((ExchangeName.BINANCE, 'other'), order.id, ValueError)
+
+    async def test_rate_limit(self):
+        self.market = market(self.clock, rate_limit=1, rate_burst=2)
+
+        await self.market.request(self.account, ValueError)
+        await self.market.request(self.account, ValueError)
+        with self.assertRaises(ValueError):
+            await self.market.request(self.account, ValueError)
+        self.assertEqual(self.market.errors, 1)
+
+        self.clock.now = 1
+        await self.market.request(self.account, ValueError)
+
+
+class AsyncSimulatedExchangeTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.addCleanup(setattr, AsyncSimulatedExchange, 'market', AsyncSimulatedExchange.market)
+        AsyncSimulatedExchange.market = market(self.clock)
+
+    async def test_order_is_found_by_client_order_id(self):
+        client = AsyncSimulatedBinance('key', 'secret')
+        await client.connect()
+
+        order_id, status = await client.place_order('BTCUSDT', OrderSide.BUY, None, 1, 95, client_order_id='c1')
+        self.assertEqual(status, OrderStatus.NEW)
+        self.assertEqual(await client.find_order('BTCUSDT', 'c1'), order_id)
+        self.assertIsNone(await client.find_order('BTCUSDT', 'c2'))
+
+        self.clock.now = 6
+        self.assertEqual(await client.check_order('BTCUSDT', order_id), OrderStatus.FILLED)
+        self.assertFalse(await client.cancel_order('BTCUSDT', order_id))
+
+    async def test_invalid_order_is_not_sent(self):
+        client = AsyncSimulatedBinance('key', 'secret')
+        await client.connect()
+
+        self.assertIsNone(await client.place_order('BTCUSDT', OrderSide.BUY, None, 0, 95))
+        self.assertEqual(client.session.requests, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
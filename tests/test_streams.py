@@ -0,0 +1,112 @@
+"""
+Тесты потоков тикеров бирж.
+"""
+import json
+import asyncio
+import unittest
+from unittest import mock
+
+from app.core import streams
+from app.core.exchange import ExchangeName
+from app.core.streams import BybitTickerStream, PriceStore
+
+
+class FakeWebSocket:
+
+    def __init__(self, messages=(), error: Exception = None):
+        self.messages = [json.dumps(message) for message in messages]
+        self.error = error
+        self.sent = []
+        self.read = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    async def send(self, raw):
+        self.sent.append(json.loads(raw))
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.messages:
+            self.read += 1
+            return self.messages.pop(0)
+        if self.error is not None:
+            raise self.error
+        # the connection stays open
+        await asyncio.Event().wait()
+
+
+def ticker(symbol: str, price: float) -> dict:
+    return {'topic': f'tickers.{symbol}', 'data': {'lastPrice': str(price)}}
+
+
+async def wait_for(condition) -> None:
+    for _ in range(100):
+        if condition():
+            return
+        await asyncio.sleep(0)
+    raise AssertionError('condition is not met')
+
+
+class TickerStreamTest(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.store = PriceStore()
+        self.stream = BybitTickerStream(self.store, url='ws://localhost', reconnect_delay=0)
+        self.symbols = [f'C{i}/USDT' for i in range(12)]
+
+    def run_stream(self, *sockets) -> asyncio.Task:
+        patcher = mock.patch.object(streams.websockets, 'connect', side_effect=list(sockets))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        task = asyncio.create_task(self.stream.run())
+        self.addCleanup(task.cancel)
+        return task
+
+    @staticmethod
+    def batches(ws: FakeWebSocket) -> list:
+        return [len(message['args']) for message in ws.sent if message['op'] == 'subscribe']
+
+    async def test_subscribe_is_batched(self):
+        ws = FakeWebSocket()
+        self.run_stream(ws)
+        await self.stream.connected.wait()
+
+        await self.stream.subscribe(self.symbols)
+        self.assertEqual(self.batches(ws), [10, 2])
+
+    async def test_resubscribe_after_reconnect(self):
+        await self.stream.subscribe(self.symbols)
+        first = FakeWebSocket([ticker('C0USDT', 1)], error=ConnectionResetError())
+        second = FakeWebSocket([ticker('C0USDT', 2)])
+        self.run_stream(first, second)
+
+        await wait_for(lambda: second.read == 1)
+        self.assertEqual(self.batches(first), [10, 2])
+        self.assertEqual(self.batches(second), [10, 2])
+        self.assertEqual(self.store.get((ExchangeName.BYBIT, 'C0/USDT')), 2)
+
+    async def test_slow_consumer_pauses_reading(self):
+        await self.stream.subscribe(self.symbols)
+        queue = self.store.listen(maxsize=1)
+        ws = FakeWebSocket([ticker('C0USDT', price) for price in (1, 2, 3)])
+        self.run_stream(ws)
+
+        # the second price waits for the queue, the third is not read yet
+        await wait_for(lambda: ws.read == 2)
+        for _ in range(10):
+            await asyncio.sleep(0)
+        self.assertEqual(ws.read, 2)
+
+        self.assertEqual(await queue.get(), (ExchangeName.BYBIT, 'C0/USDT'))
+        await wait_for(lambda: ws.read == 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
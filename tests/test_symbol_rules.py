@@ -0,0 +1,84 @@
+"""
+Тесты округления ордеров по правилам символов.
+"""
+import unittest
+from decimal import Decimal
+
+from app.core.symbol_rules import SymbolRules, SymbolRulesCache, SymbolRulesError, binance_rules
+
+
+def cache(rules) -> SymbolRulesCache:
+    symbol_rules = SymbolRulesCache()
+    symbol_rules._rules.update(rules)
+    return symbol_rules
+
+
+class PrepareTest(unittest.TestCase):
+
+    def test_unknown_symbol_is_not_changed(self):
+        self.assertEqual(cache({}).prepare('Binance', 'BTCUSDT', 0.123456, 100.123), (0.123456, 100.123))
+
+    def test_quantity_down_price_to_nearest_tick(self):
+        symbol_rules = cache({('Binance', 'BTCUSDT'): SymbolRules(tick_size=Decimal('0.01'), step_size=Decimal('0.001'))})
+
+        self.assertEqual(symbol_rules.prepare('Binance', 'BTCUSDT', 0.1239, 100.125), (0.123, 100.13))
+
+    def test_limits(self):
+        symbol_rules = cache({('Binance', 'BTCUSDT'): SymbolRules(
+            step_size=Decimal('0.001'), min_qty=0.01, max_qty=10, min_notional=5
+        )})
+
+        with self.assertRaises(SymbolRulesError):
+            symbol_rules.prepare('Binance', 'BTCUSDT', 0.0005, 100)
+        with self.assertRaises(SymbolRulesError):
+            symbol_rules.prepare('Binance', 'BTCUSDT', 0.009, 100)
+        with self.assertRaises(SymbolRulesError):
+            symbol_rules.prepare('Binance', 'BTCUSDT', 11, 100)
+        with self.assertRaises(SymbolRulesError):
+            symbol_rules.prepare('Binance', 'BTCUSDT', 0.02, 100)
+        self.assertEqual(symbol_rules.prepare('Binance', 'BTCUSDT', 0.05, 100), (0.05, 100))
+
+    def test_pair_uses_common_step(self):
+        symbol_rules = cache({
+            ('Binance', 'BTCUSDT'): SymbolRules(step_size=Decimal('0.00001')),
+            ('Bybit', 'BTC/USDT'): SymbolRules(step_size=Decimal('0.000001'), tick_size=Decimal('0.1')),
+        })
+
+        quantity, prices = symbol_rules.prepare_pair(0.1234567, [
+            ('Bybit', 'BTC/USDT', 100.04), ('Binance', 'BTCUSDT', 100.04)
+        ])
+        self.assertEqual(quantity, 0.12345)
+        self.assertEqual(prices, [100.0, 100.04])
+
+    def test_pair_step_not_power_of_ten(self):
+        symbol_rules = cache({
+            ('Binance', 'XUSDT'): SymbolRules(step_size=Decimal('0.2')),
+            ('Bybit', 'X/USDT'): SymbolRules(step_size=Decimal('0.5')),
+        })
+
+        quantity, _ = symbol_rules.prepare_pair(2.9, [('Bybit', 'X/USDT', 1), ('Binance', 'XUSDT', 1)])
+        self.assertEqual(quantity, 2.0)
+
+    def test_pair_is_rejected_if_any_leg_is_out_of_limits(self):
+        symbol_rules = cache({('Binance', 'BTCUSDT'): SymbolRules(min_notional=10)})
+
+        with self.assertRaises(SymbolRulesError):
+            symbol_rules.prepare_pair(0.05, [('Bybit', 'BTC/USDT', 100), ('Binance', 'BTCUSDT', 100)])
+
+
+class BinanceRulesTest(unittest.TestCase):
+
+    def test_filters(self):
+        rules = binance_rules({'symbols': [{'symbol': 'BTCUSDT', 'filters': [
+            {'filterType': 'PRICE_FILTER', 'tickSize': '0.01000000'},
+            {'filterType': 'LOT_SIZE', 'stepSize': '0.00001000', 'minQty': '0.00001000', 'maxQty': '9000.00000000'},
+            {'filterType': 'NOTIONAL', 'minNotional': '5.00000000'},
+        ]}]})
+
+        self.assertEqual(rules['BTCUSDT'], SymbolRules(
+            tick_size=Decimal('0.01'), step_size=Decimal('0.00001'), min_qty=0.00001, max_qty=9000, min_notional=5
+        ))
+
+
+if __name__ == '__main__':
+    unittest.main()
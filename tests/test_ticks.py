@@ -0,0 +1,94 @@
+"""
+Тесты хранилища рыночных тиков.
+"""
+import os
+import tempfile
+import unittest
+from datetime import datetime, timezone
+
+import numpy as np
+
+from app.core.exchange import ExchangeName
+from app.core.ticks import TickReader, TickRecorder, _column_path
+
+
+DAY = datetime(2024, 5, 1, tzinfo=timezone.utc).timestamp()
+HOUR = 3600
+
+
+class TicksTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = tmp.name
+
+        recorder = TickRecorder(self.path)
+        # the last two ticks are written to the next day
+        for i, (exchange, symbol, price) in enumerate([
+            (ExchangeName.BINANCE, 'BTCUSDT', 100),
+            (ExchangeName.BYBIT, 'BTC/USDT', 101),
+            (ExchangeName.BINANCE, 'ETHUSDT', 5),
+            (ExchangeName.BINANCE, 'BTCUSDT', 102),
+            (ExchangeName.BYBIT, 'ETH/USDT', 6),
+            (ExchangeName.BINANCE, 'BTCUSDT', 103),
+        ]):
+            recorder.record(exchange, symbol, price, DAY + 20 * HOUR + i * 2 * HOUR)
+        recorder.flush()
+        recorder._writer.close()
+
+        self.reader = TickReader(self.path)
+
+    def test_days_are_split(self):
+        days = self.reader.days()
+
+        self.assertEqual([day.day for day in days], [1, 2])
+        self.assertEqual(len(self.reader.day(days[0]).timestamp), 2)
+        self.assertEqual(self.reader.day(days[1]).symbols, ['ETHUSDT', 'BTCUSDT', 'ETH/USDT'])
+
+    def test_slice_is_half_open(self):
+        ticks = self.reader.day(self.reader.days()[0])
+
+        self.assertEqual(len(ticks.slice(DAY + 20 * HOUR, DAY + 22 * HOUR).timestamp), 1)
+        self.assertEqual(len(ticks.slice(DAY + 20 * HOUR, DAY + 22 * HOUR + 1).timestamp), 2)
+        self.assertEqual(len(ticks.slice(end=DAY).timestamp), 0)
+        # a slice is a view of the mapped file
+        self.assertIsInstance(ticks.slice(DAY).price, np.memmap)
+
+    def test_range_crosses_days(self):
+        parts = list(self.reader.range(DAY + 21 * HOUR, DAY + 29 * HOUR))
+
+        self.assertEqual([len(ticks.timestamp) for ticks in parts], [1, 3])
+
+    def test_read_remaps_symbols(self):
+        ticks = self.reader.read(DAY, DAY + 2 * 24 * HOUR, exchange=ExchangeName.BINANCE)
+
+        self.assertEqual(list(ticks.price), [100, 5, 102, 103])
+        self.assertEqual([ticks.symbols[code] for code in ticks.symbol], ['BTCUSDT', 'ETHUSDT', 'BTCUSDT', 'BTCUSDT'])
+
+        ticks = self.reader.read(DAY, DAY + 2 * 24 * HOUR, symbol='BTCUSDT')
+        self.assertEqual(list(ticks.price), [100, 102, 103])
+
+    def test_read_empty_range(self):
+        ticks = self.reader.read(DAY - 24 * HOUR, DAY)
+
+        self.assertEqual(len(ticks.timestamp), 0)
+
+    def test_partial_row_is_ignored(self):
+        day = self.reader.days()[1]
+        path = _column_path(os.path.join(self.path, day.strftime('%Y-%m-%d')), 'price')
+        with open(path, 'ab') as f:
+            f.write(np.float64(1).tobytes())
+
+        self.assertEqual(len(self.reader.day(day).price), 4)
+
+        # the writer cuts the partial row before appending
+        recorder = TickRecorder(self.path)
+        recorder.record(ExchangeName.BYBIT, 'BTC/USDT', 104, DAY + 31 * HOUR)
+        recorder.flush()
+        recorder._writer.close()
+        self.assertEqual(list(self.reader.day(day).price), [5, 102, 6, 103, 104])
+
+
+if __name__ == '__main__':
+    unittest.main()